@@ -1,6 +1,77 @@
 import logging
+import os
 
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 TIMEOUT_IN_SECONDS = 5
+
+# Long-lived yt-dlp metadata extraction pool. A max-tasks-per-child of 0 keeps workers alive indefinitely.
+METADATA_POOL_SIZE = int(os.environ.get("ENGAWA_METADATA_POOL_SIZE", "4"))
+METADATA_POOL_MAX_TASKS_PER_CHILD = int(os.environ.get("ENGAWA_METADATA_POOL_MAX_TASKS_PER_CHILD", "200"))
+
+# Number of subscriptions the scheduler syncs at the same time, each in its own session.
+SYNC_CONCURRENCY = int(os.environ.get("ENGAWA_SYNC_CONCURRENCY", "8"))
+
+# Shared HTTP client used for RSS and channel page fetches.
+HTTP_MAX_CONNECTIONS = int(os.environ.get("ENGAWA_HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get("ENGAWA_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("ENGAWA_HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+
+# Number of yt-dlp metadata results kept in memory, older entries are still served from the database.
+METADATA_CACHE_SIZE = int(os.environ.get("ENGAWA_METADATA_CACHE_SIZE", "10000"))
+
+# Download engine, downloads run in their own worker processes and are limited per destination disk.
+DOWNLOAD_WORKERS = int(os.environ.get("ENGAWA_DOWNLOAD_WORKERS", "3"))
+DOWNLOADS_PER_DISK = int(os.environ.get("ENGAWA_DOWNLOADS_PER_DISK", "2"))
+DOWNLOAD_POLL_INTERVAL_SECONDS = float(os.environ.get("ENGAWA_DOWNLOAD_POLL_INTERVAL_SECONDS", "30"))
+DOWNLOAD_PROGRESS_FLUSH_SECONDS = float(os.environ.get("ENGAWA_DOWNLOAD_PROGRESS_FLUSH_SECONDS", "2"))
+# Videos are fetched in ranges of this size so an interrupted download loses at most one chunk.
+DOWNLOAD_CHUNK_SIZE_BYTES = int(os.environ.get("ENGAWA_DOWNLOAD_CHUNK_SIZE_BYTES", str(10 * 1024 * 1024)))
+
+# Per-host rate limits shared by the HTTP client and the yt-dlp workers, backed off on 429 and 5xx responses.
+RATE_LIMIT_REQUESTS_PER_SECOND = float(os.environ.get("ENGAWA_RATE_LIMIT_REQUESTS_PER_SECOND", "2"))
+RATE_LIMIT_BURST = int(os.environ.get("ENGAWA_RATE_LIMIT_BURST", "10"))
+RATE_LIMIT_MIN_REQUESTS_PER_SECOND = float(os.environ.get("ENGAWA_RATE_LIMIT_MIN_REQUESTS_PER_SECOND", "0.1"))
+RATE_LIMIT_MAX_BACKOFF_SECONDS = float(os.environ.get("ENGAWA_RATE_LIMIT_MAX_BACKOFF_SECONDS", "300"))
+
+# SQLite database. WAL lets API reads proceed while the scheduler writes, busy_timeout waits out the remaining locks.
+DATABASE_URL = os.environ.get("ENGAWA_DATABASE_URL", "sqlite+aiosqlite:///test.db")
+DATABASE_POOL_SIZE = int(os.environ.get("ENGAWA_DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.environ.get("ENGAWA_DATABASE_MAX_OVERFLOW", "10"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("ENGAWA_SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KIB = int(os.environ.get("ENGAWA_SQLITE_CACHE_SIZE_KIB", "65536"))
+SQLITE_MMAP_SIZE_BYTES = int(os.environ.get("ENGAWA_SQLITE_MMAP_SIZE_BYTES", str(256 * 1024 * 1024)))
+# Sessions spending longer than this in the database are logged with their query count.
+SLOW_SESSION_SECONDS = float(os.environ.get("ENGAWA_SLOW_SESSION_SECONDS", "0.5"))
+
+# Channel images and thumbnails are stored on disk by content hash, images still inlined in the database are moved
+# there by a backfill in batches of this size.
+IMAGE_STORE_PATH = os.environ.get("ENGAWA_IMAGE_STORE_PATH", "images")
+IMAGE_MIGRATION_BATCH_SIZE = int(os.environ.get("ENGAWA_IMAGE_MIGRATION_BATCH_SIZE", "50"))
+
+# Files of videos past their retention policy are removed in the background, this many at a time.
+RETENTION_DELETE_CONCURRENCY = int(os.environ.get("ENGAWA_RETENTION_DELETE_CONCURRENCY", "4"))
+
+# Schema migrations run at startup, data backfills afterwards in the background with this pause between batches.
+BACKFILL_PAUSE_SECONDS = float(os.environ.get("ENGAWA_BACKFILL_PAUSE_SECONDS", "0.1"))
+
+# Every subscription gets its own next sync time. The interval follows how often the channel uploads, polling about
+# SYNC_POLLS_PER_UPLOAD times between uploads within the bounds below, and is spread by up to SYNC_JITTER either way.
+SYNC_MIN_INTERVAL_SECONDS = float(os.environ.get("ENGAWA_SYNC_MIN_INTERVAL_SECONDS", str(15 * 60)))
+SYNC_MAX_INTERVAL_SECONDS = float(os.environ.get("ENGAWA_SYNC_MAX_INTERVAL_SECONDS", str(24 * 60 * 60)))
+SYNC_POLLS_PER_UPLOAD = int(os.environ.get("ENGAWA_SYNC_POLLS_PER_UPLOAD", "8"))
+SYNC_JITTER = float(os.environ.get("ENGAWA_SYNC_JITTER", "0.2"))
+# The scheduler sleeps until the next subscription is due, but at most this long so new subscriptions are picked up.
+SCHEDULER_MAX_SLEEP_SECONDS = float(os.environ.get("ENGAWA_SCHEDULER_MAX_SLEEP_SECONDS", "60"))
+
+# Videos whose metadata or download failed are retried with exponential backoff, starting at RETRY_BASE_DELAY_SECONDS
+# and doubling up to RETRY_MAX_DELAY_SECONDS, spread by up to RETRY_JITTER either way. The base delay outlasts the
+# metadata cache's memory of the error. After RETRY_MAX_ATTEMPTS failures a video stays FAILED.
+RETRY_BASE_DELAY_SECONDS = float(os.environ.get("ENGAWA_RETRY_BASE_DELAY_SECONDS", str(10 * 60)))
+RETRY_MAX_DELAY_SECONDS = float(os.environ.get("ENGAWA_RETRY_MAX_DELAY_SECONDS", str(6 * 60 * 60)))
+RETRY_JITTER = float(os.environ.get("ENGAWA_RETRY_JITTER", "0.2"))
+RETRY_MAX_ATTEMPTS = int(os.environ.get("ENGAWA_RETRY_MAX_ATTEMPTS", "5"))
+# Due retries of every subscription are swept up this often, at most RETRY_BATCH_SIZE videos per sweep.
+RETRY_SWEEP_INTERVAL_SECONDS = float(os.environ.get("ENGAWA_RETRY_SWEEP_INTERVAL_SECONDS", "300"))
+RETRY_BATCH_SIZE = int(os.environ.get("ENGAWA_RETRY_BATCH_SIZE", "50"))
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from functools import partial
+
+from pytz import utc
+from sqlalchemy import (
+    Column,
+    Connection,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    func,
+    inspect,
+    select,
+)
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.schema import CreateColumn
+from sqlmodel import SQLModel
+
+from app.config import (
+    BACKFILL_PAUSE_SECONDS,
+    IMAGE_MIGRATION_BATCH_SIZE,
+    RETRY_BATCH_SIZE,
+)
+from app.image_store import image_store, migrate_inline_image_batch
+from app.models.subscription import (
+    MetadataCacheEntry,
+    RssFeedCache,
+    Subscription,
+    Video,
+)
+from app.retry import schedule_untracked_retries_batch
+from app.search import ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+# Not part of SQLModel.metadata, the migrations own it
+schema_version = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    """A schema change, applied once and in version order. Upgrades only, there are no downgrades."""
+
+    version: int
+    name: str
+    upgrade: Callable[[Connection], None]
+
+
+@dataclass(frozen=True)
+class Backfill:
+    """A data change run in the background after startup, one short transaction per batch.
+
+    batch selects its remaining rows by a condition and returns how many it changed, 0 once there are none left, so
+    an interrupted backfill resumes where it stopped on the next start.
+    """
+
+    name: str
+    batch: Callable[[async_sessionmaker[AsyncSession]], Awaitable[int]]
+
+
+def add_column(connection: Connection, column: Column) -> bool:  # type: ignore[type-arg]
+    """Add a model column to an existing table, SQLite only adds nullable columns or ones with a default."""
+    table = column.table.name
+    if column.name in {existing["name"] for existing in inspect(connection).get_columns(table)}:
+        return False
+    definition = CreateColumn(column).compile(dialect=connection.dialect)
+    connection.exec_driver_sql(
+        f"ALTER TABLE {connection.dialect.identifier_preparer.quote(table)} ADD COLUMN {definition}"
+    )
+    return True
+
+
+def create_index(connection: Connection, name: str) -> bool:
+    """Create a model index by name unless the database already has it."""
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            if index.name == name:
+                if connection.dialect.has_index(connection, table.name, name):
+                    return False
+                index.create(connection)
+                return True
+    raise ValueError(f"No model declares an index named {name}")
+
+
+def baseline(connection: Connection) -> None:
+    """Bring a database that create_all kept up to date before migrations existed to the first versioned schema."""
+    SQLModel.metadata.create_all(connection, tables=[RssFeedCache.__table__, MetadataCacheEntry.__table__])  # type: ignore
+    for column in (
+        Video.__table__.c.download_progress,  # type: ignore
+        Video.__table__.c.file_path,  # type: ignore
+        Subscription.__table__.c.image_hash,  # type: ignore
+    ):
+        add_column(connection, column)
+    for name in (
+        "ix_video_subscription_status_published",
+        "ix_video_subscription_published",
+        "ix_video_status_published",
+        "ix_filter_subscription_id",
+        "ix_retentionpolicy_subscription_id",
+    ):
+        create_index(connection, name)
+    ensure_search_index(connection)
+
+
+def subscription_next_sync_at(connection: Connection) -> None:
+    add_column(connection, Subscription.__table__.c.next_sync_at)  # type: ignore
+    create_index(connection, "ix_subscription_next_sync_at")
+
+
+def video_next_attempt_at(connection: Connection) -> None:
+    """Schema only, the videos that failed before retries existed are scheduled by the video retry schedule backfill."""
+    add_column(connection, Video.__table__.c.next_attempt_at)  # type: ignore
+    create_index(connection, "ix_video_status_next_attempt_at")
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(1, "baseline", baseline),
+    Migration(2, "subscription next_sync_at", subscription_next_sync_at),
+    Migration(3, "video next_attempt_at", video_next_attempt_at),
+]
+
+BACKFILLS: list[Backfill] = [
+    Backfill(
+        "inline subscription images",
+        partial(migrate_inline_image_batch, store=image_store, batch_size=IMAGE_MIGRATION_BATCH_SIZE),
+    ),
+    Backfill(
+        "video retry schedule",
+        partial(schedule_untracked_retries_batch, batch_size=RETRY_BATCH_SIZE),
+    ),
+]
+
+
+def _record(connection: Connection, migration: Migration) -> None:
+    connection.execute(
+        schema_version.insert().values(version=migration.version, name=migration.name, applied_at=datetime.now(utc))
+    )
+
+
+def _migrate(connection: Connection, migrations: Sequence[Migration]) -> list[int]:
+    # Held until every pending migration is applied, another process starting at the same time waits for it and then
+    # finds nothing left to do
+    connection.exec_driver_sql("BEGIN EXCLUSIVE")
+    try:
+        schema_version.create(connection, checkfirst=True)
+        current = connection.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+        if current == 0 and not connection.dialect.has_table(connection, Video.__tablename__):
+            # A new database is created from the models, which already include every migration
+            SQLModel.metadata.create_all(connection)
+            for migration in migrations:
+                _record(connection, migration)
+            connection.exec_driver_sql("COMMIT")
+            versions = sorted(migration.version for migration in migrations)
+            logger.info("Created the database schema at version %d", versions[-1] if versions else 0)
+            return versions
+
+        applied = []
+        for migration in sorted(migrations, key=lambda migration: migration.version):
+            if migration.version > current:
+                logger.info("Applying migration %d %s", migration.version, migration.name)
+                migration.upgrade(connection)
+                _record(connection, migration)
+                applied.append(migration.version)
+        # SQLite DDL is transactional, a failing migration leaves the schema as it was
+        connection.exec_driver_sql("COMMIT")
+        return applied
+    except BaseException:
+        connection.exec_driver_sql("ROLLBACK")
+        raise
+
+
+async def migrate(engine: AsyncEngine, migrations: Sequence[Migration] = MIGRATIONS) -> list[int]:
+    """Apply pending migrations in one exclusive transaction, returns the versions applied."""
+    async with engine.connect() as conn:
+        # The driver must not open a transaction of its own, _migrate begins one that takes the write lock up front
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        return await conn.run_sync(_migrate, migrations)
+
+
+async def run_backfills(
+    session_factory: async_sessionmaker[AsyncSession],
+    backfills: Sequence[Backfill] = BACKFILLS,
+    pause: float = BACKFILL_PAUSE_SECONDS,
+) -> dict[str, int]:
+    """Run every backfill batch by batch, pausing between batches so API requests get the write lock."""
+    changed: dict[str, int] = {}
+    for backfill in backfills:
+        changed[backfill.name] = 0
+        try:
+            while batch := await backfill.batch(session_factory):
+                changed[backfill.name] += batch
+                await asyncio.sleep(pause)
+        except Exception as e:  # pylint: disable=broad-except
+            # Runs as a background task at startup, nothing else would report the failure
+            logger.error("Backfill %s failed: %s", backfill.name, e)
+
+        if changed[backfill.name]:
+            logger.info("Backfill %s changed %d rows", backfill.name, changed[backfill.name])
+    return changed
+
+
+__all__ = [
+    "Backfill",
+    "Migration",
+    "BACKFILLS",
+    "MIGRATIONS",
+    "add_column",
+    "create_index",
+    "migrate",
+    "run_backfills",
+]
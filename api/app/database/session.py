@@ -1,18 +1,158 @@
-from collections.abc import AsyncGenerator
+import logging
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import Connection, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlalchemy.orm import Session, SessionTransaction
+from sqlalchemy.pool import Pool
 from sqlmodel import SQLModel
 
-SQLITE_FILE_NAME = "test.db"
-sqlite_url = f"sqlite+aiosqlite:///{SQLITE_FILE_NAME}"
-engine = create_async_engine(sqlite_url, echo=False)
+from app.config import (
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_SIZE,
+    DATABASE_URL,
+    SLOW_SESSION_SECONDS,
+    SQLITE_BUSY_TIMEOUT_MS,
+    SQLITE_CACHE_SIZE_KIB,
+    SQLITE_MMAP_SIZE_BYTES,
+)
+
+logger = logging.getLogger(__name__)
+
+STATS_KEY = "engawa_stats"
+QUERY_STARTED_KEY = "engawa_query_started"
+
+
+def sqlite_pragmas(
+    busy_timeout_ms: int = SQLITE_BUSY_TIMEOUT_MS,
+    cache_size_kib: int = SQLITE_CACHE_SIZE_KIB,
+    mmap_size_bytes: int = SQLITE_MMAP_SIZE_BYTES,
+) -> dict[str, str | int]:
+    return {
+        # Readers no longer block the writer and the writer no longer blocks readers
+        "journal_mode": "WAL",
+        # Durable at every checkpoint rather than every commit, which is safe in WAL mode
+        "synchronous": "NORMAL",
+        "busy_timeout": busy_timeout_ms,
+        # A negative cache_size is in KiB rather than pages
+        "cache_size": -cache_size_kib,
+        "mmap_size": mmap_size_bytes,
+        "temp_store": "MEMORY",
+    }
+
+
+def make_engine(url: str = DATABASE_URL, echo: bool = False, **pragma_overrides: Any) -> AsyncEngine:
+    """Create the async engine, every new SQLite connection is configured with sqlite_pragmas()."""
+    kwargs: dict[str, Any] = {}
+    database = make_url(url).database
+    if database and database != ":memory:":
+        # In-memory databases get a single shared connection from SQLAlchemy, only file databases are pooled
+        kwargs.update(pool_size=DATABASE_POOL_SIZE, max_overflow=DATABASE_MAX_OVERFLOW)
+    async_engine = create_async_engine(url, echo=echo, **kwargs)
+
+    pragmas = sqlite_pragmas(**pragma_overrides)
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection: Any, _connection_record: Any) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+    return async_engine
+
+
+@dataclass
+class SessionStats:
+    queries: int = 0
+    database_seconds: float = 0.0
+
+
+class TrackedSession(Session):
+    """Session recording how many queries it ran and how long it spent waiting on them, see session_stats()."""
+
+
+@event.listens_for(TrackedSession, "after_begin")
+def _track_connection(session: Session, _transaction: SessionTransaction, connection: Connection) -> None:
+    # connection.info belongs to the pooled DBAPI connection, it is handed back on checkin below
+    connection.info[STATS_KEY] = session.info.setdefault(STATS_KEY, SessionStats())
+
+
+@event.listens_for(Pool, "checkin")
+def _untrack_connection(_dbapi_connection: Any, connection_record: Any) -> None:
+    connection_record.info.pop(STATS_KEY, None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn: Connection, *_args: Any) -> None:
+    conn.info[QUERY_STARTED_KEY] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _stop_query_timer(conn: Connection, *_args: Any) -> None:
+    stats: SessionStats | None = conn.info.get(STATS_KEY)
+    started = conn.info.pop(QUERY_STARTED_KEY, None)
+    if stats is not None and started is not None:
+        stats.queries += 1
+        stats.database_seconds += time.perf_counter() - started
+
+
+def session_stats(session: AsyncSession) -> SessionStats:
+    return session.info.setdefault(STATS_KEY, SessionStats())
+
+
+def log_if_slow(session: AsyncSession, name: str) -> None:
+    stats = session_stats(session)
+    if stats.database_seconds >= SLOW_SESSION_SECONDS:
+        logger.warning(
+            "Slow session in %s: %d queries, %.1fms in the database", name, stats.queries, stats.database_seconds * 1000
+        )
+
+
+def make_session_factory(async_engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        async_engine, class_=AsyncSession, sync_session_class=TrackedSession, expire_on_commit=False
+    )
+
+
+engine = make_engine()
+# Built once, every request and background job draws its sessions from here
+session_factory = make_session_factory(engine)
 
 
 # Setup dependency for getting a session
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with async_session() as session:
-        yield session
+    async with session_factory() as session:
+        try:
+            yield session
+        finally:
+            log_if_slow(session, "request")
+
+
+@asynccontextmanager
+async def unit_of_work(
+    name: str, sessions: async_sessionmaker[AsyncSession] | None = None
+) -> AsyncIterator[AsyncSession]:
+    """Session for a background job, committed when the block succeeds and rolled back when it raises."""
+    async with (sessions or session_factory)() as session:
+        try:
+            yield session
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            raise
+        finally:
+            log_if_slow(session, name)
 
 
 async def init_db():
@@ -26,4 +166,16 @@ async def dispose_db():
 
 
 # Export the engine
-__all__ = ["engine", "get_session", "init_db", "dispose_db"]
+__all__ = [
+    "engine",
+    "make_engine",
+    "sqlite_pragmas",
+    "session_factory",
+    "make_session_factory",
+    "SessionStats",
+    "session_stats",
+    "get_session",
+    "unit_of_work",
+    "init_db",
+    "dispose_db",
+]
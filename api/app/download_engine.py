@@ -0,0 +1,321 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+from typing import Any
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, desc, select
+
+from app import rate_limit
+from app.config import (
+    DOWNLOAD_POLL_INTERVAL_SECONDS,
+    DOWNLOAD_PROGRESS_FLUSH_SECONDS,
+    DOWNLOAD_WORKERS,
+    DOWNLOADS_PER_DISK,
+)
+from app.library import (
+    find_downloaded_file,
+    remove_partial_download,
+    resolve_download_path,
+    verify_write_access,
+)
+from app.models.subscription import Subscription, Video, VideoStatus
+from app.retry import fail_videos
+from app.yt_downloader import (
+    DownloadJob,
+    DownloadOutcome,
+    DownloadProgress,
+    download_video,
+)
+
+logger = logging.getLogger(__name__)
+
+video_table = Video.__table__  # type: ignore
+
+
+class DownloadEngine:
+    """Downloads PENDING_DOWNLOAD videos in worker processes, the video table is the job queue.
+
+    Videos are claimed by moving them to DOWNLOADING and end up DOWNLOADED or FAILED. Progress reported by the
+    workers is written back in batches, and every destination disk has its own concurrency limit.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        workers: int = DOWNLOAD_WORKERS,
+        downloads_per_disk: int = DOWNLOADS_PER_DISK,
+        poll_interval: float = DOWNLOAD_POLL_INTERVAL_SECONDS,
+        progress_flush_interval: float = DOWNLOAD_PROGRESS_FLUSH_SECONDS,
+        executor: concurrent.futures.Executor | None = None,
+        progress_queue: "queue.Queue[DownloadProgress] | None" = None,
+    ) -> None:
+        self._session_factory = session_factory
+        self._workers = workers
+        self._downloads_per_disk = downloads_per_disk
+        self._poll_interval = poll_interval
+        self._progress_flush_interval = progress_flush_interval
+        self._executor = executor
+        self._progress_queue = progress_queue
+        self._manager: Any = None
+        self._wakeup = asyncio.Event()
+        self._disk_limits: dict[int, asyncio.Semaphore] = {}
+        self._running: set[asyncio.Task[None]] = set()
+        self._tasks: list[asyncio.Task[None]] = []
+
+    async def start(self) -> None:
+        context = multiprocessing.get_context("spawn")
+        if self._executor is None:
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self._workers,
+                mp_context=context,
+                initializer=rate_limit.set_rate_limiter,
+                initargs=(rate_limit.shared_rate_limiter(),),
+            )
+        if self._progress_queue is None:
+            # A manager queue can be handed to worker processes, a plain multiprocessing queue cannot be pickled.
+            self._manager = await asyncio.to_thread(context.Manager)
+            self._progress_queue = self._manager.Queue()
+
+        await self.recover()
+        self._tasks = [asyncio.create_task(self._dispatch()), asyncio.create_task(self._write_progress())]
+        logger.info("Started download engine with %d workers", self._workers)
+
+    async def stop(self) -> None:
+        for task in [*self._tasks, *self._running]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._running, return_exceptions=True)
+        self._tasks.clear()
+
+        if self._executor is not None:
+            # Downloads still running are abandoned, recover() picks their rows up again on the next start.
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            await asyncio.to_thread(self._manager.shutdown)
+        logger.info("Stopped download engine")
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def recover(self) -> None:
+        """Reconcile videos left DOWNLOADING by a previous run with the files on disk.
+
+        A video whose file already made it into the library is marked DOWNLOADED, everything else goes back to
+        PENDING_DOWNLOAD and resumes from its partial file once it is claimed again.
+        """
+        async with self._session_factory() as session:
+            interrupted = await session.execute(
+                select(Video.id, Video.video_id, Video.subscription_id).where(Video.status == VideoStatus.DOWNLOADING)
+            )
+            rows = interrupted.all()
+            if not rows:
+                return
+
+            destinations = await self._destinations(session, {row.subscription_id for row in rows})
+            completed: list[dict[str, Any]] = []
+            resumable: list[int] = []
+            for row in rows:
+                destination = destinations.get(row.subscription_id)
+                file_path = None
+                if destination is not None:
+                    file_path = await asyncio.to_thread(find_downloaded_file, destination, row.video_id)
+                if file_path is None:
+                    resumable.append(row.id)
+                else:
+                    completed.append({"b_id": row.id, "b_file_path": file_path, "b_destination": destination})
+
+            if completed:
+                await session.execute(
+                    video_table.update()
+                    .where(video_table.c.id == bindparam("b_id"))
+                    .values(status=VideoStatus.DOWNLOADED, file_path=bindparam("b_file_path"), download_progress=1.0),
+                    [{"b_id": row["b_id"], "b_file_path": row["b_file_path"]} for row in completed],
+                )
+            if resumable:
+                await session.execute(
+                    update(Video)
+                    .where(col(Video.id).in_(resumable))
+                    .values(status=VideoStatus.PENDING_DOWNLOAD)
+                    .execution_options(synchronize_session=False)
+                )
+            await session.commit()
+
+        for row in completed:
+            await asyncio.to_thread(remove_partial_download, row["b_destination"], row["b_id"])
+        logger.info(
+            "Recovered interrupted downloads, %d already complete and %d to resume", len(completed), len(resumable)
+        )
+
+    async def _dispatch(self) -> None:
+        while True:
+            self._wakeup.clear()
+            free_slots = self._workers - len(self._running)
+            if free_slots > 0:
+                try:
+                    for job in await self._claim(free_slots):
+                        task = asyncio.create_task(self._download(job))
+                        self._running.add(task)
+                        task.add_done_callback(self._on_download_done)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.error("Failed to claim downloads: %s", e)
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self._poll_interval)
+            except TimeoutError:
+                pass
+
+    def _on_download_done(self, task: "asyncio.Task[None]") -> None:
+        self._running.discard(task)
+        self.wake()
+
+    async def _claim(self, limit: int) -> list[DownloadJob]:
+        async with self._session_factory() as session:
+            claimable = (
+                select(Video.id)
+                .where(Video.status == VideoStatus.PENDING_DOWNLOAD)
+                .order_by(desc(Video.published))
+                .limit(limit)
+            )
+            claimed = await session.execute(
+                update(Video)
+                .where(col(Video.id).in_(claimable.scalar_subquery()))
+                .values(status=VideoStatus.DOWNLOADING, download_progress=0.0)
+                .returning(Video.id, Video.link, Video.subscription_id)
+                .execution_options(synchronize_session=False)
+            )
+            rows = claimed.all()
+            if not rows:
+                return []
+
+            destinations = await self._destinations(session, {row.subscription_id for row in rows})
+            jobs: list[DownloadJob] = []
+            unwritable: list[int] = []
+            for row in rows:
+                destination = destinations.get(row.subscription_id)
+                if destination is None:
+                    unwritable.append(row.id)
+                else:
+                    jobs.append(DownloadJob(row.id, row.link, destination))
+
+            await fail_videos(session, unwritable)
+            await session.commit()
+            return jobs
+
+    async def _destinations(self, session: AsyncSession, subscription_ids: set[int]) -> dict[int, str | None]:
+        subscriptions = await session.execute(select(Subscription).where(col(Subscription.id).in_(subscription_ids)))
+        return {
+            subscription.id: await self._destination(subscription, session)
+            for subscription in subscriptions.scalars().all()
+        }
+
+    async def _destination(self, subscription: Subscription, session: AsyncSession) -> str | None:
+        try:
+            destination = await resolve_download_path(subscription, session)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.error("Cannot resolve the download path of subscription %d: %s", subscription.id, e)
+            return None
+
+        if not await asyncio.to_thread(verify_write_access, destination):
+            logger.error("Write access verification failed for %s", destination)
+            return None
+        return destination
+
+    def _disk_limit(self, destination: str) -> asyncio.Semaphore:
+        device = os.stat(destination).st_dev
+        semaphore = self._disk_limits.get(device)
+        if semaphore is None:
+            semaphore = self._disk_limits[device] = asyncio.Semaphore(self._downloads_per_disk)
+        return semaphore
+
+    async def _download(self, job: DownloadJob) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            async with self._disk_limit(job.destination):
+                outcome: DownloadOutcome = await loop.run_in_executor(
+                    self._executor, download_video, job, self._progress_queue
+                )
+        except Exception as e:  # pylint: disable=broad-except
+            # A crashed worker (BrokenProcessPool) or an unexpected error, the video must not stay DOWNLOADING
+            outcome = DownloadOutcome(job.video_id, None, f"{type(e).__name__}: {e}")
+
+        async with self._session_factory() as session:
+            if outcome.error is None:
+                await session.execute(
+                    update(Video)
+                    .where(col(Video.id) == job.video_id)
+                    .values(status=VideoStatus.DOWNLOADED, file_path=outcome.file_path, download_progress=1.0)
+                    .execution_options(synchronize_session=False)
+                )
+            else:
+                logger.error("Failed to download video %d: %s", job.video_id, outcome.error)
+                await fail_videos(session, [job.video_id])
+            await session.commit()
+
+    async def _write_progress(self) -> None:
+        while True:
+            await asyncio.sleep(self._progress_flush_interval)
+            try:
+                await self.flush_progress()
+            except Exception as e:  # pylint: disable=broad-except
+                logger.error("Failed to write download progress: %s", e)
+
+    async def flush_progress(self) -> None:
+        latest = await asyncio.to_thread(_drain, self._progress_queue)
+        params = [
+            {"b_id": progress.video_id, "b_progress": progress.downloaded_bytes / progress.total_bytes}
+            for progress in latest.values()
+            if progress.total_bytes
+        ]
+        if not params:
+            return
+
+        async with self._session_factory() as session:
+            await session.execute(
+                video_table.update()
+                .where(video_table.c.id == bindparam("b_id"))
+                .where(video_table.c.status == VideoStatus.DOWNLOADING)
+                .values(download_progress=bindparam("b_progress")),
+                params,
+            )
+            await session.commit()
+
+
+def _drain(progress_queue: "queue.Queue[DownloadProgress] | None") -> dict[int, DownloadProgress]:
+    latest: dict[int, DownloadProgress] = {}
+    while progress_queue is not None:
+        try:
+            progress = progress_queue.get_nowait()
+        except queue.Empty:
+            break
+        latest[progress.video_id] = progress
+    return latest
+
+
+_download_engine: DownloadEngine | None = None
+
+
+async def start_download_engine(session_factory: async_sessionmaker[AsyncSession]) -> None:
+    global _download_engine  # pylint: disable=global-statement
+    if _download_engine is not None:
+        return
+
+    _download_engine = DownloadEngine(session_factory)
+    await _download_engine.start()
+
+
+async def stop_download_engine() -> None:
+    global _download_engine  # pylint: disable=global-statement
+    if _download_engine is None:
+        return
+
+    engine, _download_engine = _download_engine, None
+    await engine.stop()
+
+
+def wake_download_engine() -> None:
+    if _download_engine is not None:
+        _download_engine.wake()
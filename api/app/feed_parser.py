@@ -0,0 +1,93 @@
+import io
+from collections.abc import Iterator
+from dataclasses import dataclass
+from datetime import datetime
+
+from lxml import etree
+
+ATOM_NAMESPACE = "http://www.w3.org/2005/Atom"
+NAMESPACES = {
+    "atom": ATOM_NAMESPACE,
+    "yt": "http://www.youtube.com/xml/schemas/2015",
+    "media": "http://search.yahoo.com/mrss/",
+}
+ENTRY_TAG = f"{{{ATOM_NAMESPACE}}}entry"
+# How YouTube opens an entry, counted without parsing the entries that are already known
+ENTRY_START = b"<entry>"
+
+_video_id = etree.XPath("string(yt:videoId)", namespaces=NAMESPACES)
+_title = etree.XPath("string(atom:title)", namespaces=NAMESPACES)
+_link = etree.XPath("string(atom:link/@href)", namespaces=NAMESPACES)
+_author = etree.XPath("string(atom:author/atom:name)", namespaces=NAMESPACES)
+_published = etree.XPath("string(atom:published)", namespaces=NAMESPACES)
+_description = etree.XPath("string(media:group/media:description)", namespaces=NAMESPACES)
+_thumbnail_url = etree.XPath("media:group/media:thumbnail/@url", namespaces=NAMESPACES)
+
+
+@dataclass(slots=True, frozen=True)
+class FeedEntry:
+    video_id: str
+    title: str
+    link: str
+    author: str
+    published: datetime
+    description: str
+    thumbnail_url: str | None
+
+
+@dataclass(slots=True, frozen=True)
+class FeedRead:
+    # Newest first, the entries before the first known video
+    entries: list[FeedEntry]
+    # Entries from the first known video on, they were not parsed
+    known: int
+
+    @property
+    def has_entries(self) -> bool:
+        return bool(self.entries) or self.known > 0
+
+
+def iter_feed_entries(response_content: str | bytes) -> Iterator[FeedEntry]:
+    """Lazily yield the entries of a YouTube Atom feed in document order.
+
+    Entries are parsed one at a time and released once yielded, so a consumer that stops early never parses the
+    rest of the document. Raises lxml.etree.XMLSyntaxError on malformed feeds.
+    """
+    if isinstance(response_content, str):
+        response_content = response_content.encode("utf-8")
+
+    entries = etree.iterparse(
+        io.BytesIO(response_content), events=("end",), tag=ENTRY_TAG, resolve_entities=False, no_network=True
+    )
+    for _, element in entries:
+        thumbnail_url = _thumbnail_url(element)
+        yield FeedEntry(
+            video_id=_video_id(element),
+            title=_title(element),
+            link=_link(element),
+            author=_author(element),
+            published=datetime.fromisoformat(_published(element)),
+            description=_description(element),
+            thumbnail_url=str(thumbnail_url[0]) if thumbnail_url else None,
+        )
+
+        element.clear(keep_tail=True)
+        while element.getprevious() is not None:
+            del element.getparent()[0]
+
+
+def read_new_entries(response_content: str | bytes, known_video_ids: set[str]) -> FeedRead:
+    """Return the entries newer than the first known video, and how many entries the feed lists from there on.
+
+    YouTube lists uploads newest first, everything after an entry we already stored has been seen before. Those
+    entries are only counted, not parsed.
+    """
+    if isinstance(response_content, str):
+        response_content = response_content.encode("utf-8")
+
+    new_entries: list[FeedEntry] = []
+    for entry in iter_feed_entries(response_content):
+        if entry.video_id in known_video_ids:
+            return FeedRead(new_entries, max(response_content.count(ENTRY_START) - len(new_entries), 1))
+        new_entries.append(entry)
+    return FeedRead(new_entries, 0)
@@ -1,32 +1,230 @@
-from collections.abc import Callable
+import re
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import (
+    ColumnElement,
+    and_,
+    bindparam,
+    case,
+    false,
+    func,
+    literal,
+    true,
+    update,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
 
 from app.models.subscription import (
+    ComparisonOperator,
     Filter,
+    FilterType,
     Video,
     VideoStatus,
+    ops,
 )
+from app.search import MIN_TERM_LENGTH, matching_video_ids
 
+KEYWORD_FIELDS = {FilterType.TITLE_CONTAINS: "title", FilterType.DESCRIPTION_CONTAINS: "description"}
+# Re-evaluating filters only moves videos between these two, everything else is still in the pipeline or done
+REEVALUATED_STATUSES = (VideoStatus.FILTERED, VideoStatus.PENDING_DOWNLOAD)
+video_table = Video.__table__  # type: ignore
 
-def apply_filters(videos: list[Video], filters: list[Filter]) -> list[Video]:
-    filter_predicates: list[Callable[[Video], bool]] = [f.to_callable() for f in filters]
 
-    # TODO: This is business logic. It should be moved the scheduler.
-    for video in videos:
-        if video.status == VideoStatus.OBTAINED_METADATA:
-            if all(f(video) for f in filter_predicates):
-                video.status = VideoStatus.PENDING_DOWNLOAD
-            else:
-                video.status = VideoStatus.FILTERED
+class KeywordMatcher:
+    """Finds which of many keywords occur in a text.
 
-    return videos
+    One combined regex search rules out texts without any keyword, which is most of them, in a single pass. Only texts
+    with a hit are checked keyword by keyword, with the same substring semantics as Filter.to_callable().
+    """
+
+    def __init__(self, keywords: Sequence[str]) -> None:
+        self._keywords = sorted(set(keywords), key=len, reverse=True)
+        self._pattern = re.compile("|".join(map(re.escape, self._keywords)))
+
+    def find(self, text: str) -> frozenset[str]:
+        first = self._pattern.search(text)
+        if first is None:
+            return frozenset()
+        # No keyword starts before the leftmost match
+        text = text[first.start() :]
+        return frozenset(keyword for keyword in self._keywords if keyword in text)
+
+
+class FilterPlan:
+    """A subscription's filters compiled once per sync and evaluated column by column over a batch of videos.
+
+    Keywords are lowercased and thresholds unpacked up front, keyword filters on the same field share one
+    KeywordMatcher. The results match Filter.to_callable() for every filter.
+    """
+
+    def __init__(self, filters: Sequence[Filter]) -> None:
+        self.filters = list(filters)
+        self._durations: list[tuple[int, Callable[[Any, Any], bool], int]] = []
+        self._published: list[tuple[int, Callable[[Any, Any], bool], datetime]] = []
+        keywords: dict[str, list[tuple[int, str]]] = {}
+
+        for index, f in enumerate(self.filters):
+            match f.filter_type:
+                case FilterType.DURATION:
+                    if f.threshold_seconds is not None and f.comparison_operator is not None:
+                        self._durations.append(
+                            (index, ops[ComparisonOperator(f.comparison_operator)], f.threshold_seconds)
+                        )
+                case FilterType.PUBLISHED_AFTER:
+                    if f.threshold_date is not None and f.comparison_operator is not None:
+                        self._published.append(
+                            (index, ops[ComparisonOperator(f.comparison_operator)], f.threshold_date)
+                        )
+                case FilterType.TITLE_CONTAINS | FilterType.DESCRIPTION_CONTAINS:
+                    if f.keyword:
+                        keywords.setdefault(KEYWORD_FIELDS[f.filter_type], []).append((index, f.keyword.lower()))
+                case _:
+                    raise ValueError(f"Unknown filter type: {f.filter_type}")
+
+        self._keywords = {
+            field: (KeywordMatcher([keyword for _, keyword in entries]), entries) for field, entries in keywords.items()
+        }
+
+    def evaluate(self, videos: Sequence[Video]) -> list[list[bool]]:
+        """One column per filter holding whether it matches each video. Unusable filters never match."""
+        columns = [[False] * len(videos) for _ in self.filters]
+
+        if self._durations:
+            durations = [video.duration for video in videos]
+            for index, compare, threshold in self._durations:
+                # Duration filters describe the videos to keep out, so a match is the comparison failing
+                columns[index] = [duration is not None and not compare(duration, threshold) for duration in durations]
+
+        if self._published:
+            published = [video.published for video in videos]
+            for index, compare, threshold in self._published:
+                columns[index] = [timestamp is not None and compare(timestamp, threshold) for timestamp in published]
+
+        for field, (matcher, entries) in self._keywords.items():
+            found = [
+                matcher.find(text.lower()) if text else frozenset() for text in (getattr(v, field) for v in videos)
+            ]
+            for index, keyword in entries:
+                columns[index] = [keyword in matched for matched in found]
+
+        return columns
+
+    def passes_all(self, videos: Sequence[Video]) -> list[bool]:
+        columns = self.evaluate(videos)
+        return [all(row) for row in zip(*columns)] if columns else [True] * len(videos)
 
+    def matching_filters(self, videos: Sequence[Video]) -> list[list[Filter]]:
+        columns = self.evaluate(videos)
+        if not columns:
+            return [[] for _ in videos]
+        return [[f for f, matched in zip(self.filters, row) if matched] for row in zip(*columns)]
 
-def applicable_filters(videos: list[Video], filters: list[Filter]) -> dict[Video, list[Filter]]:
-    result: dict[Video, list[Filter]] = {}
-    for video in videos:
-        applicable = [f for f in filters if f.to_callable()(video)]
-        if applicable:
-            if video not in result:
-                result[video] = []
-            result[video].extend(applicable)
-    return result
+
+def compile_filters(filters: Sequence[Filter]) -> FilterPlan:
+    return FilterPlan(filters)
+
+
+def filter_expression(f: Filter, use_search_index: bool = False) -> ColumnElement[bool] | None:
+    """The SQL equivalent of f.to_callable(), or None when the filter can only be evaluated in Python.
+
+    With use_search_index keyword filters are answered by the video_fts index instead of scanning every row.
+    """
+    match f.filter_type:
+        case FilterType.DURATION:
+            if f.threshold_seconds is None or f.comparison_operator is None:
+                return false()
+            duration = col(Video.duration)
+            compare = ops[ComparisonOperator(f.comparison_operator)]
+            return and_(duration.is_not(None), ~compare(duration, f.threshold_seconds))  # type: ignore[arg-type]
+        case FilterType.PUBLISHED_AFTER:
+            if f.threshold_date is None or f.comparison_operator is None:
+                return false()
+            published = col(Video.published)
+            compare = ops[ComparisonOperator(f.comparison_operator)]
+            return and_(published.is_not(None), compare(published, f.threshold_date))  # type: ignore[arg-type]
+        case FilterType.TITLE_CONTAINS | FilterType.DESCRIPTION_CONTAINS:
+            if not f.keyword:
+                return false()
+            if not f.keyword.isascii():
+                # SQLite's lower() only folds ASCII, Python's str.lower() folds everything
+                return None
+            field = KEYWORD_FIELDS[f.filter_type]
+            if use_search_index and len(f.keyword) >= MIN_TERM_LENGTH:
+                return col(Video.id).in_(matching_video_ids(f.keyword, field))
+            text = getattr(Video, field)
+            # instr() rather than LIKE, keywords may contain % and _
+            return func.coalesce(func.instr(func.lower(text), f.keyword.lower()), 0) > 0
+        case _:
+            raise ValueError(f"Unknown filter type: {f.filter_type}")
+
+
+def status_literal(status: VideoStatus) -> ColumnElement[VideoStatus]:
+    # Typed with the column's enum type, so the status is stored the same way the ORM stores it
+    return literal(status, video_table.c.status.type)
+
+
+@dataclass
+class FilterCounts:
+    pending_download: int
+    filtered: int
+
+
+async def reevaluate_filters(
+    session: AsyncSession, subscription_id: int, filters: Sequence[Filter], use_search_index: bool = False
+) -> FilterCounts:
+    """Move a subscription's videos between FILTERED and PENDING_DOWNLOAD after its filters changed.
+
+    Filters that all translate to SQL run as a single UPDATE, otherwise the videos are evaluated in Python. The
+    caller commits.
+    """
+    expressions = [filter_expression(f, use_search_index) for f in filters]
+    scope = and_(col(Video.subscription_id) == subscription_id, col(Video.status).in_(REEVALUATED_STATUSES))
+
+    if all(expression is not None for expression in expressions):
+        passes = and_(true(), *expressions)  # type: ignore[arg-type]
+        result = await session.execute(
+            update(Video)
+            .where(scope)
+            .values(
+                status=case(
+                    (passes, status_literal(VideoStatus.PENDING_DOWNLOAD)), else_=status_literal(VideoStatus.FILTERED)
+                )
+            )
+            .returning(col(Video.status))
+            .execution_options(synchronize_session=False)
+        )
+        statuses = result.scalars().all()
+    else:
+        # Only the columns filters look at are loaded, rows work with the plan just like videos do
+        rows = (
+            await session.execute(
+                select(
+                    col(Video.id), col(Video.title), col(Video.description), col(Video.duration), col(Video.published)
+                ).where(scope)
+            )
+        ).all()
+        statuses = [
+            VideoStatus.PENDING_DOWNLOAD if passed else VideoStatus.FILTERED
+            for passed in compile_filters(filters).passes_all(rows)  # type: ignore[arg-type]
+        ]
+        if rows:
+            await session.execute(
+                video_table.update().where(video_table.c.id == bindparam("b_id")).values(status=bindparam("b_status")),
+                [{"b_id": row.id, "b_status": status} for row, status in zip(rows, statuses)],
+            )
+
+    pending_download = sum(1 for status in statuses if status == VideoStatus.PENDING_DOWNLOAD)
+    return FilterCounts(pending_download=pending_download, filtered=len(statuses) - pending_download)
+
+
+def apply_filters(videos: list[Video], filters: list[Filter]) -> list[Video]:
+    # TODO: This is business logic. It should be moved the scheduler.
+    candidates = [video for video in videos if video.status == VideoStatus.OBTAINED_METADATA]
+    for video, passed in zip(candidates, compile_filters(filters).passes_all(candidates)):
+        video.status = VideoStatus.PENDING_DOWNLOAD if passed else VideoStatus.FILTERED
+
+    return videos
@@ -0,0 +1,83 @@
+import asyncio
+import importlib.util
+import logging
+from urllib.parse import urlsplit
+
+import httpx
+
+from app import rate_limit
+from app.config import (
+    HTTP_MAX_CONNECTIONS,
+    HTTP_MAX_CONNECTIONS_PER_HOST,
+    HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    TIMEOUT_IN_SECONDS,
+)
+
+logger = logging.getLogger(__name__)
+
+_client: httpx.AsyncClient | None = None
+_host_limits: dict[str, asyncio.Semaphore] = {}
+
+
+def http2_available() -> bool:
+    # httpx only speaks HTTP/2 when the optional h2 package is installed.
+    return importlib.util.find_spec("h2") is not None
+
+
+async def start_http_client(transport: httpx.AsyncBaseTransport | None = None) -> None:
+    global _client  # pylint: disable=global-statement
+    if _client is not None:
+        return
+
+    http2 = http2_available()
+    _client = httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=TIMEOUT_IN_SECONDS,
+        follow_redirects=True,
+        transport=transport,
+    )
+    logger.info("Started shared HTTP client (http2=%s)", http2)
+
+
+async def close_http_client() -> None:
+    global _client  # pylint: disable=global-statement
+    if _client is None:
+        return
+
+    client, _client = _client, None
+    _host_limits.clear()
+    await client.aclose()
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).netloc
+    semaphore = _host_limits.get(host)
+    if semaphore is None:
+        semaphore = _host_limits[host] = asyncio.Semaphore(HTTP_MAX_CONNECTIONS_PER_HOST)
+    return semaphore
+
+
+def _retry_after(response: httpx.Response) -> float | None:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        # Missing, or given as an HTTP date which is rare enough to fall back to the regular backoff
+        return None
+
+
+async def get(url: str, timeout: float = TIMEOUT_IN_SECONDS, headers: dict[str, str] | None = None) -> httpx.Response:
+    await rate_limit.acquire(url)
+    if _client is None:
+        # No shared client outside of the lifespan
+        async with httpx.AsyncClient(follow_redirects=True) as client:
+            response = await client.get(url, timeout=timeout, headers=headers)
+    else:
+        async with _host_limit(url):
+            response = await _client.get(url, timeout=timeout, headers=headers)
+
+    await rate_limit.report(url, response.status_code, _retry_after(response))
+    return response
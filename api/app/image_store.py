@@ -0,0 +1,123 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import tempfile
+from pathlib import Path
+
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, select
+
+from app.config import IMAGE_STORE_PATH
+from app.models.subscription import Subscription
+
+logger = logging.getLogger(__name__)
+
+# Resized variants are only produced for these widths, so a client cannot fill the disk with arbitrary sizes.
+VARIANT_WIDTHS = (48, 88, 176, 240, 480)
+
+
+def resizing_available() -> bool:
+    # Resized variants need the optional Pillow package, without it the original image is served.
+    return importlib.util.find_spec("PIL") is not None
+
+
+def image_media_type(content: bytes) -> str:
+    if content.startswith(b"\x89PNG"):
+        return "image/png"
+    if content[:4] == b"RIFF" and content[8:12] == b"WEBP":
+        return "image/webp"
+    if content.startswith(b"GIF8"):
+        return "image/gif"
+    return "image/jpeg"
+
+
+class ImageStore:
+    """Images on disk keyed by the SHA-256 of their content, a digest always refers to the same bytes."""
+
+    def __init__(self, root: str | Path) -> None:
+        self.root = Path(root)
+
+    def path(self, digest: str, width: int | None = None) -> Path:
+        # Two levels of fan-out keep directories small
+        directory = self.root / digest[:2] / digest[2:4]
+        return directory / (digest if width is None else f"{digest}-w{width}")
+
+    def put(self, content: bytes) -> str:
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        if not path.exists():
+            _write_atomically(path, content)
+        return digest
+
+    def exists(self, digest: str) -> bool:
+        return self.path(digest).is_file()
+
+    def variant(self, digest: str, width: int) -> Path:
+        """Path of the image resized to width, created on first use. Falls back to the original without Pillow."""
+        original = self.path(digest)
+        if not resizing_available():
+            return original
+
+        path = self.path(digest, width)
+        if not path.exists():
+            _write_atomically(path, _resize(original.read_bytes(), width))
+        return path
+
+
+def _write_atomically(path: Path, content: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=path.parent, delete=False) as file:
+        file.write(content)
+    os.replace(file.name, path)
+
+
+def _resize(content: bytes, width: int) -> bytes:
+    from PIL import Image  # pylint: disable=import-outside-toplevel
+
+    with Image.open(io.BytesIO(content)) as image:
+        image_format = image.format or "JPEG"
+        if image.width > width:
+            image.thumbnail((width, round(image.height * width / image.width)))
+        output = io.BytesIO()
+        image.save(output, format=image_format)
+    return output.getvalue()
+
+
+image_store = ImageStore(IMAGE_STORE_PATH)
+
+
+def get_image_store() -> ImageStore:
+    return image_store
+
+
+async def migrate_inline_image_batch(
+    session_factory: async_sessionmaker[AsyncSession], store: ImageStore, batch_size: int
+) -> int:
+    """Move base64 images stored on subscription rows into the image store, returns how many rows it moved."""
+    async with session_factory() as session:
+        result = await session.execute(
+            select(col(Subscription.id), col(Subscription.image))
+            .where(col(Subscription.image).is_not(None))
+            .limit(batch_size)
+        )
+        rows = result.all()
+        for subscription_id, image in rows:
+            try:
+                digest = await asyncio.to_thread(store.put, base64.b64decode(image))
+            except binascii.Error:
+                logger.warning("Dropping the undecodable image of subscription %d", subscription_id)
+                digest = None
+            await session.execute(
+                update(Subscription)
+                .where(col(Subscription.id) == subscription_id)
+                .values(image_hash=digest, image=None)
+                .execution_options(synchronize_session=False)
+            )
+        await session.commit()
+        return len(rows)
@@ -0,0 +1,73 @@
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, desc, select
+
+from app.feed_parser import FeedEntry
+from app.models.subscription import Video, VideoStatus
+
+logger = logging.getLogger(__name__)
+
+# YouTube feeds list the latest 15 uploads, the newest stored ids are enough to find where a feed stops being new.
+RECENT_VIDEO_IDS_LIMIT = 50
+
+
+@dataclass
+class IngestResult:
+    new: int
+    unchanged: int
+
+
+async def recent_video_ids(session: AsyncSession, subscription_id: int) -> set[str]:
+    result = await session.execute(
+        select(Video.video_id)
+        .where(Video.subscription_id == subscription_id)
+        .order_by(desc(Video.published))
+        .limit(RECENT_VIDEO_IDS_LIMIT)
+    )
+    return set(result.scalars().all())
+
+
+async def ingest_videos(
+    session: AsyncSession, subscription_id: int, entries: Sequence[FeedEntry], known: int = 0
+) -> IngestResult:
+    """Insert the feed entries that are not stored yet with one lookup and one INSERT.
+
+    known counts the feed's entries the parser skipped as already stored, they are reported as unchanged. The INSERT
+    skips conflicting video ids, so a concurrent sync of the same feed cannot fail the batch. Nothing is committed,
+    that is left to the caller.
+    """
+    if not entries:
+        return IngestResult(new=0, unchanged=known)
+
+    feed_video_ids = {entry.video_id for entry in entries}
+    existing = await session.execute(select(Video.video_id).where(col(Video.video_id).in_(feed_video_ids)))
+    known_video_ids = set(existing.scalars().all())
+
+    rows: dict[str, dict[str, object]] = {}
+    for entry in entries:
+        if entry.video_id in known_video_ids or entry.video_id in rows:
+            continue
+        rows[entry.video_id] = {
+            "title": entry.title,
+            "published": entry.published,
+            "video_id": entry.video_id,
+            "link": entry.link,
+            "author": entry.author,
+            "thumbnail_url": entry.thumbnail_url,
+            "description": entry.description,
+            "subscription_id": subscription_id,
+            "status": VideoStatus.PENDING,
+            "retry_count": 0,
+        }
+
+    inserted = 0
+    if rows:
+        statement = insert(Video).values(list(rows.values())).on_conflict_do_nothing(index_elements=["video_id"])
+        result = await session.execute(statement)
+        inserted = result.rowcount  # type: ignore
+
+    return IngestResult(new=inserted, unchanged=len(entries) - inserted + known)
@@ -0,0 +1,79 @@
+import glob
+import logging
+import shutil
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
+from sqlmodel import select
+
+from app.models.plex import Plex
+from app.models.subscription import PlexLibraryDestination, Subscription
+
+logger = logging.getLogger(__name__)
+TEST_FILE_NAME = "test_engawa.tmp"
+# Downloads are written below this directory inside the library and only renamed into place once complete
+PARTIAL_DIRECTORY_NAME = ".engawa-partial"
+INCOMPLETE_SUFFIXES = {".part", ".ytdl", ".temp"}
+
+
+def verify_write_access(dir_path: str) -> bool:
+    test_file = Path(dir_path) / TEST_FILE_NAME
+
+    try:
+        if test_file.exists():
+            test_file.unlink()
+
+        with test_file.open("w") as f:
+            f.write("test")
+
+        test_file.unlink()
+        return True
+
+    except Exception as e:  # pylint: disable=broad-except
+        logger.error("Filesystem write access verification failed: %s", e)
+        return False
+
+
+async def compute_library_path(plex_server: Plex | None, plex_library_path: PlexLibraryDestination) -> str:
+    # TODO: Before we download any videos, ensure we can write to the download directory
+    # In the error case, put the subscription in an error state and log the error
+    directories = plex_server.directories
+    directory = next((dir for dir in directories if dir.id == plex_library_path.directoryId), None)
+    if directory is None:
+        raise ValueError(f"Directory with id {plex_library_path.directoryId} not found")
+    return directory.locations[0].path
+
+
+async def resolve_download_path(subscription: Subscription, session: AsyncSession) -> str:
+    plex_library_path = subscription.plex_library_path
+    if isinstance(plex_library_path, dict):
+        # The JSON column loads back as a plain dict
+        plex_library_path = PlexLibraryDestination.model_validate(plex_library_path)
+
+    if isinstance(plex_library_path, str):
+        return plex_library_path
+
+    plex_results = await session.execute(select(Plex).options(selectinload(Plex.directories)))
+    plex_server = plex_results.scalars().first()
+    if plex_server is None:
+        raise ValueError("No Plex server found")
+
+    return await compute_library_path(plex_server, plex_library_path)
+
+
+def partial_download_dir(destination: str, video_id: int) -> Path:
+    return Path(destination) / PARTIAL_DIRECTORY_NAME / str(video_id)
+
+
+def remove_partial_download(destination: str, video_id: int) -> None:
+    shutil.rmtree(partial_download_dir(destination, video_id), ignore_errors=True)
+
+
+def find_downloaded_file(destination: str, youtube_video_id: str) -> str | None:
+    """Find a completed download in the library, downloads are named "<title> [<youtube id>].<ext>"."""
+    pattern = "*" + glob.escape(f" [{youtube_video_id}].") + "*"
+    for candidate in Path(destination).glob(pattern):
+        if candidate.is_file() and candidate.suffix not in INCOMPLETE_SUFFIXES:
+            return str(candidate)
+    return None
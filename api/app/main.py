@@ -1,3 +1,5 @@
+import asyncio
+import contextlib
 import logging
 from contextlib import asynccontextmanager
 
@@ -6,11 +8,20 @@ from fastapi.middleware.cors import CORSMiddleware
 
 # from fastapi.responses import FileResponse
 # from fastapi.staticfiles import StaticFiles
-from sqlmodel import SQLModel
-
-from app.database.session import engine
+from app.database.migrations import migrate, run_backfills
+from app.database.session import engine, session_factory
+from app.download_engine import start_download_engine, stop_download_engine
+from app.http_client import close_http_client, start_http_client
+from app.metadata_cache import MetadataCache
+from app.rate_limit import start_rate_limiter, stop_rate_limiter
+from app.retention import wait_for_file_deletions
 from app.routers.router import base_router as router
 from app.scheduler import scheduler
+from app.yt_downloader import (
+    set_metadata_cache,
+    shutdown_metadata_pool,
+    start_metadata_pool,
+)
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s: %(message)s")
 logging.getLogger("uvicorn.access").setLevel(logging.INFO)
@@ -22,8 +33,16 @@ logging.getLogger("apscheduler").setLevel(logging.ERROR)
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+    await migrate(engine)
+
+    # The shared rate limiter, HTTP client and metadata pool only exist within the lifespan. Code running outside of
+    # it, like tests and scripts, falls back to a per-process limiter, a throwaway client and a throwaway pool.
+    await start_rate_limiter()
+    await start_http_client()
+    await start_metadata_pool()
+    set_metadata_cache(MetadataCache(session_factory))
+    await start_download_engine(session_factory)
+    backfills = asyncio.create_task(run_backfills(session_factory))
 
     # TODO: Re-enable scheduler
     if not scheduler.running:
@@ -34,6 +53,17 @@ async def lifespan(_app: FastAPI):
     if scheduler.running:
         scheduler.shutdown()  # type: ignore
 
+    # Backfills resume where they stopped on the next start
+    backfills.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await backfills
+    await wait_for_file_deletions()
+    await stop_download_engine()
+    set_metadata_cache(None)
+    await shutdown_metadata_pool()
+    await close_http_client()
+    await stop_rate_limiter()
+
     await engine.dispose()
 
 
@@ -57,4 +87,5 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Capped"],
 )
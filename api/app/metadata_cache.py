@@ -0,0 +1,159 @@
+import json
+import logging
+from collections import OrderedDict
+from collections.abc import Callable, Sequence
+from dataclasses import asdict
+from datetime import datetime, timedelta
+from typing import Any
+from urllib.parse import parse_qs, urlsplit
+
+from pytz import utc
+from sqlalchemy import delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, select
+
+from app.config import METADATA_CACHE_SIZE
+from app.models.subscription import MetadataCacheEntry, MetadataErrorType
+from app.yt_downloader import (
+    MetadataError,
+    MetadataResult,
+    MetadataSuccess,
+    VideoMetadata,
+)
+
+logger = logging.getLogger(__name__)
+
+SUCCESS_TTL = timedelta(days=7)
+# Errors expire depending on how likely they are to go away on their own.
+ERROR_TTLS: dict[MetadataErrorType, timedelta] = {
+    MetadataErrorType.LIVE_EVENT_NOT_STARTED: timedelta(minutes=10),
+    MetadataErrorType.UNKNOWN_ERROR: timedelta(minutes=5),
+    MetadataErrorType.VIDEO_UNAVAILABLE: timedelta(hours=6),
+    MetadataErrorType.AGE_RESTRICTED: timedelta(days=30),
+    MetadataErrorType.COPYRIGHT_STRIKE: timedelta(days=30),
+}
+
+YOUTUBE_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com"}
+
+
+def youtube_video_id(url: str) -> str | None:
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host == "youtu.be":
+        return parts.path.strip("/") or None
+    if host not in YOUTUBE_HOSTS:
+        return None
+    if parts.path == "/watch":
+        return next(iter(parse_qs(parts.query).get("v", [])), None)
+    for prefix in ("/shorts/", "/live/", "/embed/"):
+        if parts.path.startswith(prefix):
+            return parts.path.removeprefix(prefix).strip("/") or None
+    return None
+
+
+def ttl_for(result: MetadataResult) -> timedelta:
+    match result:
+        case MetadataSuccess():
+            return SUCCESS_TTL
+        case MetadataError(error_type=error_type):
+            return ERROR_TTLS.get(error_type, timedelta(0))
+
+
+def dump_result(result: MetadataResult) -> str:
+    match result:
+        case MetadataSuccess(metadata=metadata):
+            fields = asdict(metadata) | {"upload_date": metadata.upload_date.isoformat()}
+            return json.dumps({"metadata": fields})
+        case MetadataError(error_type=error_type, message=message):
+            return json.dumps({"error_type": error_type.value, "message": message})
+
+
+def load_result(url: str, payload: str) -> MetadataResult:
+    data: dict[str, Any] = json.loads(payload)
+    if "metadata" in data:
+        fields = data["metadata"] | {"upload_date": datetime.fromisoformat(data["metadata"]["upload_date"])}
+        return MetadataSuccess(url=url, metadata=VideoMetadata(**fields))
+    return MetadataError(url, MetadataErrorType(data["error_type"]), data["message"])
+
+
+class MetadataCache:
+    """Two tier cache of yt-dlp metadata results keyed by YouTube video id.
+
+    A bounded in-memory LRU sits in front of the metadatacacheentry table, so results survive restarts. Successes
+    are kept for SUCCESS_TTL and errors for their entry in ERROR_TTLS.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker[AsyncSession],
+        max_entries: int = METADATA_CACHE_SIZE,
+        clock: Callable[[], datetime] = lambda: datetime.now(utc),
+    ) -> None:
+        self._session_factory = session_factory
+        self._max_entries = max_entries
+        self._clock = clock
+        self._memory: OrderedDict[str, tuple[datetime, str]] = OrderedDict()
+
+    def _remember(self, video_id: str, expires_at: datetime, payload: str) -> None:
+        self._memory[video_id] = (expires_at, payload)
+        self._memory.move_to_end(video_id)
+        while len(self._memory) > self._max_entries:
+            self._memory.popitem(last=False)
+
+    async def get_many(self, urls: Sequence[str]) -> dict[str, MetadataResult]:
+        now = self._clock()
+        found: dict[str, str] = {}
+        missing: set[str] = set()
+
+        for url in urls:
+            video_id = youtube_video_id(url)
+            if video_id is None:
+                continue
+            entry = self._memory.get(video_id)
+            if entry is not None and entry[0] > now:
+                self._memory.move_to_end(video_id)
+                found[video_id] = entry[1]
+            else:
+                missing.add(video_id)
+
+        if missing:
+            async with self._session_factory() as session:
+                rows = await session.execute(
+                    select(MetadataCacheEntry)
+                    .where(col(MetadataCacheEntry.video_id).in_(missing))
+                    .where(MetadataCacheEntry.expires_at > now)
+                )
+                for row in rows.scalars().all():
+                    self._remember(row.video_id, utc.localize(row.expires_at), row.payload)
+                    found[row.video_id] = row.payload
+
+        results: dict[str, MetadataResult] = {}
+        for url in urls:
+            video_id = youtube_video_id(url)
+            if video_id in found:
+                results[url] = load_result(url, found[video_id])
+        return results
+
+    async def put_many(self, results: Sequence[MetadataResult]) -> None:
+        now = self._clock()
+        rows: dict[str, dict[str, Any]] = {}
+        for result in results:
+            video_id = youtube_video_id(result.url)
+            ttl = ttl_for(result)
+            if video_id is None or ttl <= timedelta(0):
+                continue
+            payload = dump_result(result)
+            self._remember(video_id, now + ttl, payload)
+            rows[video_id] = {"video_id": video_id, "payload": payload, "expires_at": now + ttl}
+
+        async with self._session_factory() as session:
+            await session.execute(delete(MetadataCacheEntry).where(col(MetadataCacheEntry.expires_at) <= now))
+            if rows:
+                statement = insert(MetadataCacheEntry).values(list(rows.values()))
+                statement = statement.on_conflict_do_update(
+                    index_elements=["video_id"],
+                    set_={"payload": statement.excluded.payload, "expires_at": statement.excluded.expires_at},
+                )
+                await session.execute(statement)
+            await session.commit()
@@ -4,7 +4,7 @@ from enum import StrEnum
 from typing import Literal, TypeVar
 
 from pydantic import BaseModel
-from sqlalchemy import JSON, Column
+from sqlalchemy import JSON, Column, Index
 from sqlalchemy.orm import Mapped
 from sqlmodel import Field, Relationship, SQLModel  # type: ignore
 
@@ -56,7 +56,7 @@ class PlexLibraryDestination(SQLModel):
 
 class RetentionPolicy(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
-    subscription_id: int | None = Field(default=None, foreign_key="subscription.id")
+    subscription_id: int | None = Field(default=None, foreign_key="subscription.id", index=True)
     subscription: "Subscription" = Relationship(back_populates="retention")  # TODO: Why the name discrepancy works?
     type: RetentionType
     videoCount: int
@@ -68,8 +68,12 @@ class Subscription(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     description: str = Field(default=None)
     filters: list["Filter"] = Relationship(back_populates="subscription")
+    # Legacy base64 image, moved to the image store at startup and replaced by image_hash
     image: str | None = None
+    image_hash: str | None = Field(default=None)
     last_updated: datetime | None = Field(default=None, index=True)
+    # When the scheduler syncs the subscription next, None until its first sync under adaptive scheduling
+    next_sync_at: datetime | None = Field(default=None, index=True)
     # TODO: Rename this to be more generic as a destination (Not just plex related)
     plex_library_path: PlexLibraryDestination | str = Field(sa_column=Column(JSON))
     retention: RetentionPolicy = Relationship(back_populates="subscription")
@@ -80,10 +84,18 @@ class Subscription(SQLModel, table=True):
     url: str = Field(default=None, unique=True)
     videos: Mapped[list["Video"]] = Relationship(
         back_populates="subscription",
-        sa_relationship_kwargs={"lazy": "selectin", "cascade": "all, delete-orphan"},
+        sa_relationship_kwargs={"cascade": "all, delete-orphan"},
     )
 
 
+class SubscriptionSummary(SQLModel):
+    id: int
+    title: str
+    last_updated: datetime | None
+    video_counts: dict[str, int]
+    image_url: str | None
+
+
 #  TODO: We should split out the reasons for filtering or excluding a video.
 class VideoStatus(StrEnum):
     PENDING = "Pending"
@@ -145,15 +157,31 @@ ops: dict[ComparisonOperator, ComparisonFunc[datetime]] = {
 
 
 class Video(SQLModel, table=True):
+    # Every index ends in the rowid, so ties on published are ordered by id without a sort
+    __table_args__ = (
+        # A subscription's videos in a status: the sync pipeline, retention and the status filtered video list
+        Index("ix_video_subscription_status_published", "subscription_id", "status", "published"),
+        # A subscription's video list and the per-status summary counts
+        Index("ix_video_subscription_published", "subscription_id", "published"),
+        # The download queue, newest first
+        Index("ix_video_status_published", "status", "published"),
+        # Retries that are due, across every subscription
+        Index("ix_video_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
     id: int = Field(default=None, primary_key=True)
     author: str
     duration: int | None = Field(default=None, alias="duration")
     description: str | None
+    download_progress: float | None = Field(default=None)
+    file_path: str | None = Field(default=None)
     # filtered_reason: list[FilterType] | None = None
     link: str
     published: datetime | None = Field(default=None, index=True)
     metadata_error: MetadataErrorType | None = Field(default=None)
     retry_count: int = Field(default=0)
+    # When a FAILED video is tried again, None once it ran out of attempts
+    next_attempt_at: datetime | None = Field(default=None)
     status: VideoStatus = Field(sa_column_kwargs={"default": VideoStatus.PENDING}, index=True)
     subscription_id: int = Field(default=None, foreign_key="subscription.id", index=True)
     subscription: Mapped[Subscription] = Relationship(back_populates="videos")
@@ -162,6 +190,24 @@ class Video(SQLModel, table=True):
     video_id: str = Field(unique=True)
 
 
+class RssFeedCache(SQLModel, table=True):
+    """Validators of the last processed copy of an RSS feed, used to skip feeds that have not changed."""
+
+    url: str = Field(primary_key=True)
+    etag: str | None = Field(default=None)
+    last_modified: str | None = Field(default=None)
+    content_hash: str | None = Field(default=None)
+    checked_at: datetime | None = Field(default=None)
+
+
+class MetadataCacheEntry(SQLModel, table=True):
+    """Persistent tier of the yt-dlp metadata cache, keyed by YouTube video id."""
+
+    video_id: str = Field(primary_key=True)
+    payload: str
+    expires_at: datetime = Field(index=True)
+
+
 class ChannelInfo(SQLModel, table=True):
     id: int = Field(default=None, primary_key=True)
     title: str
@@ -179,7 +225,7 @@ class Filter(SQLModel, table=True):
     threshold_seconds: int | None = Field(default=None)
     threshold_date: datetime | None = Field(default=None)
 
-    subscription_id: int | None = Field(default=None, foreign_key="subscription.id")
+    subscription_id: int | None = Field(default=None, foreign_key="subscription.id", index=True)
     subscription: Subscription = Relationship(back_populates="filters")
 
     def to_callable(self) -> Callable[[Video], bool]:
@@ -0,0 +1,62 @@
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy import ColumnElement, and_, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from app.models.subscription import Video
+
+# Counting stops here, past this a subscription's video count is reported as capped rather than exact.
+APPROXIMATE_COUNT_CAP = 10_000
+
+
+class InvalidCursorError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class VideoCursor:
+    """Position after the last video of a page, videos are ordered by (published, id) descending."""
+
+    published: datetime | None
+    id: int
+
+    def encode(self) -> str:
+        payload = json.dumps([self.published.isoformat() if self.published else None, self.id])
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    @classmethod
+    def decode(cls, cursor: str) -> "VideoCursor":
+        try:
+            payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            published, video_id = json.loads(payload)
+            return cls(datetime.fromisoformat(published) if published else None, int(video_id))
+        except (binascii.Error, ValueError, TypeError) as e:
+            raise InvalidCursorError(f"Invalid cursor: {cursor}") from e
+
+    @classmethod
+    def after(cls, video: Any) -> "VideoCursor":
+        return cls(video.published, video.id)
+
+    def condition(self) -> ColumnElement[bool]:
+        """Videos that come after this cursor, SQLite sorts NULL published dates last when descending."""
+        published, video_id = col(Video.published), col(Video.id)
+        if self.published is None:
+            return and_(published.is_(None), video_id < self.id)
+        return or_(
+            published < self.published,
+            and_(published == self.published, video_id < self.id),
+            published.is_(None),
+        )
+
+
+async def approximate_count(session: AsyncSession, *conditions: ColumnElement[bool]) -> tuple[int, bool]:
+    """Count matching videos up to APPROXIMATE_COUNT_CAP, returns the count and whether it hit the cap."""
+    capped = select(col(Video.id)).where(*conditions).limit(APPROXIMATE_COUNT_CAP).subquery()
+    count = (await session.execute(select(func.count()).select_from(capped))).scalar_one()
+    return count, count >= APPROXIMATE_COUNT_CAP
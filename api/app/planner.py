@@ -0,0 +1,151 @@
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import datetime, time
+from typing import Any
+
+from pytz import utc
+from sqlalchemy import bindparam
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from app.filters import compile_filters, video_table
+from app.models.subscription import (
+    Filter,
+    FilterType,
+    RetentionPolicy,
+    RetentionType,
+    Video,
+    VideoStatus,
+)
+from app.sync_schedule import as_utc
+
+logger = logging.getLogger(__name__)
+
+# Videos the planner decides about, RETENTION_SKIPPED ones are reconsidered on every sync
+PLANNED_STATUSES = (VideoStatus.PENDING, VideoStatus.RETENTION_SKIPPED)
+# Videos on their way to the library, they take up places a COUNT policy keeps
+RETAINED_STATUSES = (
+    VideoStatus.OBTAINED_METADATA,
+    VideoStatus.PENDING_DOWNLOAD,
+    VideoStatus.DOWNLOADING,
+    VideoStatus.DOWNLOADED,
+)
+# The feed already carries everything these filters look at, duration filters need the video's metadata
+FEED_FILTER_TYPES = (FilterType.TITLE_CONTAINS, FilterType.DESCRIPTION_CONTAINS, FilterType.PUBLISHED_AFTER)
+
+
+@dataclass
+class SyncPlan:
+    # Newest first, the videos worth fetching metadata for
+    fetch: list[int] = field(default_factory=list)
+    skipped: int = 0
+    filtered: int = 0
+
+
+def newest_first(row: Any) -> tuple[bool, datetime, int]:
+    # Sort key for reverse sorting, videos without a publish date count as the oldest like in SQL
+    return row.published is not None, row.published or datetime.min, row.id
+
+
+def retention_cutoff(policy: RetentionPolicy, now: datetime) -> datetime | None:
+    match policy.type:
+        case RetentionType.DATE_SINCE:
+            return datetime.combine(policy.dateBefore, time(), tzinfo=utc)
+        case RetentionType.DELTA:
+            return as_utc(now) - policy.timeDeltaTypeValue
+        case _:
+            return None
+
+
+async def plan_sync(
+    session: AsyncSession,
+    subscription_id: int,
+    policy: RetentionPolicy | None,
+    filters: Sequence[Filter],
+    now: datetime | None = None,
+) -> SyncPlan:
+    """Decide which new videos are worth fetching metadata for and downloading.
+
+    Videos the feed filters reject are FILTERED and videos the retention policy would delete right after their
+    download are RETENTION_SKIPPED, both without a metadata call. Every other new video is left PENDING. The caller
+    commits.
+    """
+    rows = (
+        await session.execute(
+            select(
+                col(Video.id),
+                col(Video.status),
+                col(Video.title),
+                col(Video.description),
+                col(Video.duration),
+                col(Video.published),
+            ).where(col(Video.subscription_id) == subscription_id, col(Video.status).in_(PLANNED_STATUSES))
+        )
+    ).all()
+    if not rows:
+        return SyncPlan()
+
+    plan = SyncPlan()
+    statuses: dict[int, VideoStatus] = {}
+
+    feed_filters = compile_filters([f for f in filters if f.filter_type in FEED_FILTER_TYPES])
+    candidates = []
+    for row, passed in zip(rows, feed_filters.passes_all(rows)):  # type: ignore[arg-type]
+        if passed:
+            candidates.append(row)
+        else:
+            statuses[row.id] = VideoStatus.FILTERED
+            plan.filtered += 1
+
+    if policy is not None:
+        kept = await _retained(session, subscription_id, policy, candidates, now or datetime.now(utc))
+    else:
+        kept = candidates
+
+    kept_ids = {row.id for row in kept}
+    for row in candidates:
+        statuses[row.id] = VideoStatus.PENDING if row.id in kept_ids else VideoStatus.RETENTION_SKIPPED
+    plan.skipped = len(candidates) - len(kept)
+    plan.fetch = [row.id for row in sorted(kept, key=newest_first, reverse=True)]
+
+    changed = [
+        {"b_id": row.id, "b_status": statuses[row.id]} for row in rows if statuses[row.id] != VideoStatus(row.status)
+    ]
+    if changed:
+        await session.execute(
+            video_table.update().where(video_table.c.id == bindparam("b_id")).values(status=bindparam("b_status")),
+            changed,
+        )
+    if plan.skipped or plan.filtered:
+        logger.info(
+            "Subscription %d: fetching %d new videos, %d skipped by retention and %d filtered",
+            subscription_id,
+            len(plan.fetch),
+            plan.skipped,
+            plan.filtered,
+        )
+    return plan
+
+
+async def _retained(
+    session: AsyncSession, subscription_id: int, policy: RetentionPolicy, candidates: list[Any], now: datetime
+) -> list[Any]:
+    """The candidates the retention policy would keep once downloaded."""
+    if policy.type != RetentionType.COUNT:
+        cutoff = retention_cutoff(policy, now)
+        return [row for row in candidates if row.published is None or cutoff is None or as_utc(row.published) >= cutoff]
+
+    # Only the newest videoCount retained videos can push a candidate out of the window
+    published, video_id = col(Video.published), col(Video.id)
+    retained = (
+        await session.execute(
+            select(video_id, published)
+            .where(col(Video.subscription_id) == subscription_id, col(Video.status).in_(RETAINED_STATUSES))
+            .order_by(published.desc(), video_id.desc())
+            .limit(policy.videoCount)
+        )
+    ).all()
+    window = sorted([*retained, *candidates], key=newest_first, reverse=True)[: policy.videoCount]
+    in_window = {row.id for row in window}
+    return [row for row in candidates if row.id in in_window]
@@ -0,0 +1,236 @@
+import asyncio
+import logging
+import multiprocessing
+import random
+import re
+import threading
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from multiprocessing.managers import BaseManager
+from typing import Protocol
+from urllib.parse import urlsplit
+
+from app.config import (
+    RATE_LIMIT_BURST,
+    RATE_LIMIT_MAX_BACKOFF_SECONDS,
+    RATE_LIMIT_MIN_REQUESTS_PER_SECOND,
+    RATE_LIMIT_REQUESTS_PER_SECOND,
+)
+
+logger = logging.getLogger(__name__)
+
+# Rate decrease on a throttled response and the share of the configured rate recovered per successful response.
+BACKOFF_RATE_FACTOR = 0.5
+RECOVERY_RATE_FRACTION = 0.1
+BASE_BACKOFF_SECONDS = 1.0
+# Waits are stretched by up to this fraction so callers released together do not hit the host at the same instant.
+JITTER_FRACTION = 0.1
+HTTP_ERROR_PATTERN = re.compile(r"HTTP Error (\d{3})")
+
+
+@dataclass
+class HostRate:
+    host: str
+    requests_per_second: float
+    tokens: float
+    backoff_seconds: float
+    throttled_responses: int
+
+
+@dataclass(slots=True)
+class _Bucket:
+    rate: float
+    tokens: float
+    updated_at: float
+    backoff_until: float = 0.0
+    consecutive_failures: int = 0
+    throttled_responses: int = 0
+
+
+class RateLimiterLike(Protocol):
+    def reserve(self, host: str) -> float: ...
+
+    def report(self, host: str, status_code: int, retry_after: float | None = None) -> None: ...
+
+    def rates(self) -> list[HostRate]: ...
+
+
+class RateLimiter:
+    """Per-host token buckets with adaptive backoff.
+
+    Callers reserve a token and sleep for the returned delay themselves, so the limiter never blocks and can be
+    shared between processes through a manager. A 429 or 5xx response halves the host's rate and pauses it with
+    exponential backoff, successful responses slowly bring the rate back up to the configured one.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = RATE_LIMIT_REQUESTS_PER_SECOND,
+        burst: int = RATE_LIMIT_BURST,
+        min_requests_per_second: float = RATE_LIMIT_MIN_REQUESTS_PER_SECOND,
+        max_backoff: float = RATE_LIMIT_MAX_BACKOFF_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+        rng: random.Random | None = None,
+    ) -> None:
+        self._requests_per_second = requests_per_second
+        self._burst = burst
+        self._min_requests_per_second = min_requests_per_second
+        self._max_backoff = max_backoff
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._buckets: dict[str, _Bucket] = {}
+        # The manager serves every connection from its own thread
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str, now: float) -> _Bucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _Bucket(self._requests_per_second, self._burst, now)
+        else:
+            bucket.tokens = min(self._burst, bucket.tokens + (now - bucket.updated_at) * bucket.rate)
+            bucket.updated_at = now
+        return bucket
+
+    def reserve(self, host: str) -> float:
+        """Take a token for host and return how many seconds the caller has to wait before using it."""
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(host, now)
+            # Tokens go negative while callers are queued, each one waits for its own refill
+            bucket.tokens -= 1
+            delay = max(-bucket.tokens / bucket.rate, bucket.backoff_until - now, 0.0)
+            if delay > 0:
+                delay += self._rng.uniform(0, delay * JITTER_FRACTION)
+            return delay
+
+    def report(self, host: str, status_code: int, retry_after: float | None = None) -> None:
+        with self._lock:
+            now = self._clock()
+            bucket = self._bucket(host, now)
+            if status_code == 429 or status_code >= 500:
+                bucket.rate = max(self._min_requests_per_second, bucket.rate * BACKOFF_RATE_FACTOR)
+                bucket.consecutive_failures += 1
+                bucket.throttled_responses += 1
+                backoff = min(self._max_backoff, BASE_BACKOFF_SECONDS * 2 ** (bucket.consecutive_failures - 1))
+                # Equal jitter, at least half of the backoff and never less than what the host asked for
+                backoff = max(backoff / 2 + self._rng.uniform(0, backoff / 2), retry_after or 0.0)
+                bucket.backoff_until = max(bucket.backoff_until, now + backoff)
+                logger.warning(
+                    "%s responded with %d, backing off for %.1fs at %.2f requests per second",
+                    host,
+                    status_code,
+                    backoff,
+                    bucket.rate,
+                )
+            elif status_code < 400:
+                bucket.consecutive_failures = 0
+                bucket.rate = min(
+                    self._requests_per_second, bucket.rate + self._requests_per_second * RECOVERY_RATE_FRACTION
+                )
+
+    def rates(self) -> list[HostRate]:
+        with self._lock:
+            now = self._clock()
+            return [
+                HostRate(
+                    host=host,
+                    requests_per_second=bucket.rate,
+                    tokens=min(self._burst, bucket.tokens + (now - bucket.updated_at) * bucket.rate),
+                    backoff_seconds=max(bucket.backoff_until - now, 0.0),
+                    throttled_responses=bucket.throttled_responses,
+                )
+                for host, bucket in sorted(self._buckets.items())
+            ]
+
+
+class RateLimitManager(BaseManager):
+    pass
+
+
+_shared_limiter = RateLimiter()
+
+
+def _get_shared_limiter() -> RateLimiter:
+    return _shared_limiter
+
+
+RateLimitManager.register("limiter", callable=_get_shared_limiter, exposed=("reserve", "report", "rates"))
+
+_manager: RateLimitManager | None = None
+_limiter: RateLimiterLike | None = None
+
+
+def host_of(url: str) -> str:
+    return urlsplit(url).netloc.lower()
+
+
+def status_from_error(message: str) -> int | None:
+    """Extract the HTTP status from a yt-dlp error message such as "HTTP Error 429: Too Many Requests"."""
+    match = HTTP_ERROR_PATTERN.search(message)
+    return int(match.group(1)) if match else None
+
+
+def get_rate_limiter() -> RateLimiterLike:
+    global _limiter  # pylint: disable=global-statement
+    if _limiter is None:
+        # Per process outside of the lifespan and in pools without the shared limiter
+        _limiter = RateLimiter()
+    return _limiter
+
+
+def shared_rate_limiter() -> RateLimiterLike | None:
+    """The manager proxy to hand to worker pools, None while the shared limiter is not running."""
+    return _limiter if _manager is not None else None
+
+
+def set_rate_limiter(limiter: RateLimiterLike | None) -> None:
+    """Install the limiter used by this process, worker pool initializers pass the manager proxy in here."""
+    global _limiter  # pylint: disable=global-statement
+    _limiter = limiter
+
+
+async def start_rate_limiter() -> RateLimiterLike:
+    """Start the manager process holding the buckets shared by the app and every worker pool."""
+    global _manager  # pylint: disable=global-statement
+    if _manager is None:
+        _manager = RateLimitManager(ctx=multiprocessing.get_context("spawn"))
+        await asyncio.to_thread(_manager.start)
+        set_rate_limiter(_manager.limiter())  # type: ignore[attr-defined]
+        logger.info("Started rate limiter")
+    return get_rate_limiter()
+
+
+async def stop_rate_limiter() -> None:
+    global _manager  # pylint: disable=global-statement
+    if _manager is None:
+        return
+
+    manager, _manager = _manager, None
+    set_rate_limiter(None)
+    await asyncio.to_thread(manager.shutdown)
+
+
+async def acquire(url: str) -> None:
+    # Proxy calls are a blocking round trip to the manager process, keep them off the event loop
+    delay = await asyncio.to_thread(get_rate_limiter().reserve, host_of(url))
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+
+async def report(url: str, status_code: int, retry_after: float | None = None) -> None:
+    await asyncio.to_thread(get_rate_limiter().report, host_of(url), status_code, retry_after)
+
+
+def acquire_blocking(url: str) -> None:
+    delay = get_rate_limiter().reserve(host_of(url))
+    if delay > 0:
+        time.sleep(delay)
+
+
+def report_blocking(url: str, status_code: int) -> None:
+    get_rate_limiter().report(host_of(url), status_code)
+
+
+async def current_rates() -> list[HostRate]:
+    return await asyncio.to_thread(get_rate_limiter().rates)
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+from collections.abc import Sequence
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from pytz import utc
+from sqlalchemy import ColumnElement, CompoundSelect, func, literal, union_all, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from app.config import RETENTION_DELETE_CONCURRENCY
+from app.models.subscription import RetentionPolicy, RetentionType, Video, VideoStatus
+from app.sync_schedule import as_utc
+
+logger = logging.getLogger(__name__)
+
+# Julian day of the epoch SQLAlchemy's Interval type is stored relative to on SQLite
+INTERVAL_EPOCH_JULIAN_DAY = 2440587.5
+
+_deletions: set[asyncio.Task[int]] = set()
+
+
+@dataclass
+class RetentionResult:
+    deleted: int = 0
+    files: list[str] = field(default_factory=list)
+
+
+def expired_videos(now: datetime, subscription_id: int | None = None) -> CompoundSelect:
+    """Ids of the downloaded videos their subscription's retention policy no longer keeps, one branch per policy type.
+
+    Without a subscription_id every subscription is covered in the same query.
+    """
+    video_id, published = col(Video.id), col(Video.published)
+    scope: list[ColumnElement[bool]] = [
+        col(Video.status) == VideoStatus.DOWNLOADED,
+        col(RetentionPolicy.subscription_id) == col(Video.subscription_id),
+    ]
+    if subscription_id is not None:
+        scope.append(col(Video.subscription_id) == subscription_id)
+
+    # COUNT keeps the newest videoCount downloads, videos without a publish date count as the oldest
+    position = (
+        func.row_number()
+        .over(partition_by=col(Video.subscription_id), order_by=(published.desc(), video_id.desc()))
+        .label("position")
+    )
+    ranked = (
+        select(video_id, position, col(RetentionPolicy.videoCount).label("keep"))
+        .where(*scope, col(RetentionPolicy.type) == RetentionType.COUNT)
+        .subquery()
+    )
+    over_count = select(ranked.c.id).where(ranked.c.position > ranked.c.keep)
+
+    # DATE_SINCE keeps videos published on or after dateBefore
+    before_date = select(video_id).where(
+        *scope, col(RetentionPolicy.type) == RetentionType.DATE_SINCE, published < col(RetentionPolicy.dateBefore)
+    )
+
+    # DELTA keeps videos published within timeDeltaTypeValue of now, the interval is stored as a datetime after the
+    # epoch so its length in days is its Julian day minus the epoch's
+    window_days = func.julianday(col(RetentionPolicy.timeDeltaTypeValue)) - INTERVAL_EPOCH_JULIAN_DAY
+    # published is stored as naive UTC, now is compared the same way
+    utc_now = as_utc(now).astimezone(utc).replace(tzinfo=None)
+    outside_window = select(video_id).where(
+        *scope,
+        col(RetentionPolicy.type) == RetentionType.DELTA,
+        func.julianday(published) < func.julianday(literal(utc_now)) - window_days,
+    )
+
+    # Each branch reads video on its own, correlated to the UPDATE's video table they would run once per row
+    return union_all(*(branch.correlate(None) for branch in (over_count, before_date, outside_window)))
+
+
+async def apply_retention(
+    session: AsyncSession, subscription_id: int | None = None, now: datetime | None = None
+) -> RetentionResult:
+    """Mark every video past its retention policy DELETED in one UPDATE, returns the files to remove.
+
+    The caller commits and should only delete the files afterwards.
+    """
+    result = await session.execute(
+        update(Video)
+        .where(col(Video.id).in_(expired_videos(now or datetime.now(utc), subscription_id)))
+        .values(status=VideoStatus.DELETED)
+        .returning(col(Video.file_path))
+        .execution_options(synchronize_session=False)
+    )
+    file_paths = result.scalars().all()
+    return RetentionResult(deleted=len(file_paths), files=[path for path in file_paths if path])
+
+
+def _delete_file(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logger.warning("Failed to delete %s: %s", path, e)
+        return False
+
+
+async def delete_files(paths: Sequence[str], concurrency: int = RETENTION_DELETE_CONCURRENCY) -> int:
+    """Delete files with at most concurrency removals in flight, returns how many were deleted."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(path: str) -> bool:
+        async with semaphore:
+            return await asyncio.to_thread(_delete_file, path)
+
+    deleted = sum(await asyncio.gather(*(bounded(path) for path in paths)))
+    if deleted:
+        logger.info("Deleted %d files past their retention policy", deleted)
+    return deleted
+
+
+def delete_files_in_background(paths: Sequence[str]) -> asyncio.Task[int] | None:
+    if not paths:
+        return None
+    task = asyncio.create_task(delete_files(list(paths)))
+    # The event loop only keeps weak references to tasks
+    _deletions.add(task)
+    task.add_done_callback(_deletions.discard)
+    return task
+
+
+async def wait_for_file_deletions() -> None:
+    """Let deletions that are still running finish, used at shutdown."""
+    if _deletions:
+        await asyncio.gather(*_deletions, return_exceptions=True)
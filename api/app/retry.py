@@ -0,0 +1,110 @@
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from pytz import utc
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import selectinload
+from sqlmodel import col, select
+
+from app.config import (
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_BATCH_SIZE,
+    RETRY_JITTER,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY_SECONDS,
+)
+from app.filters import video_table
+from app.models.subscription import Subscription, Video, VideoStatus
+from app.sync_schedule import with_jitter
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RetryResult:
+    # Videos put in the download queue, failed downloads and recovered metadata that passed the filters
+    downloads: int = 0
+    # Metadata retries that succeeded or ended in a final status
+    recovered: int = 0
+    failed: int = 0
+
+
+def retry_delay(failures: int) -> timedelta:
+    """How long to wait after a video's failures-th failure, doubling with every failure up to the maximum delay."""
+    seconds = RETRY_BASE_DELAY_SECONDS * 2 ** min(max(failures - 1, 0), 32)
+    return with_jitter(timedelta(seconds=min(seconds, RETRY_MAX_DELAY_SECONDS)), RETRY_JITTER)
+
+
+def next_attempt_at(failures: int, now: datetime | None = None) -> datetime | None:
+    """When a video that failed failures times is tried again, None once it ran out of attempts."""
+    if failures >= RETRY_MAX_ATTEMPTS:
+        return None
+    return (now or datetime.now(utc)) + retry_delay(failures)
+
+
+async def fail_videos(session: AsyncSession, video_ids: Sequence[int], now: datetime | None = None) -> None:
+    """Mark videos FAILED, count the failure and schedule their retry. The caller commits."""
+    if not video_ids:
+        return
+    failed = await session.execute(
+        update(Video)
+        .where(col(Video.id).in_(video_ids))
+        .values(status=VideoStatus.FAILED, retry_count=Video.retry_count + 1)
+        .returning(col(Video.id), col(Video.retry_count))
+        .execution_options(synchronize_session=False)
+    )
+    retries = [{"b_id": row.id, "b_next_attempt_at": next_attempt_at(row.retry_count, now)} for row in failed.all()]
+    for retry in retries:
+        if retry["b_next_attempt_at"] is None:
+            logger.warning("Giving up on video %d after %d attempts", retry["b_id"], RETRY_MAX_ATTEMPTS)
+    await session.execute(
+        video_table.update()
+        .where(video_table.c.id == bindparam("b_id"))
+        .values(next_attempt_at=bindparam("b_next_attempt_at")),
+        retries,
+    )
+
+
+async def due_retries(session: AsyncSession, now: datetime, limit: int = RETRY_BATCH_SIZE) -> list[Video]:
+    """FAILED videos of every subscription whose retry is due, longest waiting first, with their subscription's filters."""
+    result = await session.execute(
+        select(Video)
+        .options(selectinload(Video.subscription).selectinload(Subscription.filters))  # type: ignore[arg-type]
+        .where(col(Video.status) == VideoStatus.FAILED, col(Video.next_attempt_at) <= now)
+        .order_by(col(Video.next_attempt_at))
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+
+async def schedule_untracked_retries_batch(session_factory: async_sessionmaker[AsyncSession], batch_size: int) -> int:
+    """Give videos that failed before retries existed their remaining attempts, returns how many it scheduled.
+
+    They are due right away and picked up by the next sweep.
+    """
+    async with session_factory() as session:
+        untracked = (
+            select(col(Video.id))
+            .where(
+                col(Video.status) == VideoStatus.FAILED,
+                col(Video.next_attempt_at).is_(None),
+                col(Video.retry_count) < RETRY_MAX_ATTEMPTS,
+            )
+            .limit(batch_size)
+        )
+        result = await session.execute(
+            update(Video)
+            .where(col(Video.id).in_(untracked.scalar_subquery()))
+            .values(next_attempt_at=datetime.now(utc))
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount  # type: ignore
+
+
+def failed_downloading(video: Video) -> bool:
+    # Only a metadata call sets the duration, a video that has one failed after it while downloading
+    return video.duration is not None
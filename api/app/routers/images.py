@@ -0,0 +1,42 @@
+import asyncio
+import re
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse
+
+from app.image_store import (
+    VARIANT_WIDTHS,
+    ImageStore,
+    get_image_store,
+    image_media_type,
+)
+
+router = APIRouter()
+
+DIGEST_PATTERN = re.compile(r"[0-9a-f]{64}")
+# A digest always refers to the same bytes, so clients may keep an image forever
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/images/{digest}", name="get_image")
+async def get_image(
+    digest: str,
+    request: Request,
+    store: Annotated[ImageStore, Depends(get_image_store)],
+    width: Annotated[int | None, Query(description=f"One of {', '.join(map(str, VARIANT_WIDTHS))}")] = None,
+):
+    if not DIGEST_PATTERN.fullmatch(digest) or not store.exists(digest):
+        raise HTTPException(status_code=404, detail="Image not found")
+    if width is not None and width not in VARIANT_WIDTHS:
+        raise HTTPException(status_code=400, detail=f"Unsupported width {width}")
+
+    etag = f'"{digest}"' if width is None else f'"{digest}-w{width}"'
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if etag in request.headers.get("If-None-Match", ""):
+        return Response(status_code=304, headers=headers)
+
+    path = store.path(digest) if width is None else await asyncio.to_thread(store.variant, digest, width)
+    with path.open("rb") as file:
+        media_type = image_media_type(file.read(12))
+    return FileResponse(path, media_type=media_type, headers=headers)
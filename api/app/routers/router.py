@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from . import plex, settings, subscription, youtube
+from . import images, plex, settings, subscription, videos, youtube
 
 base_router = APIRouter()
 
@@ -8,3 +8,5 @@ base_router.include_router(plex.router, tags=["plex"])
 base_router.include_router(youtube.router, tags=["youtube"])
 base_router.include_router(subscription.router, tags=["subscription"])
 base_router.include_router(settings.router, tags=["settings"])
+base_router.include_router(images.router, tags=["images"])
+base_router.include_router(videos.router, tags=["videos"])
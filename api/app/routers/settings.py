@@ -4,6 +4,8 @@ from fastapi import APIRouter
 from sqlmodel import SQLModel
 
 from app.database.session import engine
+from app.rate_limit import current_rates
+from app.single_flight import single_flight_stats
 
 router = APIRouter()
 
@@ -43,3 +45,29 @@ async def check_requirements():
     ffprobe_status = check_command("ffprobe")
 
     return RequirementsCheckResult(ffmpeg=ffmpeg_status, ffprobe=ffprobe_status)
+
+
+class HostRateStatus(SQLModel):
+    host: str
+    requests_per_second: float
+    tokens: float
+    backoff_seconds: float
+    throttled_responses: int
+
+
+@router.get("/settings/rate-limits", response_model=list[HostRateStatus])
+async def get_rate_limits():
+    return [HostRateStatus.model_validate(rate, from_attributes=True) for rate in await current_rates()]
+
+
+class SingleFlightStatus(SQLModel):
+    name: str
+    started: int
+    coalesced: int
+    failed: int
+    in_flight: int
+
+
+@router.get("/settings/single-flight", response_model=list[SingleFlightStatus])
+async def get_single_flight_stats():
+    return [SingleFlightStatus.model_validate(stats, from_attributes=True) for stats in single_flight_stats()]
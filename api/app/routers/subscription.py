@@ -1,22 +1,26 @@
-import base64
+import asyncio
 import logging
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Any
 
-import requests
+import httpx
 from dateutil.relativedelta import relativedelta
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from pytz import utc
 from result import Err, Ok
-from sqlalchemy import desc
+from sqlalchemy import desc, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
 # from aiocache import cached
 # from aiocache.serializers import PickleSerializer
 from sqlalchemy.orm import selectinload
-from sqlmodel import select
+from sqlmodel import col, delete, select
 
-from app.database.session import get_session
+from app import http_client
+from app.database.session import get_session, session_factory, unit_of_work
+from app.filters import reevaluate_filters
+from app.image_store import get_image_store
+from app.ingestion import ingest_videos, recent_video_ids
 from app.models.plex import Directory, Location, Plex
 from app.models.subscription import (
     ComparisonOperator,
@@ -24,18 +28,26 @@ from app.models.subscription import (
     FilterType,
     PlexLibraryDestination,
     RetentionType,
+    RssFeedCache,
     Subscription,
     SubscriptionCreate,
     SubscriptionCreateV2,
+    SubscriptionSummary,
     TimeDeltaTypeValue,
     Video,
     VideoStatus,
 )
+from app.pagination import InvalidCursorError, VideoCursor, approximate_count
 from app.routers import youtube
+from app.single_flight import SingleFlight
 from app.yt_downloader import obtain_channel_data
 
 router = APIRouter()
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+VIDEO_COLUMNS = {name: getattr(Video, name) for name in Video.model_fields}
+
 
 logger = logging.getLogger(__name__)
 
@@ -53,28 +65,68 @@ async def get_all_subscription(session: Annotated[AsyncSession, Depends(get_sess
     return results.scalars().all()
 
 
+# Declared before /subscription/{subscription_id}, which would otherwise match "summary" as an id
+@router.get("/subscription/summary", response_model=list[SubscriptionSummary])
+async def get_subscription_summaries(
+    request: Request, session: Annotated[AsyncSession, Depends(get_session)]
+) -> list[SubscriptionSummary]:
+    """Everything the dashboard shows per subscription, without the image data or the videos themselves."""
+    subscriptions = await session.execute(
+        select(
+            col(Subscription.id),
+            col(Subscription.title),
+            col(Subscription.last_updated),
+            col(Subscription.image_hash),
+        ).order_by(col(Subscription.id))
+    )
+    status_counts = await session.execute(
+        select(col(Video.subscription_id), col(Video.status), func.count()).group_by(
+            col(Video.subscription_id), col(Video.status)
+        )
+    )
+    video_counts: dict[int, dict[str, int]] = {}
+    for subscription_id, status, count in status_counts.all():
+        video_counts.setdefault(subscription_id, {})[status] = count
+
+    return [
+        SubscriptionSummary(
+            id=row.id,
+            title=row.title,
+            last_updated=row.last_updated,
+            video_counts=video_counts.get(row.id, {}),
+            image_url=request.url_for("get_image", digest=row.image_hash).path if row.image_hash else None,
+        )
+        for row in subscriptions.all()
+    ]
+
+
+async def store_channel_image(image_link: str | None) -> str | None:
+    if not image_link:
+        return None
+    try:
+        response = await http_client.get(image_link)
+    except httpx.HTTPError as e:
+        logger.warning("Could not download channel image %s: %s", image_link, e)
+        return None
+    if response.status_code != 200:
+        return None
+    return await asyncio.to_thread(get_image_store().put, response.content)
+
+
 @router.post("/subscription")
 async def create_subscription(create: SubscriptionCreate, session: Annotated[AsyncSession, Depends(get_session)]):
     existing_subscription = await session.execute(select(Subscription).where(Subscription.url == create.url))
     if existing_subscription.scalars().first():
         return {"message": "subscription already exists"}
 
-    channel_info = youtube.fetch_rss_feed(create.url)
-    image_link = channel_info.image_link
-
-    image_data = None
-    if image_link:
-        response = requests.get(image_link, timeout=5)
-        if response.status_code == 200:
-            #  TODO: We should either store all images encoded or not encoded, not a mix
-            image_data = base64.b64encode(response.content).decode("utf-8")
+    channel_info = await youtube.fetch_rss_feed(create.url)
 
     subscription = Subscription(
         title=channel_info.title,
         url=create.url,
         rss_feed_url=channel_info.rss_link,
         description=channel_info.description,
-        image=image_data if image_data is not None else None,
+        image_hash=await store_channel_image(channel_info.image_link),
         plex_library_path="\\some\\path",
     )
 
@@ -134,45 +186,145 @@ async def delete_subscription(subscription_id: int, session: Annotated[AsyncSess
 # be a fastapi method at all.
 # We might need to be able to invoke this logic when we do the multipart subscription add flow,
 # but it should invoke another separate method.
+# Shared by this route and the scheduler, a feed is fetched and ingested at most once at a time
+feed_syncs: SingleFlight[int, dict[str, Any]] = SingleFlight("subscription feed sync")
+
+
 @router.post("/subscription/{subscription_id}/sync", response_model=Subscription)
-async def sync_subscription(subscription_id: int, session: Annotated[AsyncSession, Depends(get_session)]):
+async def sync_subscription(subscription_id: int):
+    # A caller joining a sync that is already running gets its result
+    return await feed_syncs.run(subscription_id, lambda: run_feed_sync(subscription_id))
+
+
+async def run_feed_sync(subscription_id: int) -> dict[str, Any]:
+    # The flight may outlive every caller waiting on it, so it owns its session rather than borrowing theirs
+    async with unit_of_work("subscription feed sync", session_factory) as session:
+        return await sync_feed(subscription_id, session)
+
+
+async def sync_feed(subscription_id: int, session: AsyncSession) -> dict[str, Any]:
     subscription: Subscription = await get_subscription(subscription_id, session)  # type:ignore
     assert subscription is not None and isinstance(subscription, Subscription)
-    result: youtube.RssFeedResult = youtube.fetch_videos_from_rss_feed(subscription.rss_feed_url)
+    cache = await session.get(RssFeedCache, subscription.rss_feed_url) or RssFeedCache(url=subscription.rss_feed_url)
+    feed = await youtube.fetch_feed_if_changed(cache)
+    known_video_ids = await recent_video_ids(session, subscription.id)
+    result = feed.and_then(lambda response_content: youtube.parse_feed_entries(response_content, known_video_ids))
     match result:
-        case Ok(videos):
-            for video in videos:
-                existing_video = await session.execute(select(Video).where(Video.video_id == video.video_id))
-                if not existing_video.scalars().first():
-                    new_video = Video(
-                        title=video.title,
-                        published=video.published,
-                        video_id=video.video_id,
-                        link=video.link,
-                        author=video.author,
-                        thumbnail_url=video.thumbnail_url,
-                        description=video.description,
-                        subscription_id=subscription.id,
-                        status=VideoStatus.PENDING,
-                    )
-                    session.add(new_video)
+        case Ok(read):
+            ingested = await ingest_videos(session, subscription.id, read.entries, known=read.known)
+            logger.info(
+                "Synced subscription %d: %d new and %d unchanged videos",
+                subscription_id,
+                ingested.new,
+                ingested.unchanged,
+            )
+            subscription.last_updated = datetime.now(utc)
+            session.add(subscription)
+            session.add(cache)
 
+            await session.commit()
+            return {"message": "subscription synced", "new": ingested.new, "unchanged": ingested.unchanged}
+        case Err(error) if error.error_type == youtube.RssFeedErrorType.NOT_MODIFIED:
             subscription.last_updated = datetime.now(utc)
             session.add(subscription)
+            session.add(cache)
 
             await session.commit()
-            return {"message": "subscription synced"}
+            return {"message": "subscription unchanged"}
         case Err(error):
+            if cache in session:
+                # Drop the new validators, otherwise a feed that failed to parse would look unchanged next time.
+                session.expire(cache)
             logger.error("Error syncing subscription %d: %s - %s", subscription_id, error.error_type, error.message)
             return {"message": f"Error syncing subscription: {error.error_type}"}
 
 
-@router.get("/subscription/{subscription_id}/videos", response_model=list[Video])
-async def get_subscription_videos(subscription_id: int, session: AsyncSession = Depends(get_session)) -> list[Video]:
-    result = await session.execute(  # type:ignore
-        select(Video).where(Video.subscription_id == subscription_id).order_by(desc(Video.published))  # type:ignore
+@router.put("/subscription/{subscription_id}/filters")
+async def replace_subscription_filters(
+    subscription_id: int, filters: list[Filter], session: Annotated[AsyncSession, Depends(get_session)]
+):
+    """Replace a subscription's filters and re-evaluate its already filtered and pending videos in one pass."""
+    if await session.get(Subscription, subscription_id) is None:
+        raise HTTPException(status_code=404, detail="Subscription not found")
+
+    await session.execute(delete(Filter).where(col(Filter.subscription_id) == subscription_id))
+    new_filters = [
+        Filter(
+            filter_type=f.filter_type,
+            keyword=f.keyword,
+            comparison_operator=f.comparison_operator,
+            threshold_seconds=f.threshold_seconds,
+            threshold_date=f.threshold_date,
+            subscription_id=subscription_id,
+        )
+        for f in filters
+    ]
+    session.add_all(new_filters)
+    counts = await reevaluate_filters(session, subscription_id, new_filters, use_search_index=True)
+    await session.commit()
+    return {"message": "filters updated", "pending_download": counts.pending_download, "filtered": counts.filtered}
+
+
+@router.get(
+    "/subscription/{subscription_id}/videos",
+    response_model=None,
+    responses={200: {"model": list[Video], "description": "One page of videos, newest first"}},
+)
+async def get_subscription_videos(
+    subscription_id: int,
+    response: Response,
+    session: AsyncSession = Depends(get_session),
+    limit: Annotated[
+        int | None, Query(ge=1, le=MAX_PAGE_SIZE, description=f"Page size, {DEFAULT_PAGE_SIZE} when not given")
+    ] = None,
+    cursor: str | None = None,
+    status: Annotated[list[VideoStatus] | None, Query()] = None,
+    fields: Annotated[
+        str | None, Query(description="Comma separated video fields to return, id is always included")
+    ] = None,
+) -> list[dict[str, Any]]:
+    """Page through a subscription's videos with a keyset cursor on (published, id).
+
+    The cursor for the next page is returned in the X-Next-Cursor header, the first page also carries the number of
+    matching videos in X-Total-Count, counted up to a cap which X-Total-Count-Capped reports. Pages hold at most
+    MAX_PAGE_SIZE videos, so no request loads a whole large subscription.
+    """
+    requested = [name.strip() for name in fields.split(",") if name.strip()] if fields else list(VIDEO_COLUMNS)
+    unknown = [name for name in requested if name not in VIDEO_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown video fields: {', '.join(unknown)}")
+    returned = list(dict.fromkeys(["id", *requested]))
+
+    conditions = [col(Video.subscription_id) == subscription_id]
+    if status:
+        conditions.append(col(Video.status).in_(status))
+    if cursor is None:
+        total, capped = await approximate_count(session, *conditions)
+        response.headers["X-Total-Count"] = str(total)
+        response.headers["X-Total-Count-Capped"] = str(capped).lower()
+    else:
+        try:
+            conditions.append(VideoCursor.decode(cursor).condition())
+        except InvalidCursorError as e:
+            raise HTTPException(status_code=400, detail=str(e)) from e
+
+    if limit is None:
+        limit = DEFAULT_PAGE_SIZE
+
+    # published is always selected since the next cursor is built from it
+    selected = list(dict.fromkeys([*returned, "published"]))
+    statement = (
+        select(*(VIDEO_COLUMNS[name] for name in selected))
+        .where(*conditions)
+        .order_by(desc(col(Video.published)), desc(col(Video.id)))
+        .limit(limit + 1)
     )
-    return result.scalars().all()  # type:ignore
+    rows = (await session.execute(statement)).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = VideoCursor.after(rows[-1]).encode()
+
+    return [{name: getattr(row, name) for name in returned} for row in rows]
 
 
 # async def get_subscription_data(channel_url: str) -> Subscription:
@@ -253,22 +405,14 @@ async def create_subscription_v2(new_subscription: SubscriptionCreateV2, session
     logger.info("  Directory ID: %s", new_subscription.plex_library.directoryId)
     logger.info("  Location ID: %s", new_subscription.plex_library.locationId)
 
-    channel_info = youtube.fetch_rss_feed(new_subscription.url)
-    image_link = channel_info.image_link
-
-    image_data = None
-    if image_link:
-        response = requests.get(image_link, timeout=5)
-        if response.status_code == 200:
-            #  TODO: We should either store all images encoded or not encoded, not a mix
-            image_data = base64.b64encode(response.content).decode("utf-8")
+    channel_info = await youtube.fetch_rss_feed(new_subscription.url)
 
     subscription_to_add = Subscription(
         title=channel_info.title,
         url=new_subscription.url,
         rss_feed_url=channel_info.rss_link,
         description=channel_info.description,
-        image=image_data if image_data is not None else None,
+        image_hash=await store_channel_image(channel_info.image_link),
         plex_library_path="\\some\\path",
     )
 
@@ -0,0 +1,22 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.database.session import get_session
+from app.search import MIN_TERM_LENGTH, SearchResult, search_videos
+
+router = APIRouter()
+
+
+@router.get("/videos/search", response_model=list[SearchResult])
+async def search(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    q: Annotated[
+        str, Query(min_length=MIN_TERM_LENGTH, description="Every term has to appear in the title or description")
+    ],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    subscription_id: int | None = None,
+) -> list[SearchResult]:
+    """Search video titles and descriptions, best matches first with the matching text highlighted."""
+    return await search_videos(session, q, limit, subscription_id)
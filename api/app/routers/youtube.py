@@ -1,15 +1,22 @@
+import hashlib
+import inspect
 import logging
-from collections.abc import Callable
+import re
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
 from datetime import datetime
 from enum import Enum
 
-import requests
+import httpx
 from bs4 import BeautifulSoup, Tag
 from fastapi import APIRouter, HTTPException
+from pytz import utc
 from result import Err, Ok, Result
 
+from app import http_client
 from app.config import TIMEOUT_IN_SECONDS
-from app.models.subscription import ChannelInfo, Video, VideoStatus
+from app.feed_parser import FeedRead, read_new_entries
+from app.models.subscription import ChannelInfo, RssFeedCache, Video, VideoStatus
 
 router = APIRouter()
 
@@ -21,6 +28,7 @@ class RssFeedErrorType(Enum):
     NETWORK_ERROR = "Network Error"
     PARSING_ERROR = "Parsing Error"
     EMPTY_FEED = "Empty Feed"
+    NOT_MODIFIED = "Not Modified"
     UNKNOWN_ERROR = "Unknown Error"
 
 
@@ -30,19 +38,90 @@ class RssFeedError:
         self.message = message
 
 
+@dataclass
+class FeedResponse:
+    status_code: int
+    content: str
+    etag: str | None
+    last_modified: str | None
+
+
 RssFeedResult = Result[list[Video], RssFeedError]
+RequestMaker = Callable[[str, int], Awaitable[str] | str]
+ConditionalRequestMaker = Callable[[str, int, dict[str, str]], Awaitable[FeedResponse]]
+
+# View counts and ratings change on every fetch without the feed gaining or losing an entry.
+VOLATILE_FEED_ELEMENTS = re.compile(r"<media:(?:statistics|starRating)\b[^>]*/>")
 
 
 @staticmethod
-def make_request(url: str, timeout: int) -> str:
-    response = requests.get(url, timeout=timeout)
+async def make_request(url: str, timeout: int) -> str:
+    response = await http_client.get(url, timeout=timeout)
+    response.raise_for_status()
     return response.content.decode("utf-8")
 
 
-# TODO: Make async
 @staticmethod
-def fetch_rss_feed(channel_url: str, request_maker: Callable[[str, int], str] = make_request) -> ChannelInfo:
-    response_content = request_maker(channel_url, TIMEOUT_IN_SECONDS)
+async def make_conditional_request(url: str, timeout: int, headers: dict[str, str]) -> FeedResponse:
+    response = await http_client.get(url, timeout=timeout, headers=headers)
+    if response.status_code != 304:
+        response.raise_for_status()
+    return FeedResponse(
+        status_code=response.status_code,
+        content=response.content.decode("utf-8"),
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+def feed_content_hash(response_content: str) -> str:
+    return hashlib.sha256(VOLATILE_FEED_ELEMENTS.sub("", response_content).encode("utf-8")).hexdigest()
+
+
+async def fetch_feed_if_changed(
+    cache: RssFeedCache, request_maker: ConditionalRequestMaker = make_conditional_request
+) -> Result[str, RssFeedError]:
+    """Fetch the feed at cache.url unless it is unchanged since the copy described by cache.
+
+    Sends If-None-Match / If-Modified-Since from the cached validators and compares the content hash of full
+    responses. The cache is updated in place with the validators of the new response, the caller persists it.
+    """
+    headers: dict[str, str] = {}
+    if cache.etag:
+        headers["If-None-Match"] = cache.etag
+    if cache.last_modified:
+        headers["If-Modified-Since"] = cache.last_modified
+
+    try:
+        response = await request_maker(cache.url, TIMEOUT_IN_SECONDS, headers)
+    except httpx.HTTPError as e:
+        return Err(RssFeedError(RssFeedErrorType.NETWORK_ERROR, str(e)))
+
+    cache.checked_at = datetime.now(utc)
+    if response.status_code == 304:
+        return Err(RssFeedError(RssFeedErrorType.NOT_MODIFIED, "Feed not modified since the last sync"))
+
+    cache.etag = response.etag
+    cache.last_modified = response.last_modified
+    content_hash = feed_content_hash(response.content)
+    if content_hash == cache.content_hash:
+        return Err(RssFeedError(RssFeedErrorType.NOT_MODIFIED, "Feed content unchanged since the last sync"))
+
+    cache.content_hash = content_hash
+    return Ok(response.content)
+
+
+async def _request(request_maker: RequestMaker, url: str) -> str:
+    # Request makers may be plain functions, tests inject synchronous fakes.
+    response_content = request_maker(url, TIMEOUT_IN_SECONDS)
+    if inspect.isawaitable(response_content):
+        response_content = await response_content
+    return response_content
+
+
+@staticmethod
+async def fetch_rss_feed(channel_url: str, request_maker: RequestMaker = make_request) -> ChannelInfo:
+    response_content = await _request(request_maker, channel_url)
     soup = BeautifulSoup(response_content, "html.parser")
 
     title = soup.title.string if soup.title else None
@@ -78,48 +157,58 @@ def fetch_rss_feed(channel_url: str, request_maker: Callable[[str, int], str] =
 
 
 @staticmethod
-def fetch_videos_from_rss_feed(rss_url: str, request_maker: Callable[[str, int], str] = make_request) -> RssFeedResult:
+async def fetch_videos_from_rss_feed(rss_url: str, request_maker: RequestMaker = make_request) -> RssFeedResult:
     try:
-        response_content = request_maker(rss_url, TIMEOUT_IN_SECONDS)
-        soup = BeautifulSoup(response_content, "xml")
-
-        entries = soup.find_all("entry")
-        if not entries:
-            # TODO: Is this actually an error case?
-            return Err(RssFeedError(RssFeedErrorType.EMPTY_FEED, "No entries found in the RSS feed"))
-
-        videos: list[Video] = []
-        for entry in entries:
-            video = Video(
-                title=entry.find("title").text,
-                published=datetime.fromisoformat(entry.find("published").text),
-                video_id=entry.find("yt:videoId").text,
-                link=entry.find("link").get("href"),
-                author=entry.find("author").find("name").text,
-                description=(
-                    entry.find("media:group").find("media:description").text if entry.find("media:group") else ""
-                ),
-                thumbnail_url=entry.find("media:thumbnail").get("url"),
-                status=VideoStatus.PENDING,
-            )
-            videos.append(video)
+        response_content = await _request(request_maker, rss_url)
+    except httpx.HTTPError as e:
+        return Err(RssFeedError(RssFeedErrorType.NETWORK_ERROR, str(e)))
+    except Exception as e:  # pylint: disable=broad-except
+        return Err(RssFeedError(RssFeedErrorType.UNKNOWN_ERROR, str(e)))
 
-        return Ok(videos)
+    return parse_videos_from_rss_feed(response_content)
 
-    except requests.RequestException as e:
-        return Err(RssFeedError(RssFeedErrorType.NETWORK_ERROR, str(e)))
+
+def parse_feed_entries(
+    response_content: str, known_video_ids: set[str] | None = None
+) -> Result[FeedRead, RssFeedError]:
+    """Parse the entries that are newer than the first entry in known_video_ids."""
+    try:
+        feed = read_new_entries(response_content, known_video_ids or set())
     except Exception as e:  # pylint: disable=broad-except
         return Err(RssFeedError(RssFeedErrorType.UNKNOWN_ERROR, str(e)))
 
+    if not feed.has_entries:
+        # TODO: Is this actually an error case?
+        return Err(RssFeedError(RssFeedErrorType.EMPTY_FEED, "No entries found in the RSS feed"))
+    return Ok(feed)
+
+
+def parse_videos_from_rss_feed(response_content: str) -> RssFeedResult:
+    return parse_feed_entries(response_content).map(
+        lambda feed: [
+            Video(
+                title=entry.title,
+                published=entry.published,
+                video_id=entry.video_id,
+                link=entry.link,
+                author=entry.author,
+                description=entry.description,
+                thumbnail_url=entry.thumbnail_url,
+                status=VideoStatus.PENDING,
+            )
+            for entry in feed.entries
+        ]
+    )
+
 
 @router.post("/get_channel_info")
 async def fetch_rss_route(channel_url: str) -> ChannelInfo:
-    return fetch_rss_feed(channel_url)
+    return await fetch_rss_feed(channel_url)
 
 
 @router.get("/get_videos")
 async def get_videos_route(rss_url: str) -> list[Video]:
-    result: RssFeedResult = fetch_videos_from_rss_feed(rss_url)
+    result: RssFeedResult = await fetch_videos_from_rss_feed(rss_url)
 
     match result:
         case Ok(videos):
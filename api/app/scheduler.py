@@ -1,156 +1,60 @@
+import asyncio
 import logging
-from datetime import date, datetime, timedelta
-from pathlib import Path
+from datetime import datetime, timedelta
 from typing import cast
 
 import httpx
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from pytz import utc
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
-from sqlmodel import desc, or_, select
+from sqlmodel import col, select
 
-from app.database.session import get_session
-from app.filters import applicable_filters
+from app.config import (
+    RETRY_SWEEP_INTERVAL_SECONDS,
+    SCHEDULER_MAX_SLEEP_SECONDS,
+    SYNC_CONCURRENCY,
+    SYNC_MIN_INTERVAL_SECONDS,
+)
+from app.database.session import session_factory, unit_of_work
+from app.download_engine import wake_download_engine
+from app.filters import apply_filters
 from app.models.plex import Plex
 from app.models.subscription import (
     Filter,
-    PlexLibraryDestination,
-    RetentionPolicy,
-    RetentionType,
     Subscription,
     Video,
     VideoStatus,
 )
+from app.planner import plan_sync
+from app.retention import apply_retention, delete_files_in_background
+from app.retry import RetryResult, due_retries, failed_downloading, next_attempt_at
 from app.routers.subscription import sync_subscription
+from app.sync_schedule import (
+    LEGACY_SYNC_INTERVAL,
+    due_condition,
+    next_due_at,
+    schedule_next_sync,
+    with_jitter,
+)
 from app.yt_downloader import (
     MetadataError,
     MetadataErrorType,
     MetadataResult,
     MetadataSuccess,
     get_metadata,
-    mock_download_content,
 )
 
 logger = logging.getLogger(__name__)
-SUBSCRIPTION_UPDATE_INTERVAL = 15
-TEST_FILE_NAME = "test_engawa.tmp"
+# Minutes, subscriptions synced before adaptive scheduling fall back to it until their next sync
+SUBSCRIPTION_UPDATE_INTERVAL = LEGACY_SYNC_INTERVAL // timedelta(minutes=1)
+SYNC_JOB_ID = "sync_subscriptions"
+RETRY_JOB_ID = "retry_failed_videos"
 
 scheduler = AsyncIOScheduler(timezone=utc)
 
 
-def verify_write_access(dir_path: str) -> bool:
-    test_file = Path(dir_path) / TEST_FILE_NAME
-
-    try:
-        if test_file.exists():
-            test_file.unlink()
-
-        with test_file.open("w") as f:
-            f.write("test")
-
-        test_file.unlink()
-        return True
-
-    except Exception as e:  # pylint: disable=broad-except
-        logger.error("Filesystem write access verification failed: %s", e)
-        return False
-
-
-async def process_retention_policy(
-    session: AsyncSession, subscription_id: int, retention_policy: RetentionPolicy
-) -> None:
-    match retention_policy.type:
-        case RetentionType.COUNT:
-            count = retention_policy.videoCount
-            statement = (
-                select(Video)
-                .where(Video.subscription_id == subscription_id)
-                .where(Video.status == VideoStatus.DOWNLOADED)
-                .order_by(desc(Video.published))
-                .offset(count)
-            )
-
-        case RetentionType.DELTA:
-            lookback_date = datetime.now() - retention_policy.timeDeltaTypeValue
-            if lookback_date is None or datetime.now() < lookback_date or lookback_date is not date:
-                return
-            statement = select(Video).where(
-                (Video.subscription_id == subscription_id) & (Video.published < lookback_date)
-            )
-        case RetentionType.DATE_SINCE:
-            cutoff_date = retention_policy.dateBefore
-            if cutoff_date is None or datetime.now() < cutoff_date or cutoff_date is not date:
-                return
-            statement = (
-                select(Video).where(Video.subscription_id == subscription_id).where(Video.published < cutoff_date)
-            )
-
-    # Execute query with proper async context
-    result = await session.execute(statement)
-    videos_to_delete = result.scalars().all()
-
-    # Batch update the videos
-    for video in videos_to_delete:
-        video.status = VideoStatus.DELETED
-
-    # Commit the changes
-    # await session.commit()
-
-
-async def apply_retention_policy(
-    subscription_id: int, retention_policy: RetentionPolicy, session: AsyncSession
-) -> None:
-    """Apply retention policy to videos for a given subscription.
-
-    Args:
-        subscription_id: ID of the subscription to apply policy to
-        retention_policy: Retention policy to apply
-        session: Database session
-    """
-
-    statement = None
-
-    match retention_policy.type:
-        case RetentionType.DATE_SINCE:
-            cutoff_date = retention_policy.dateBefore
-            if cutoff_date is None or datetime.now() < cutoff_date or cutoff_date is not date:
-                return
-            statement = (
-                select(Video).where(Video.subscription_id == subscription_id).where(Video.published < cutoff_date)
-            )
-
-        case RetentionType.COUNT:
-            # TODO: How should we handle the count updating if previously failed videos are now successful?
-            count = retention_policy.videoCount
-            statement = (
-                select(Video)
-                .where(Video.subscription_id == subscription_id)
-                .where(Video.status == VideoStatus.DOWNLOADED)
-                .order_by(desc(Video.published))
-                .offset(count)
-            )
-
-        case RetentionType.DELTA:
-            lookback_date = datetime.now() - retention_policy.timeDeltaTypeValue
-            if lookback_date is None or datetime.now() < lookback_date or lookback_date is not date:
-                return
-            statement = (
-                select(Video).where((Video.subscription_id == subscription_id) & (Video.published < lookback_date))
-                # TODO: We have code to produce this delta elsewhere, should be refactored
-            )
-
-    # Mark videos for deletion
-    result = await session.execute(statement)
-    videos_to_delete = result.scalars().all()
-
-    for video in videos_to_delete:
-        video.status = VideoStatus.DELETED
-        session.add(video)
-
-    await session.commit()
-
-
 def update_video_status(video: Video, video_results: MetadataResult) -> Video:
     updates = {}
     match video_results:
@@ -167,10 +71,13 @@ def update_video_status(video: Video, video_results: MetadataResult) -> Video:
             updates = {"status": VideoStatus.EXCLUDED, "metadata_error": MetadataErrorType.COPYRIGHT_STRIKE}
         case MetadataError(error_type=MetadataErrorType.AGE_RESTRICTED):
             updates = {"status": VideoStatus.EXCLUDED, "metadata_error": MetadataErrorType.AGE_RESTRICTED}
-        case MetadataError(error_type=MetadataErrorType.UNKNOWN_ERROR):
-            updates = {"status": VideoStatus.FAILED, "retry_count": video.retry_count + 1}
         case _:
-            updates = {"status": VideoStatus.FAILED, "retry_count": video.retry_count + 1}
+            # Unknown errors are likely transient, the retry sweep tries again after a backoff
+            failures = video.retry_count + 1
+            retry_at = next_attempt_at(failures)
+            if retry_at is None:
+                logger.warning("Giving up on the metadata of %s after %d attempts", video.link, failures)
+            updates = {"status": VideoStatus.FAILED, "retry_count": failures, "next_attempt_at": retry_at}
 
     for key, value in updates.items():
         setattr(video, key, value)
@@ -178,8 +85,6 @@ def update_video_status(video: Video, video_results: MetadataResult) -> Video:
 
 
 async def get_subscriptions_to_update(session: AsyncSession) -> list[Subscription]:
-    fifteen_minutes_ago: datetime = datetime.now(utc) - timedelta(minutes=SUBSCRIPTION_UPDATE_INTERVAL)
-
     subscriptions_to_update = cast(
         list[Subscription],
         (
@@ -187,12 +92,9 @@ async def get_subscriptions_to_update(session: AsyncSession) -> list[Subscriptio
                 select(Subscription)
                 .options(selectinload(Subscription.filters))  # type:ignore
                 .options(selectinload(Subscription.retention))  # type:ignore
-                .where(  # pyright: ignore
-                    or_(
-                        Subscription.last_updated == None,  # noqa: E711 pylint: disable=singleton-comparison
-                        Subscription.last_updated < fifteen_minutes_ago,  # pyright: ignore
-                    )
-                )
+                .where(due_condition(datetime.now(utc)))
+                # Longest overdue first, a backlog is worked off in the order it built up
+                .order_by(col(Subscription.next_sync_at), col(Subscription.last_updated))
             )
         )
         .scalars()
@@ -223,6 +125,7 @@ async def get_videos_for_subscription(subscription_id: int, status: VideoStatus,
                 .where(Video.status == status)
                 .where(Video.subscription_id == subscription_id)
                 .options(selectinload(Video.subscription))
+                .order_by(col(Video.published).desc(), col(Video.id).desc())
             )
         )
         .scalars()
@@ -232,7 +135,7 @@ async def get_videos_for_subscription(subscription_id: int, status: VideoStatus,
 
 
 async def handle_videos_for_subscription(subscription: Subscription, session: AsyncSession) -> None:
-    await sync_subscription(subscription.id, session)
+    await sync_subscription(subscription.id)
     videos_with_metadata = await get_videos_for_subscription(subscription.id, VideoStatus.OBTAINED_METADATA, session)
     video_urls = [video.link for video in videos_with_metadata]
     metadata_results: list[MetadataResult] = await get_metadata(video_urls)
@@ -242,93 +145,185 @@ async def handle_videos_for_subscription(subscription: Subscription, session: As
         update_video_status(video, video_results)
 
 
-async def test_invoke():
-    logger.info("Test invoke")
+async def get_subscription_for_update(subscription_id: int, session: AsyncSession) -> Subscription | None:
+    result = await session.execute(
+        select(Subscription)
+        .options(selectinload(Subscription.filters))  # type:ignore
+        .options(selectinload(Subscription.retention))  # type:ignore
+        .where(Subscription.id == subscription_id)
+    )
+    return result.scalars().first()
 
 
-async def sync_and_update_videos():
-    async for session in get_session():
-        try:
-            subscriptions_to_update = await get_subscriptions_to_update(session)
+def queue_for_download(videos: list[Video], filters: list[Filter]) -> int:
+    """Move videos that obtained their metadata to the download queue unless a filter rejects them.
+
+    The filters are compiled once for the whole batch, returns how many videos were filtered.
+    """
+    obtained = [video for video in videos if video.status == VideoStatus.OBTAINED_METADATA]
+    apply_filters(obtained, filters)
+    return sum(1 for video in obtained if video.status == VideoStatus.FILTERED)
 
-            if len(subscriptions_to_update) < 1:
-                logger.info("No subscriptions to update")
-            else:
-                logger.info("Found %d subscriptions to update", len(subscriptions_to_update))
 
-            for subscription in subscriptions_to_update:
-                await sync_subscription(subscription.id, session)
-                videos_to_obtain_metadata = await get_videos_for_subscription(
-                    subscription.id, VideoStatus.PENDING, session
-                )
+async def process_subscription(subscription_id: int) -> None:
+    """Run the full sync pipeline for one subscription inside its own session.
 
-                # TODO: Need to retry failed videos
-                # TODO: We shouldn't download videos if the retention policy is set to delete them
+    Each subscription is its own unit of work, a failure rolls back only that subscription's uncommitted changes.
+    """
+    async with unit_of_work("subscription sync", session_factory) as session:
+        subscription = await get_subscription_for_update(subscription_id, session)
+        if subscription is None:
+            logger.warning("Subscription %d disappeared before it could be synced", subscription_id)
+            return
+
+        # Fetched and ingested in a session of its own, shared with a manual sync that may already be running
+        await sync_subscription(subscription.id)
+        # Leaves only the new videos worth downloading PENDING
+        await plan_sync(session, subscription.id, subscription.retention, subscription.filters)
+        videos_to_obtain_metadata = await get_videos_for_subscription(subscription.id, VideoStatus.PENDING, session)
+        # The plan's UPDATE holds SQLite's write lock, it must not stay open across the slow metadata fetch below
+        await session.commit()
+
+        # Failed videos are retried by retry_failed_videos, batched across subscriptions
+        video_urls = [video.link for video in videos_to_obtain_metadata]
+        metadata_results = await get_metadata(video_urls)
+
+        updated_videos: list[Video] = []
+        for video, metadata_result in zip(videos_to_obtain_metadata, metadata_results):
+            # TODO: Update the video failure status here with MetadataErrorType
+
+            updated_video = update_video_status(video, metadata_result)
+            updated_videos.append(updated_video)
+
+        filtered = queue_for_download(updated_videos, subscription.filters)
+        if filtered:
+            logger.info("Subscription %d: %d new videos filtered", subscription.id, filtered)
+        session.add_all(updated_videos)
+        await session.commit()
+
+        if subscription.retention is not None:
+            retention = await apply_retention(session, subscription.id)
+            await session.commit()
+            if retention.deleted:
+                logger.info("Retention removed %d videos of subscription %d", retention.deleted, subscription.id)
+            # Only once the rows are committed, a rollback must not leave videos pointing at deleted files
+            delete_files_in_background(retention.files)
 
-                video_urls = [video.link for video in videos_to_obtain_metadata]
-                metadata_results = await get_metadata(video_urls)
+        # Downloads are claimed from PENDING_DOWNLOAD by the download engine's worker processes.
+        wake_download_engine()
 
-                updated_videos: list[Video] = []
-                for video, metadata_result in zip(videos_to_obtain_metadata, metadata_results):
-                    # TODO: Update the video failure status here with MetadataErrorType
+        now = datetime.now(utc)
+        subscription.last_updated = now
+        await schedule_next_sync(session, subscription, now)
 
-                    updated_video = update_video_status(video, metadata_result)
-                    updated_videos.append(updated_video)
 
-                filters: dict[Video, list[Filter]] = applicable_filters(updated_videos, subscription.filters)
-                logger.info("Applicable filters: %s", filters)
-                for video in updated_videos:
-                    session.add(video)
+async def sync_and_update_videos():
+    async with unit_of_work("due subscriptions", session_factory) as session:
+        subscriptions_to_update = await get_subscriptions_to_update(session)
+        subscription_ids = [subscription.id for subscription in subscriptions_to_update]
 
-                # TODO: This call is what is breaking greenlet await code
-                # await process_retention_policy(session, subscription.id, subscription.retention_policy)
-                # await apply_retention_policy(
-                #     subscription_id=subscription.id, retention_policy=subscription.retention_policy, session=session
-                # )
+    if len(subscription_ids) < 1:
+        logger.info("No subscriptions to update")
+    else:
+        logger.info("Found %d subscriptions to update", len(subscription_ids))
 
-                to_download: list[Video] = await get_pending_videos(session)
+    semaphore = asyncio.Semaphore(SYNC_CONCURRENCY)
 
-                plex_results = await session.execute(select(Plex).options(selectinload(Plex.directories)))
-                plex_server = plex_results.scalars().first()
+    async def bounded(subscription_id: int) -> None:
+        async with semaphore:
+            await process_subscription(subscription_id)
 
-                if plex_server is None:
-                    logging.error("No Plex server found")
+    results = await asyncio.gather(
+        *(bounded(subscription_id) for subscription_id in subscription_ids), return_exceptions=True
+    )
 
-                download_path = (
-                    await compute_library_path(plex_server, subscription.plex_library_path)
-                    if isinstance(subscription.plex_library_path, PlexLibraryDestination)
-                    else subscription.plex_library_path
-                )
+    failed = []
+    for subscription_id, result in zip(subscription_ids, results):
+        if isinstance(result, BaseException):
+            failed.append(subscription_id)
+            logger.error("Error syncing subscription %d: %s", subscription_id, result, exc_info=result)
 
-                if not verify_write_access(download_path):
-                    logger.error("Write access verification failed for %s", download_path)
-                    continue
+    if failed:
+        await defer_failed_subscriptions(failed)
+    logger.info(
+        "Finished sync and update job, %d succeeded and %d failed", len(subscription_ids) - len(failed), len(failed)
+    )
+    await schedule_next_run()
+
+
+async def defer_failed_subscriptions(subscription_ids: list[int]) -> None:
+    # Retried after the shortest interval rather than on every run
+    now = datetime.now(utc)
+    async with unit_of_work("defer failed subscriptions", session_factory) as session:
+        for subscription_id in subscription_ids:
+            await session.execute(
+                update(Subscription)
+                .where(col(Subscription.id) == subscription_id)
+                .values(next_sync_at=now + with_jitter(timedelta(seconds=SYNC_MIN_INTERVAL_SECONDS)))
+                .execution_options(synchronize_session=False)
+            )
 
-                for video in to_download:
-                    await mock_download_content(video.link, download_path)
 
-                subscription.last_updated = datetime.now(utc)
-                session.add(subscription)
-                session.add(updated_videos)
+async def schedule_next_run() -> None:
+    """Run the sync job again when the next subscription is due instead of polling for due subscriptions."""
+    if not scheduler.running:
+        return
+    async with unit_of_work("schedule next sync run", session_factory) as session:
+        due = await next_due_at(session)
 
-            logger.info("Finished sync and update job")
-            await session.commit()
-            scheduler.add_job(test_invoke)  # type: ignore
+    now = datetime.now(utc)
+    latest = now + timedelta(seconds=SCHEDULER_MAX_SLEEP_SECONDS)
+    # Subscriptions still due after a run wait a second, so a backlog cannot spin the job
+    next_run = latest if due is None else min(max(due, now + timedelta(seconds=1)), latest)
+    scheduler.modify_job(SYNC_JOB_ID, next_run_time=next_run)  # type: ignore
+    logger.debug("Next subscription sync at %s", next_run)
 
-        except Exception as e:
-            logger.error("Error in sync_and_update_videos: %s", str(e))
-            await session.rollback()
-            raise
 
+async def retry_failed_videos() -> RetryResult:
+    """Retry every FAILED video whose backoff has passed, one metadata batch for all subscriptions.
 
-async def compute_library_path(plex_server: Plex | None, plex_library_path: PlexLibraryDestination) -> str:
-    # TODO: Before we download any videos, ensure we can write to the download directory
-    # In the error case, put the subscription in an error state and log the error
-    directories = plex_server.directories
-    directory = next((dir for dir in directories if dir.id == plex_library_path.directoryId), None)
-    if directory is None:
-        raise ValueError(f"Directory with id {plex_library_path.directoryId} not found")
-    return directory.locations[0].path
+    Videos that failed to download go back to PENDING_DOWNLOAD, the others get their metadata fetched again.
+    """
+    result = RetryResult()
+    async with unit_of_work("retry failed videos", session_factory) as session:
+        due = await due_retries(session, datetime.now(utc))
+
+        metadata_retries = []
+        for video in due:
+            video.next_attempt_at = None
+            if failed_downloading(video):
+                video.status = VideoStatus.PENDING_DOWNLOAD
+                result.downloads += 1
+            else:
+                metadata_retries.append(video)
+
+        if metadata_retries:
+            metadata_results = await get_metadata([video.link for video in metadata_retries])
+            recovered: dict[int, list[Video]] = {}
+            for video, metadata_result in zip(metadata_retries, metadata_results):
+                update_video_status(video, metadata_result)
+                if video.status == VideoStatus.FAILED:
+                    result.failed += 1
+                else:
+                    result.recovered += 1
+                    recovered.setdefault(video.subscription_id, []).append(video)
+            # The same filters and queue as a sync, applied per subscription
+            for videos in recovered.values():
+                queue_for_download(videos, videos[0].subscription.filters)
+                result.downloads += sum(1 for video in videos if video.status == VideoStatus.PENDING_DOWNLOAD)
+        session.add_all(due)
+
+    if due:
+        logger.info(
+            "Retried %d videos: %d queued for download, %d recovered their metadata and %d failed again",
+            len(due),
+            result.downloads,
+            result.recovered,
+            result.failed,
+        )
+    if result.downloads:
+        wake_download_engine()
+    return result
 
 
 async def update_plex_library(session: AsyncSession) -> None:
@@ -356,8 +351,23 @@ async def update_plex_library(session: AsyncSession) -> None:
             raise ValueError(f"Failed to fetch data from {url}, status code: {response.status_code}")
 
 
+# The interval is only a fallback, every run moves the next one to when the next subscription is due. A run that is
+# still going when the next one comes due makes it skip, missed runs collapse into one instead of piling up.
 scheduler.add_job(  # type: ignore
     sync_and_update_videos,
     "interval",
-    seconds=10,
+    seconds=SCHEDULER_MAX_SLEEP_SECONDS,
+    id=SYNC_JOB_ID,
+    next_run_time=datetime.now(utc),
+    max_instances=1,
+    coalesce=True,
+)
+
+scheduler.add_job(  # type: ignore
+    retry_failed_videos,
+    "interval",
+    seconds=RETRY_SWEEP_INTERVAL_SECONDS,
+    id=RETRY_JOB_ID,
+    max_instances=1,
+    coalesce=True,
 )
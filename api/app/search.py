@@ -0,0 +1,136 @@
+from datetime import datetime
+
+from sqlalchemy import (
+    DDL,
+    Column,
+    Connection,
+    Integer,
+    MetaData,
+    Select,
+    String,
+    Table,
+    event,
+    func,
+    literal_column,
+    text,
+)
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import SQLModel, col, select
+
+from app.models.subscription import Video, VideoStatus
+
+# The trigram tokenizer matches any substring of three or more characters, case-insensitively, like the keyword
+# filters do. Shorter terms cannot use the index.
+MIN_TERM_LENGTH = 3
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+SEARCH_INDEX_DDL = [
+    # External content table, the index stores no copy of the text and reads it back from video
+    """CREATE VIRTUAL TABLE IF NOT EXISTS video_fts USING fts5(
+        title, description, content='video', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_insert AFTER INSERT ON video BEGIN
+        INSERT INTO video_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_delete AFTER DELETE ON video BEGIN
+        INSERT INTO video_fts(video_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS video_fts_update AFTER UPDATE OF title, description ON video BEGIN
+        INSERT INTO video_fts(video_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO video_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END""",
+]
+
+# Not part of SQLModel.metadata, create_all must not create it as a regular table
+video_fts = Table(
+    "video_fts",
+    MetaData(),
+    Column("rowid", Integer, primary_key=True),
+    Column("title", String),
+    Column("description", String),
+    # FTS5 exposes a hidden column named after the table, MATCH against it searches every column
+    Column("video_fts", String),
+)
+
+video_table = Video.__table__  # type: ignore
+for statement in SEARCH_INDEX_DDL:
+    event.listen(video_table, "after_create", DDL(statement))
+event.listen(video_table, "before_drop", DDL("DROP TABLE IF EXISTS video_fts"))
+
+
+def ensure_search_index(connection: Connection) -> bool:
+    """Create the index and its triggers on a database whose video table predates them, returns True if it did."""
+    exists = connection.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'video_fts'")
+    ).scalar()
+    if exists:
+        return False
+
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+    connection.execute(text("INSERT INTO video_fts(video_fts) VALUES ('rebuild')"))
+    return True
+
+
+def quote(term: str) -> str:
+    # A quoted string is matched as one substring by the trigram tokenizer, FTS5 operators inside it are plain text
+    return '"' + term.replace('"', '""') + '"'
+
+
+def search_query(query: str) -> str | None:
+    """Turn free text into an FTS5 query matching every term as a substring, None if no term is long enough."""
+    terms = [quote(term) for term in query.split() if len(term) >= MIN_TERM_LENGTH]
+    return " AND ".join(terms) if terms else None
+
+
+def matching_video_ids(keyword: str, column: str) -> Select[tuple[int]]:
+    """Ids of the videos whose column contains keyword, keyword has to be at least MIN_TERM_LENGTH long."""
+    return select(video_fts.c.rowid).where(video_fts.c.video_fts.match(f"{{{column}}} : {quote(keyword)}"))
+
+
+class SearchResult(SQLModel):
+    id: int
+    subscription_id: int
+    title: str
+    title_highlight: str
+    description_snippet: str | None
+    published: datetime | None
+    status: VideoStatus
+    thumbnail_url: str | None
+    rank: float
+
+
+async def search_videos(
+    session: AsyncSession, query: str, limit: int, subscription_id: int | None = None
+) -> list[SearchResult]:
+    match_query = search_query(query)
+    if match_query is None:
+        return []
+
+    fts = literal_column("video_fts")
+    rank = func.bm25(fts, TITLE_WEIGHT, DESCRIPTION_WEIGHT).label("rank")
+    statement = (
+        select(
+            col(Video.id),
+            col(Video.subscription_id),
+            col(Video.title),
+            func.highlight(fts, 0, "<b>", "</b>").label("title_highlight"),
+            func.snippet(fts, 1, "<b>", "</b>", "…", 16).label("description_snippet"),
+            col(Video.published),
+            col(Video.status),
+            col(Video.thumbnail_url),
+            rank,
+        )
+        .select_from(video_fts.join(video_table, video_fts.c.rowid == col(Video.id)))
+        .where(video_fts.c.video_fts.match(match_query))
+        .order_by(rank)
+        .limit(limit)
+    )
+    if subscription_id is not None:
+        statement = statement.where(col(Video.subscription_id) == subscription_id)
+
+    result = await session.execute(statement)
+    return [SearchResult.model_validate(row, from_attributes=True) for row in result.all()]
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable, Hashable
+from dataclasses import dataclass, replace
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SingleFlightStats:
+    name: str
+    # Flights that actually ran the work
+    started: int = 0
+    # Callers that found the work for their key already running and awaited it instead
+    coalesced: int = 0
+    failed: int = 0
+    in_flight: int = 0
+
+
+class SingleFlight[K: Hashable, T]:
+    """Runs at most one call per key at a time, callers arriving while it runs await the same result.
+
+    The work keeps running if the caller that started it is cancelled, the others may still be waiting for it.
+    Failures are raised to every caller and not cached, the next call for the key starts a new flight.
+    """
+
+    def __init__(self, name: str) -> None:
+        self._flights: dict[K, asyncio.Task[T]] = {}
+        self._stats = SingleFlightStats(name)
+        _registry.append(self)
+
+    async def run(self, key: K, work: Callable[[], Awaitable[T]]) -> T:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(work())
+            self._flights[key] = flight
+            self._stats.started += 1
+            flight.add_done_callback(lambda done: self._land(key, done))
+        else:
+            self._stats.coalesced += 1
+            logger.debug("%s %s is already running, waiting for it", self._stats.name, key)
+        return await asyncio.shield(flight)
+
+    def in_flight(self, key: K) -> bool:
+        return key in self._flights
+
+    def stats(self) -> SingleFlightStats:
+        return replace(self._stats, in_flight=len(self._flights))
+
+    def _land(self, key: K, flight: "asyncio.Task[T]") -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        # Retrieving the exception here keeps asyncio from logging it when every caller was cancelled
+        if not flight.cancelled() and flight.exception() is not None:
+            self._stats.failed += 1
+
+
+_registry: list[SingleFlight] = []  # type: ignore[type-arg]
+
+
+def single_flight_stats() -> list[SingleFlightStats]:
+    return [flight.stats() for flight in _registry]
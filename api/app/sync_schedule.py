@@ -0,0 +1,95 @@
+import random
+from collections.abc import Sequence
+from datetime import datetime, timedelta
+
+from pytz import utc
+from sqlalchemy import ColumnElement, and_, func, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlmodel import col, select
+
+from app.config import (
+    SYNC_JITTER,
+    SYNC_MAX_INTERVAL_SECONDS,
+    SYNC_MIN_INTERVAL_SECONDS,
+    SYNC_POLLS_PER_UPLOAD,
+)
+from app.models.subscription import Subscription, Video
+
+# Subscriptions without a next_sync_at are due this long after their last sync, like before adaptive scheduling
+LEGACY_SYNC_INTERVAL = timedelta(minutes=15)
+# Uploads the interval is based on
+RECENT_UPLOADS = 10
+
+
+def as_utc(timestamp: datetime) -> datetime:
+    # SQLite hands datetimes back without their timezone, they are all stored in UTC
+    return timestamp if timestamp.tzinfo is not None else timestamp.replace(tzinfo=utc)
+
+
+def sync_interval(recent_uploads: Sequence[datetime], now: datetime) -> timedelta:
+    """How long to wait before syncing a channel again, given its newest uploads.
+
+    The average gap between uploads includes the time since the newest one, so a channel that stopped uploading is
+    polled less and less often. Channels without uploads get the longest interval.
+    """
+    if not recent_uploads:
+        return timedelta(seconds=SYNC_MAX_INTERVAL_SECONDS)
+    oldest = min(as_utc(published) for published in recent_uploads)
+    average_gap = (now - oldest) / len(recent_uploads)
+    seconds = average_gap.total_seconds() / SYNC_POLLS_PER_UPLOAD
+    return timedelta(seconds=min(max(seconds, SYNC_MIN_INTERVAL_SECONDS), SYNC_MAX_INTERVAL_SECONDS))
+
+
+def with_jitter(interval: timedelta, jitter: float = SYNC_JITTER) -> timedelta:
+    # Subscriptions synced together drift apart instead of coming due together again
+    return interval * random.uniform(1 - jitter, 1 + jitter)
+
+
+def due_condition(now: datetime) -> ColumnElement[bool]:
+    next_sync_at, last_updated = col(Subscription.next_sync_at), col(Subscription.last_updated)
+    return or_(
+        next_sync_at <= now,
+        and_(
+            next_sync_at.is_(None),
+            or_(last_updated.is_(None), last_updated < now - LEGACY_SYNC_INTERVAL),
+        ),
+    )
+
+
+async def schedule_next_sync(session: AsyncSession, subscription: Subscription, now: datetime) -> datetime:
+    """Set when the subscription is synced next from how often it uploads. The caller commits."""
+    recent_uploads = (
+        (
+            await session.execute(
+                select(col(Video.published))
+                .where(col(Video.subscription_id) == subscription.id, col(Video.published).is_not(None))
+                .order_by(col(Video.published).desc())
+                .limit(RECENT_UPLOADS)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    subscription.next_sync_at = now + with_jitter(sync_interval(recent_uploads, now))  # type: ignore[arg-type]
+    session.add(subscription)
+    return subscription.next_sync_at
+
+
+async def next_due_at(session: AsyncSession) -> datetime | None:
+    """When the next subscription comes due, None without subscriptions."""
+    scheduled = (await session.execute(select(func.min(col(Subscription.next_sync_at))))).scalar()
+    unscheduled, synced, last_updated = (
+        await session.execute(
+            select(
+                func.count(), func.count(col(Subscription.last_updated)), func.min(col(Subscription.last_updated))
+            ).where(col(Subscription.next_sync_at).is_(None))
+        )
+    ).one()
+
+    candidates = [as_utc(scheduled)] if scheduled is not None else []
+    if unscheduled > synced:
+        # A subscription that was never synced is due right away
+        candidates.append(datetime.min.replace(tzinfo=utc))
+    elif last_updated is not None:
+        candidates.append(as_utc(last_updated) + LEGACY_SYNC_INTERVAL)
+    return min(candidates, default=None)
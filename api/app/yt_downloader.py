@@ -1,16 +1,32 @@
 import asyncio
 import concurrent.futures
 import logging
+import multiprocessing
+import os
+import queue
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
 import yt_dlp
 
+from app import rate_limit
+from app.config import (
+    DOWNLOAD_CHUNK_SIZE_BYTES,
+    METADATA_POOL_MAX_TASKS_PER_CHILD,
+    METADATA_POOL_SIZE,
+)
+from app.library import partial_download_dir, remove_partial_download
 from app.models.subscription import MetadataErrorType
 
+if TYPE_CHECKING:
+    from app.metadata_cache import MetadataCache
+
 logger = logging.getLogger(__name__)
 
+_metadata_executor: concurrent.futures.ProcessPoolExecutor | None = None
+_metadata_cache: "MetadataCache | None" = None
+
 
 @dataclass
 class VideoFormat:  # ignore:too-many-instance-attributes
@@ -51,28 +67,64 @@ class MetadataSuccess:
 MetadataResult = MetadataSuccess | MetadataError
 
 
-async def mock_download_content(video_url: str, output_path: str) -> str:
-    print(f"Downloading content from {video_url} to {output_path}")
-    return f"{output_path}/example_video.mp4"
+@dataclass
+class DownloadJob:
+    video_id: int
+    url: str
+    destination: str
+
+
+@dataclass
+class DownloadProgress:
+    video_id: int
+    downloaded_bytes: int
+    total_bytes: int | None
+
+
+@dataclass
+class DownloadOutcome:
+    video_id: int
+    file_path: str | None
+    error: str | None = None
+
+
+def download_video(job: DownloadJob, progress_queue: "queue.Queue[DownloadProgress]") -> DownloadOutcome:
+    """Download a single video, runs inside a download worker process.
+
+    The video is written to its own partial directory inside the destination and renamed into place once complete,
+    so an interrupted download never shows up in the library and resumes from its .part file on the next attempt.
+    Progress is reported through progress_queue, the engine writes it back to the database in batches.
+    """
 
+    def report_progress(status: dict[str, Any]) -> None:
+        if status.get("status") == "downloading":
+            total = status.get("total_bytes") or status.get("total_bytes_estimate")
+            progress_queue.put(DownloadProgress(job.video_id, status.get("downloaded_bytes") or 0, total))
 
-async def download_content(video_url: str, output_path: str) -> str:
-    print(f"Downloading content from {video_url} to {output_path}")
+    partial_dir = partial_download_dir(job.destination, job.video_id)
     ydl_opts: dict[str, Any] = {
-        "outtmpl": f"{output_path}/%(title)s.%(ext)s",
+        "outtmpl": f"{partial_dir}/%(title)s [%(id)s].%(ext)s",
         "format": "best",
-        "postprocessing": [
-            {
-                "key": "FFmpegVideoConvert",
-                "preferredquality": "135",
-                "preferredformat": "mp4",
-            }
-        ],
+        "continuedl": True,
+        "http_chunk_size": DOWNLOAD_CHUNK_SIZE_BYTES,
+        "progress_hooks": [report_progress],
         "logger": logger,  # type: ignore
     }
-    with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
-        ydl.download([video_url])
-    return f"{output_path}/example_video.mp4"
+    try:
+        rate_limit.acquire_blocking(job.url)
+        with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
+            info = ydl.extract_info(job.url, download=True)  # pyright: ignore
+            partial_path: str = ydl.prepare_filename(info)  # pyright: ignore
+        rate_limit.report_blocking(job.url, 200)
+
+        # The partial directory lives on the same filesystem as the library, so the rename is atomic
+        file_path = os.path.join(job.destination, os.path.basename(partial_path))
+        os.replace(partial_path, file_path)
+        remove_partial_download(job.destination, job.video_id)
+        return DownloadOutcome(job.video_id, file_path)
+    except Exception as e:  # pylint: disable=broad-except
+        _report_error(job.url, str(e))
+        return DownloadOutcome(job.video_id, None, str(e))
 
 
 def obtain_channel_data(channel_url: str) -> dict[str, Any]:
@@ -89,8 +141,10 @@ def extract_info(url: str) -> MetadataResult:
         ydl_opts: dict[str, Any] = {
             "logger": logger,
         }
+        rate_limit.acquire_blocking(url)
         with yt_dlp.YoutubeDL(ydl_opts) as ydl:  # type: ignore
             video_info = ydl.extract_info(url, download=False)  # pyright: ignore
+        rate_limit.report_blocking(url, 200)
 
         # TODO: Validate field values
         metadata = VideoMetadata(
@@ -105,6 +159,7 @@ def extract_info(url: str) -> MetadataResult:
         return MetadataSuccess(url=url, metadata=metadata)
     except yt_dlp.utils.DownloadError as e:  # type: ignore[arg-type]
         error_message: str = str(e)  # type: ignore[arg-type]
+        _report_error(url, error_message)
         if "This live event will begin in a few moments" in error_message:
             return MetadataError(url, MetadataErrorType.LIVE_EVENT_NOT_STARTED, error_message)
         if "This video is unavailable" in error_message:
@@ -120,8 +175,84 @@ def extract_info(url: str) -> MetadataResult:
         return MetadataError(url, MetadataErrorType.UNKNOWN_ERROR, str(e))
 
 
+def _report_error(url: str, error_message: str) -> None:
+    # yt-dlp only surfaces throttling through its error messages
+    status_code = rate_limit.status_from_error(error_message)
+    if status_code is not None:
+        rate_limit.report_blocking(url, status_code)
+
+
+def _warm_worker(limiter: "rate_limit.RateLimiterLike | None" = None) -> None:
+    """Pool initializer, pays for yt-dlp's extractor registration once per worker instead of once per video.
+
+    limiter is the rate limiter shared with the rest of the application.
+    """
+    rate_limit.set_rate_limiter(limiter)
+    yt_dlp.YoutubeDL({"quiet": True, "logger": logger})  # type: ignore
+
+
+def _noop() -> None:
+    pass
+
+
+async def start_metadata_pool(
+    max_workers: int = METADATA_POOL_SIZE, max_tasks_per_child: int = METADATA_POOL_MAX_TASKS_PER_CHILD
+) -> None:
+    """Start the long-lived metadata extraction pool and wait until every worker has been spawned."""
+    global _metadata_executor  # pylint: disable=global-statement
+    if _metadata_executor is not None:
+        return
+
+    # Workers are spawned rather than forked, forking a process running an event loop and threads is unsafe and
+    # max_tasks_per_child is not supported with fork.
+    _metadata_executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_warm_worker,
+        initargs=(rate_limit.shared_rate_limiter(),),
+        max_tasks_per_child=max_tasks_per_child or None,
+    )
+
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(_metadata_executor, _noop) for _ in range(max_workers)))
+    logger.info("Started metadata pool with %d workers", max_workers)
+
+
+async def shutdown_metadata_pool() -> None:
+    global _metadata_executor  # pylint: disable=global-statement
+    if _metadata_executor is None:
+        return
+
+    executor, _metadata_executor = _metadata_executor, None
+    await asyncio.to_thread(executor.shutdown, wait=True, cancel_futures=True)
+    logger.info("Shut down metadata pool")
+
+
+def set_metadata_cache(cache: "MetadataCache | None") -> None:
+    global _metadata_cache  # pylint: disable=global-statement
+    _metadata_cache = cache
+
+
 async def get_metadata(urls: list[str]) -> list[MetadataResult]:
+    cache = _metadata_cache
+    cached: dict[str, MetadataResult] = await cache.get_many(urls) if cache is not None else {}
+    misses = list(dict.fromkeys(url for url in urls if url not in cached))
+
+    extracted = await _extract_all(misses) if misses else []
+    if cache is not None and extracted:
+        await cache.put_many(extracted)
+
+    results = cached | dict(zip(misses, extracted))
+    return [results[url] for url in urls]
+
+
+async def _extract_all(urls: list[str]) -> list[MetadataResult]:
     loop = asyncio.get_running_loop()
+    if _metadata_executor is not None:
+        futures = [loop.run_in_executor(_metadata_executor, extract_info, url) for url in urls]
+        return list(await asyncio.gather(*futures))
+
+    # No shared pool outside of the lifespan
     with concurrent.futures.ProcessPoolExecutor() as executor:
         futures = [loop.run_in_executor(executor, extract_info, url) for url in urls]
         results = await asyncio.gather(*futures)
@@ -0,0 +1 @@
+# Micro benchmarks, run from the api directory with `python -m benchmarks.<name>`.
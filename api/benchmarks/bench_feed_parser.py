@@ -0,0 +1,67 @@
+"""Compare the lxml streaming feed parser against the previous BeautifulSoup parser.
+
+    python -m benchmarks.bench_feed_parser
+"""
+
+import os
+import re
+import timeit
+from datetime import datetime
+
+from bs4 import BeautifulSoup
+
+from app.feed_parser import read_new_entries
+from app.models.subscription import Video, VideoStatus
+
+RESOURCES = os.path.join(os.path.dirname(__file__), "..", "tests", "resources")
+ITERATIONS = 200
+
+
+def beautifulsoup_parser(response_content: str) -> list[Video]:
+    """The parser fetch_videos_from_rss_feed used before app.feed_parser."""
+    soup = BeautifulSoup(response_content, "xml")
+    videos: list[Video] = []
+    for entry in soup.find_all("entry"):
+        videos.append(
+            Video(
+                title=entry.find("title").text,
+                published=datetime.fromisoformat(entry.find("published").text),
+                video_id=entry.find("yt:videoId").text,
+                link=entry.find("link").get("href"),
+                author=entry.find("author").find("name").text,
+                description=(
+                    entry.find("media:group").find("media:description").text if entry.find("media:group") else ""
+                ),
+                thumbnail_url=entry.find("media:thumbnail").get("url"),
+                status=VideoStatus.PENDING,
+            )
+        )
+    return videos
+
+
+def full_feed(fixture: str, entries: int = 15) -> str:
+    """Grow the two entry fixture to the 15 entries YouTube serves, with distinct video ids."""
+    entry = fixture[fixture.index("<entry>") : fixture.rindex("</entry>") + len("</entry>")]
+    copies = [re.sub(r"(<yt:videoId>|watch\?v=|/vi/)([\w-]+)", rf"\g<1>\g<2>{i}", entry) for i in range(entries // 2)]
+    return fixture.replace(entry, "\n".join(copies))
+
+
+def main() -> None:
+    with open(os.path.join(RESOURCES, "videos.xml"), encoding="utf-8") as file:
+        fixture = file.read()
+
+    for name, feed in (("fixture (2 entries)", fixture), ("full feed (14 entries)", full_feed(fixture))):
+        newest_id = read_new_entries(feed, set()).entries[0].video_id
+        cases = {
+            "beautifulsoup": lambda feed=feed: beautifulsoup_parser(feed),
+            "lxml, all entries new": lambda feed=feed: read_new_entries(feed, set()),
+            "lxml, nothing new": lambda feed=feed, known={newest_id}: read_new_entries(feed, known),
+        }
+        print(name)
+        for case, func in cases.items():
+            seconds = min(timeit.repeat(func, number=ITERATIONS, repeat=3)) / ITERATIONS
+            print(f"  {case:<24} {seconds * 1_000_000:10.1f} us/feed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Compare the compiled filter plan against calling Filter.to_callable() per video and filter, 10k videos x 20 filters.
+
+    python -m benchmarks.bench_filters
+"""
+
+import random
+import timeit
+from datetime import datetime, timedelta
+
+from app.filters import compile_filters
+from app.models.subscription import (
+    ComparisonOperator,
+    Filter,
+    FilterType,
+    Video,
+    VideoStatus,
+)
+
+VIDEOS = 10_000
+ITERATIONS = 5
+WORDS = ["python", "rust", "live", "stream", "shorts", "tutorial", "review", "unboxing", "podcast", "highlights"]
+FILLER = ["the", "new", "video", "about", "my", "setup", "and", "today", "we", "look", "at", "this", "week", "channel"]
+
+
+def make_filters() -> list[Filter]:
+    filters = [Filter(filter_type=FilterType.TITLE_CONTAINS, keyword=word) for word in WORDS[:8]]
+    filters += [Filter(filter_type=FilterType.DESCRIPTION_CONTAINS, keyword=word) for word in WORDS[2:8]]
+    filters += [
+        Filter(filter_type=FilterType.DURATION, comparison_operator=operator, threshold_seconds=seconds)
+        for operator, seconds in (
+            (ComparisonOperator.LT, 60),
+            (ComparisonOperator.GT, 7200),
+            (ComparisonOperator.GE, 600),
+        )
+    ]
+    filters += [
+        Filter(
+            filter_type=FilterType.PUBLISHED_AFTER, comparison_operator=operator, threshold_date=datetime(2023, 1, 1)
+        )
+        for operator in (ComparisonOperator.GT, ComparisonOperator.LE, ComparisonOperator.NE)
+    ]
+    return filters
+
+
+def make_videos(rng: random.Random) -> list[Video]:
+    return [
+        Video(
+            id=i,
+            subscription_id=1,
+            status=VideoStatus.OBTAINED_METADATA,
+            link=f"https://www.youtube.com/watch?v={i}",
+            author="Benchmark",
+            # Keywords show up in some titles and most descriptions, like they would on a real channel
+            title=" ".join(rng.choices(FILLER, k=5) + rng.choices(WORDS, k=rng.randrange(2))).title(),
+            description=" ".join(rng.choices(FILLER, k=60) + rng.choices(WORDS, k=rng.randrange(3))),
+            published=datetime(2022, 1, 1) + timedelta(days=rng.randrange(730)),
+            video_id=str(i),
+            duration=rng.randrange(10, 10_000),
+        )
+        for i in range(VIDEOS)
+    ]
+
+
+def per_pair(videos: list[Video], filters: list[Filter]) -> list[list[bool]]:
+    """How applicable_filters evaluated filters before app.filters compiled them."""
+    return [[f.to_callable()(video) for video in videos] for f in filters]
+
+
+def main() -> None:
+    filters = make_filters()
+    videos = make_videos(random.Random(0))
+    assert len(filters) == 20
+
+    cases = {
+        "to_callable() per video and filter": lambda: per_pair(videos, filters),
+        "compiled plan, columnar": lambda: compile_filters(filters).evaluate(videos),
+    }
+    print(f"{VIDEOS} videos x {len(filters)} filters")
+    for label, case in cases.items():
+        seconds = min(timeit.repeat(case, number=1, repeat=ITERATIONS))
+        print(f"  {label:40s} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""Compare keyword lookups over video titles and descriptions: full scans against the video_fts index.
+
+    python -m benchmarks.bench_search
+"""
+
+import asyncio
+import logging
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy import ColumnElement, func, insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import SQLModel, col, select
+
+from app.database.session import make_engine
+from app.models.subscription import Subscription, Video, VideoStatus
+from app.search import matching_video_ids, search_videos
+
+VIDEOS = 200_000
+SUBSCRIPTIONS = 200
+REPEATS = 5
+WORDS = (
+    "review unboxing tutorial live stream highlights interview gameplay walkthrough recipe travel vlog news "
+    "music podcast behind scenes update announcement trailer reaction challenge build guide tips"
+).split()
+KEYWORDS = ["tutorial", "kubernetes", "podcast"]
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+async def populate(sessions: async_sessionmaker[AsyncSession]) -> None:
+    rng = random.Random(0)
+    async with sessions() as session:
+        session.add_all(
+            Subscription(id=i, title=f"Channel {i}", url=f"u{i}", description="", rss_feed_url=f"r{i}")
+            for i in range(1, SUBSCRIPTIONS + 1)
+        )
+        await session.flush()
+        for start in range(0, VIDEOS, 10_000):
+            await session.execute(
+                insert(Video),
+                [
+                    {
+                        "subscription_id": i % SUBSCRIPTIONS + 1,
+                        "status": VideoStatus.PENDING_DOWNLOAD,
+                        "link": f"https://www.youtube.com/watch?v={i}",
+                        "author": "Benchmark",
+                        "title": sentence(rng, 6),
+                        # A handful of videos mention a keyword no title uses
+                        "description": sentence(rng, 40) + (" kubernetes" if i % 5000 == 0 else ""),
+                        "video_id": str(i),
+                    }
+                    for i in range(start, min(start + 10_000, VIDEOS))
+                ],
+            )
+        await session.commit()
+
+
+async def timed(sessions: async_sessionmaker[AsyncSession], condition: ColumnElement[bool]) -> tuple[float, int]:
+    timings = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        async with sessions() as session:
+            count = (await session.execute(select(func.count()).where(condition))).scalar_one()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings), count
+
+
+async def main() -> None:
+    logging.getLogger("aiosqlite").setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory(dir=".") as directory:
+        engine = make_engine(f"sqlite+aiosqlite:///{Path(directory) / 'search.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(SQLModel.metadata.create_all)
+        sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        started = time.perf_counter()
+        await populate(sessions)
+        print(f"inserted {VIDEOS} videos with the index maintained by triggers in {time.perf_counter() - started:.1f}s")
+
+        description = col(Video.description)
+        for keyword in KEYWORDS:
+            print(f"description contains {keyword!r}")
+            for name, condition in (
+                ("instr(lower())", func.coalesce(func.instr(func.lower(description), keyword), 0) > 0),
+                ("LIKE", description.like(f"%{keyword}%")),
+                ("video_fts MATCH", col(Video.id).in_(matching_video_ids(keyword, "description"))),
+            ):
+                seconds, count = await timed(sessions, condition)
+                print(f"  {name:16} {seconds * 1000:8.1f}ms  {count:7} videos")
+
+        started = time.perf_counter()
+        async with sessions() as session:
+            results = await search_videos(session, "kubernetes tutorial", 20)
+        print(f"ranked search, top {len(results)}: {(time.perf_counter() - started) * 1000:.1f}ms")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""Measure API-style read throughput while a sync job is writing, with and without the tuned SQLite engine.
+
+The writer runs in its own process, like a second worker or the CLI would, so reads and writes actually overlap.
+
+    python -m benchmarks.bench_sqlite_concurrency
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import statistics
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+from sqlalchemy import func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlmodel import SQLModel, select
+
+from app.database.session import make_engine
+from app.models.subscription import Subscription, Video, VideoStatus
+
+DURATION_SECONDS = 5.0
+READERS = 4
+VIDEOS_PER_WRITE = 15
+
+
+def build_engine(kind: str, path: Path) -> AsyncEngine:
+    url = f"sqlite+aiosqlite:///{path}"
+    if kind == "default":
+        # The engine database.session used to create, pysqlite's own 5 second timeout is the only busy handling
+        return create_async_engine(url)
+    return make_engine(url)
+
+
+async def write(kind: str, path: Path, duration: float) -> tuple[int, int]:
+    """Insert a feed's worth of videos per transaction, like the scheduler does for every subscription."""
+    engine = build_engine(kind, path)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    writes = errors = 0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        try:
+            async with sessions() as session:
+                session.add_all(
+                    Video(
+                        subscription_id=1,
+                        status=VideoStatus.PENDING,
+                        link="https://www.youtube.com/watch?v=benchmark",
+                        author="Benchmark",
+                        description="Benchmark video",
+                        published=datetime.now(),
+                        title=f"Video {writes}-{i}",
+                        video_id=f"{writes}-{i}",
+                    )
+                    for i in range(VIDEOS_PER_WRITE)
+                )
+                await session.commit()
+            writes += 1
+        except OperationalError:
+            errors += 1
+    await engine.dispose()
+    return writes, errors
+
+
+def writer_process(kind: str, path: Path, duration: float, results: "multiprocessing.Queue[tuple[int, int]]") -> None:
+    results.put(asyncio.run(write(kind, path, duration)))
+
+
+async def read(sessions: async_sessionmaker[AsyncSession], deadline: float) -> tuple[list[float], int]:
+    latencies: list[float] = []
+    errors = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            async with sessions() as session:
+                await session.execute(
+                    select(Video.status, func.count()).where(Video.subscription_id == 1).group_by(Video.status)
+                )
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:
+            errors += 1
+    return latencies, errors
+
+
+async def run(kind: str, path: Path) -> None:
+    engine = build_engine(kind, path)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with sessions() as session:
+        session.add(Subscription(id=1, title="Benchmark", url="", description="", rss_feed_url=""))
+        await session.commit()
+
+    context = multiprocessing.get_context("spawn")
+    results: multiprocessing.Queue[tuple[int, int]] = context.Queue()
+    writer = context.Process(target=writer_process, args=(kind, path, DURATION_SECONDS, results))
+    writer.start()
+    deadline = time.perf_counter() + DURATION_SECONDS
+    read_results = await asyncio.gather(*(read(sessions, deadline) for _ in range(READERS)))
+    writes, write_errors = await asyncio.to_thread(results.get)
+    writer.join()
+    await engine.dispose()
+
+    latencies = sorted(latency for result in read_results for latency in result[0])
+    read_errors = sum(result[1] for result in read_results)
+    p99 = latencies[int(len(latencies) * 0.99)] * 1000 if latencies else float("nan")
+    print(
+        f"  reads/s {len(latencies) / DURATION_SECONDS:8.1f}  "
+        f"read p50 {statistics.median(latencies) * 1000:6.2f}ms  p99 {p99:7.2f}ms  "
+        f"writes/s {writes / DURATION_SECONDS:6.1f}  locked errors {read_errors + write_errors}"
+    )
+
+
+async def main() -> None:
+    logging.getLogger("aiosqlite").setLevel(logging.WARNING)
+    # Not the system temp directory, which may be a tmpfs where fsync is free
+    with tempfile.TemporaryDirectory(dir=".") as directory:
+        print("default engine (rollback journal, synchronous=FULL, no busy timeout)")
+        await run("default", Path(directory) / "default.db")
+        print("make_engine (WAL, synchronous=NORMAL, busy timeout, mmap)")
+        await run("tuned", Path(directory) / "tuned.db")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
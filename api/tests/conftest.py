@@ -0,0 +1,16 @@
+from collections.abc import AsyncGenerator
+from pathlib import Path
+
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+
+@pytest_asyncio.fixture(scope="function")
+async def sessions(tmp_path: Path) -> AsyncGenerator[async_sessionmaker[AsyncSession], None]:
+    """Sessions on an empty database file of the test's own."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await engine.dispose()
@@ -0,0 +1,25 @@
+from datetime import datetime
+from typing import Any
+
+from app.models.subscription import Subscription, Video
+
+
+def subscription(subscription_id: int, **values: Any) -> Subscription:
+    defaults = {
+        "title": f"Channel {subscription_id}",
+        "url": f"http://example.com/{subscription_id}",
+        "description": "",
+        "rss_feed_url": f"http://example.com/{subscription_id}/rss",
+    }
+    return Subscription(id=subscription_id, **(defaults | values))
+
+
+def video(video_id: str, subscription_id: int = 1, **values: Any) -> Video:
+    defaults = {
+        "link": f"https://www.youtube.com/watch?v={video_id}",
+        "author": "Test Author",
+        "description": "",
+        "published": datetime(2024, 1, 1),
+        "title": f"Video {video_id}",
+    }
+    return Video(subscription_id=subscription_id, video_id=video_id, **(defaults | values))
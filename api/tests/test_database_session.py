@@ -0,0 +1,83 @@
+from collections.abc import AsyncGenerator
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import SQLModel, select
+
+from app.database.session import (
+    make_engine,
+    make_session_factory,
+    session_stats,
+    unit_of_work,
+)
+from app.models.plex import Plex
+
+
+@pytest.mark.asyncio
+async def test_make_engine_configures_sqlite(tmp_path: Path):
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}", busy_timeout_ms=1234)
+    try:
+        async with engine.connect() as conn:
+            pragmas = {
+                name: (await conn.execute(text(f"PRAGMA {name}"))).scalar()
+                for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size")
+            }
+    finally:
+        await engine.dispose()
+
+    # synchronous=NORMAL reads back as 1
+    assert pragmas == {"journal_mode": "wal", "synchronous": 1, "busy_timeout": 1234, "cache_size": -65536}
+
+
+@pytest.mark.asyncio
+async def test_make_engine_supports_in_memory_databases():
+    engine = make_engine("sqlite+aiosqlite://")
+    try:
+        async with engine.connect() as conn:
+            assert (await conn.execute(text("SELECT 1"))).scalar() == 1
+    finally:
+        await engine.dispose()
+
+
+@pytest_asyncio.fixture(scope="function")
+async def sessions(tmp_path: Path) -> AsyncGenerator[async_sessionmaker[AsyncSession], None]:
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    yield make_session_factory(engine)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_session_stats_count_queries_per_session(sessions: async_sessionmaker[AsyncSession]):
+    async with sessions() as session:
+        for _ in range(3):
+            await session.execute(select(Plex))
+        stats = session_stats(session)
+
+    async with sessions() as other:
+        await other.execute(select(Plex))
+        other_stats = session_stats(other)
+
+    assert stats.queries == 3
+    assert stats.database_seconds > 0
+    assert other_stats.queries == 1
+
+
+@pytest.mark.asyncio
+async def test_unit_of_work_commits_or_rolls_back(sessions: async_sessionmaker[AsyncSession]):
+    async with unit_of_work("test", sessions) as session:
+        session.add(Plex(name="committed", endpoint="http://plex", port="32400", token="token"))
+
+    with pytest.raises(RuntimeError):
+        async with unit_of_work("test", sessions) as session:
+            session.add(Plex(name="rolled back", endpoint="http://plex", port="32400", token="token"))
+            await session.flush()
+            raise RuntimeError("job failed")
+
+    async with sessions() as session:
+        names = (await session.execute(select(Plex.name))).scalars().all()
+    assert names == ["committed"]
@@ -0,0 +1,208 @@
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import queue
+import threading
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import select
+
+from app.download_engine import DownloadEngine
+from app.library import partial_download_dir
+from app.models.subscription import Video, VideoStatus
+from app.yt_downloader import (
+    DownloadJob,
+    DownloadOutcome,
+    DownloadProgress,
+    download_video,
+)
+from tests.factories import subscription, video
+
+
+async def seed(sessions: async_sessionmaker[AsyncSession], library: Path, video_ids: list[str]) -> None:
+    async with sessions() as session:
+        session.add(subscription(1, plex_library_path=str(library)))
+        session.add_all([video(video_id, status=VideoStatus.PENDING_DOWNLOAD) for video_id in video_ids])
+        await session.commit()
+
+
+async def wait_for_videos(sessions: async_sessionmaker[AsyncSession], done: set[VideoStatus]) -> list[Video]:
+    for _ in range(200):
+        async with sessions() as session:
+            videos = list((await session.execute(select(Video).order_by(Video.video_id))).scalars().all())
+        if all(video.status in done for video in videos):
+            return videos
+        await asyncio.sleep(0.01)
+    pytest.fail("Downloads did not finish")
+
+
+@pytest.mark.asyncio
+async def test_download_engine_processes_queue(
+    sessions: async_sessionmaker[AsyncSession], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    def mock_download_video(job: DownloadJob, progress_queue: "queue.Queue[DownloadProgress]") -> DownloadOutcome:
+        progress_queue.put(DownloadProgress(job.video_id, 50, 100))
+        if job.url.endswith("broken"):
+            return DownloadOutcome(job.video_id, None, "HTTP Error 403: Forbidden")
+        return DownloadOutcome(job.video_id, f"{job.destination}/{job.video_id}.mp4")
+
+    monkeypatch.setattr("app.download_engine.download_video", mock_download_video)
+    await seed(sessions, tmp_path, ["broken", "working"])
+
+    progress_queue: queue.Queue[DownloadProgress] = queue.Queue()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        engine = DownloadEngine(sessions, workers=2, executor=executor, progress_queue=progress_queue)
+        await engine.start()
+        engine.wake()
+        broken, working = await wait_for_videos(sessions, {VideoStatus.DOWNLOADED, VideoStatus.FAILED})
+        await engine.stop()
+
+    assert broken.status == VideoStatus.FAILED
+    assert broken.retry_count == 1
+    assert broken.next_attempt_at is not None
+    assert working.status == VideoStatus.DOWNLOADED
+    assert working.file_path == f"{tmp_path}/{working.id}.mp4"
+    assert working.download_progress == 1.0
+
+
+@pytest.mark.asyncio
+async def test_crashed_worker_fails_the_download(
+    sessions: async_sessionmaker[AsyncSession], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    def mock_download_video(job: DownloadJob, progress_queue: "queue.Queue[DownloadProgress]") -> DownloadOutcome:
+        if job.url.endswith("crashes"):
+            raise concurrent.futures.process.BrokenProcessPool("A child process terminated abruptly")
+        return DownloadOutcome(job.video_id, f"{job.destination}/{job.video_id}.mp4")
+
+    monkeypatch.setattr("app.download_engine.download_video", mock_download_video)
+    await seed(sessions, tmp_path, ["crashes", "working"])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        engine = DownloadEngine(sessions, workers=1, executor=executor, progress_queue=queue.Queue())
+        await engine.start()
+        engine.wake()
+        crashed, working = await wait_for_videos(sessions, {VideoStatus.DOWNLOADED, VideoStatus.FAILED})
+        await engine.stop()
+
+    assert crashed.status == VideoStatus.FAILED
+    assert crashed.retry_count == 1
+    assert crashed.next_attempt_at is not None
+    # The disk slot was released, the next download still ran
+    assert working.status == VideoStatus.DOWNLOADED
+
+
+@pytest.mark.asyncio
+async def test_download_progress_is_written_in_batches(sessions: async_sessionmaker[AsyncSession], tmp_path: Path):
+    await seed(sessions, tmp_path, ["a", "b"])
+    async with sessions() as session:
+        for video in (await session.execute(select(Video))).scalars().all():
+            video.status = VideoStatus.DOWNLOADING
+        await session.commit()
+
+    progress_queue: queue.Queue[DownloadProgress] = queue.Queue()
+    for downloaded in (10, 40, 80):
+        progress_queue.put(DownloadProgress(1, downloaded, 100))
+    progress_queue.put(DownloadProgress(2, 25, 100))
+
+    engine = DownloadEngine(sessions, executor=concurrent.futures.ThreadPoolExecutor(), progress_queue=progress_queue)
+    await engine.flush_progress()
+
+    async with sessions() as session:
+        progress = {video.id: video.download_progress for video in (await session.execute(select(Video))).scalars()}
+    assert progress == {1: 0.8, 2: 0.25}
+
+
+@pytest.mark.asyncio
+async def test_downloads_are_limited_per_disk(
+    sessions: async_sessionmaker[AsyncSession], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    lock = threading.Lock()
+    in_flight = 0
+    peak = 0
+
+    def mock_download_video(job: DownloadJob, progress_queue: "queue.Queue[DownloadProgress]") -> DownloadOutcome:
+        nonlocal in_flight, peak
+        with lock:
+            in_flight += 1
+            peak = max(peak, in_flight)
+        threading.Event().wait(0.02)
+        with lock:
+            in_flight -= 1
+        return DownloadOutcome(job.video_id, f"{job.destination}/{job.video_id}.mp4")
+
+    monkeypatch.setattr("app.download_engine.download_video", mock_download_video)
+    await seed(sessions, tmp_path, ["a", "b", "c", "d"])
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+        engine = DownloadEngine(
+            sessions, workers=4, downloads_per_disk=1, executor=executor, progress_queue=queue.Queue()
+        )
+        await engine.start()
+        engine.wake()
+        await wait_for_videos(sessions, {VideoStatus.DOWNLOADED})
+        await engine.stop()
+
+    assert peak == 1
+
+
+@pytest.mark.asyncio
+async def test_recover_reconciles_interrupted_downloads(sessions: async_sessionmaker[AsyncSession], tmp_path: Path):
+    await seed(sessions, tmp_path, ["finished", "halfway"])
+    async with sessions() as session:
+        for video in (await session.execute(select(Video))).scalars().all():
+            video.status = VideoStatus.DOWNLOADING
+        await session.commit()
+
+    # "finished" was renamed into the library before the restart, "halfway" only has its partial file
+    (tmp_path / "Video finished [finished].mp4").write_bytes(b"video")
+    partial_download_dir(str(tmp_path), 1).mkdir(parents=True)
+    halfway_partial = partial_download_dir(str(tmp_path), 2)
+    halfway_partial.mkdir(parents=True)
+    (halfway_partial / "Video halfway [halfway].mp4.part").write_bytes(b"vid")
+
+    engine = DownloadEngine(sessions, executor=concurrent.futures.ThreadPoolExecutor(), progress_queue=queue.Queue())
+    await engine.recover()
+
+    async with sessions() as session:
+        finished, halfway = (await session.execute(select(Video).order_by(Video.id))).scalars().all()
+    assert finished.status == VideoStatus.DOWNLOADED
+    assert finished.file_path == str(tmp_path / "Video finished [finished].mp4")
+    assert not partial_download_dir(str(tmp_path), 1).exists()
+    assert halfway.status == VideoStatus.PENDING_DOWNLOAD
+    assert (halfway_partial / "Video halfway [halfway].mp4.part").exists()
+
+
+def test_download_video_renames_into_place(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    seen_opts: dict[str, Any] = {}
+
+    class MockYoutubeDL:
+        def __init__(self, opts: dict[str, Any]) -> None:
+            seen_opts.update(opts)
+
+        def __enter__(self) -> "MockYoutubeDL":
+            return self
+
+        def __exit__(self, *args: object) -> None:
+            pass
+
+        def extract_info(self, url: str, download: bool) -> dict[str, Any]:
+            path = Path(self.prepare_filename({}))
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"video")
+            return {}
+
+        def prepare_filename(self, info: dict[str, Any]) -> str:
+            return seen_opts["outtmpl"].replace("%(title)s", "Video").replace("%(id)s", "abc").replace("%(ext)s", "mp4")
+
+    monkeypatch.setattr("app.yt_downloader.yt_dlp.YoutubeDL", MockYoutubeDL)
+
+    outcome = download_video(DownloadJob(7, "https://www.youtube.com/watch?v=abc", str(tmp_path)), queue.Queue())
+
+    assert outcome == DownloadOutcome(7, str(tmp_path / "Video [abc].mp4"))
+    assert seen_opts["continuedl"] is True
+    assert seen_opts["outtmpl"].startswith(str(partial_download_dir(str(tmp_path), 7)))
+    assert (tmp_path / "Video [abc].mp4").read_bytes() == b"video"
+    assert not partial_download_dir(str(tmp_path), 7).exists()
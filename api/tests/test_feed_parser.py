@@ -0,0 +1,70 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+from lxml import etree
+from result import Err, Ok
+
+from app.feed_parser import FeedRead, iter_feed_entries, read_new_entries
+from app.routers import youtube
+
+
+def read_resource(name: str) -> str:
+    with open(os.path.join(os.path.dirname(__file__), "resources", name), encoding="utf-8") as file:
+        return file.read()
+
+
+def test_iter_feed_entries() -> None:
+    expected = json.loads(read_resource("parsed_videos.json"))
+
+    entries = list(iter_feed_entries(read_resource("videos.xml")))
+
+    assert len(entries) == len(expected)
+    for entry, expected_entry in zip(entries, expected):
+        assert entry.title == expected_entry["title"]
+        assert entry.published == datetime.fromisoformat(expected_entry["published"])
+        assert entry.video_id == expected_entry["video_id"]
+        assert entry.link == expected_entry["link"]
+        assert entry.author == expected_entry["author"]
+        assert entry.thumbnail_url == expected_entry["thumbnail"]["url"]
+        assert entry.description
+
+
+def test_read_new_entries_stops_at_first_known_video() -> None:
+    feed = read_resource("videos.xml")
+    # Anything after the known entry must not even be parsed.
+    truncated = feed[: feed.index("<yt:videoId>aGRCwZCA5vI")] + "<<< not xml"
+
+    read = read_new_entries(truncated, {"1C7zocpEqT8"})
+
+    assert read.entries == []
+    assert read.has_entries
+
+
+def test_read_new_entries_counts_known_entries() -> None:
+    feed = read_resource("videos.xml")
+
+    assert read_new_entries(feed, set()).known == 0
+    # The known entry and everything after it
+    read = read_new_entries(feed, {"aGRCwZCA5vI"})
+    assert [entry.video_id for entry in read.entries] == ["1C7zocpEqT8"]
+    assert read.known == 1
+    assert read_new_entries(feed, {"1C7zocpEqT8"}).known == 2
+
+
+def test_read_new_entries_malformed_feed() -> None:
+    with pytest.raises(etree.XMLSyntaxError):
+        read_new_entries("This is not a feed", set())
+
+
+def test_parse_feed_entries_nothing_new_is_not_an_empty_feed() -> None:
+    feed = read_resource("videos.xml")
+
+    assert youtube.parse_feed_entries(feed, {"1C7zocpEqT8"}) == Ok(FeedRead([], 2))
+
+    only_new = youtube.parse_feed_entries(feed, {"aGRCwZCA5vI"})
+    assert isinstance(only_new, Ok) and [entry.video_id for entry in only_new.ok_value.entries] == ["1C7zocpEqT8"]
+
+    empty = youtube.parse_feed_entries('<feed xmlns="http://www.w3.org/2005/Atom"></feed>')
+    assert isinstance(empty, Err) and empty.err_value.error_type == youtube.RssFeedErrorType.EMPTY_FEED
@@ -1,9 +1,20 @@
+import random
+from collections.abc import AsyncGenerator
 from datetime import datetime
+from pathlib import Path
 
 import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel, select
 
 from app.filters import (
+    FilterCounts,
+    KeywordMatcher,
     apply_filters,
+    compile_filters,
+    filter_expression,
+    reevaluate_filters,
 )
 from app.models.subscription import (
     ComparisonOperator,
@@ -139,3 +150,104 @@ def test_all_matching_filters(sample_videos: list[Video]) -> None:
     filtered = apply_filters(sample_videos, [all_match_filter])
     assert len([v for v in filtered if v.status == VideoStatus.PENDING_DOWNLOAD]) == len(sample_videos)
     assert len([v for v in filtered if v.status == VideoStatus.FILTERED]) == 0
+
+
+def test_filter_plan_matches_to_callable() -> None:
+    rng = random.Random(0)
+    words = ["python", "py", "thon", "typescript", "script", "rust", "Machine Learning", "learn", ""]
+    filters = [create_title_contains_filter(word) for word in words]
+    filters += [create_description_contains_filter(word) for word in words]
+    filters += [create_duration_filter(operator, 600) for operator in ComparisonOperator]
+    filters += [create_published_after_filter(operator, datetime(2023, 2, 15)) for operator in ComparisonOperator]
+    filters.append(Filter(filter_type=FilterType.DURATION))
+    videos = [
+        Video(
+            id=i,
+            subscription_id=1,
+            status=VideoStatus.OBTAINED_METADATA,
+            link=f"http://example.com/video{i}",
+            author="Author",
+            title=" ".join(rng.choices(words, k=3)).upper(),
+            description=rng.choice([None, "", " ".join(rng.choices(words, k=4))]),
+            published=rng.choice([None, datetime(2023, 1, 1), datetime(2023, 2, 15), datetime(2023, 3, 30)]),
+            video_id=f"video{i}",
+            # to_callable() takes a fresh datetime.now() per side, so exactly 600 seconds is not comparable
+            duration=rng.choice([None, 0, 599, 601, 3600]),
+        )
+        for i in range(200)
+    ]
+
+    columns = compile_filters(filters).evaluate(videos)
+
+    for f, column in zip(filters, columns):
+        predicate = f.to_callable()
+        assert column == [predicate(video) for video in videos], f
+
+
+def test_keyword_matcher_finds_every_keyword() -> None:
+    matcher = KeywordMatcher(["python", "py", "thon", "on p"])
+    assert matcher.find("learn python programming") == {"python", "py", "thon", "on p"}
+    assert matcher.find("happy") == {"py"}
+    assert matcher.find("rust") == frozenset()
+
+
+def test_matching_filters(sample_videos: list[Video]) -> None:
+    title_filter = create_title_contains_filter("python")
+    duration_filter = create_duration_filter(ComparisonOperator.LT, 1801)
+
+    result = compile_filters([title_filter, duration_filter]).matching_filters(sample_videos)
+
+    assert result == [[title_filter, duration_filter], [], []]
+
+
+@pytest_asyncio.fixture(scope="function")
+async def session(tmp_path: Path) -> AsyncGenerator[AsyncSession, None]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_filter_expressions_match_to_callable(session: AsyncSession, sample_videos: list[Video]) -> None:
+    session.add_all(sample_videos)
+    await session.commit()
+    filters = [
+        create_title_contains_filter("PYTHON"),
+        create_title_contains_filter("100%"),
+        create_description_contains_filter("machine learning"),
+        create_duration_filter(ComparisonOperator.GE, 1000),
+        create_duration_filter(ComparisonOperator.NE, 700),
+        create_published_after_filter(ComparisonOperator.LE, datetime(2023, 2, 15)),
+        Filter(filter_type=FilterType.PUBLISHED_AFTER),
+    ]
+
+    for f in filters:
+        expression = filter_expression(f)
+        assert expression is not None
+        matched = (await session.execute(select(Video.id).where(expression).order_by(Video.id))).scalars().all()
+        predicate = f.to_callable()
+        assert matched == [video.id for video in sample_videos if predicate(video)], f
+
+    assert filter_expression(create_title_contains_filter("Ünïcode")) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("keyword", ["python", "Pythön"])
+async def test_reevaluate_filters(session: AsyncSession, sample_videos: list[Video], keyword: str) -> None:
+    # Only FILTERED and PENDING_DOWNLOAD videos are re-evaluated, the third video is still being processed
+    for video, status in zip(sample_videos, (VideoStatus.FILTERED, VideoStatus.PENDING_DOWNLOAD, VideoStatus.PENDING)):
+        video.status = status
+        video.subscription_id = 1
+    sample_videos[0].title = "Learn Pythön Programming" if keyword == "Pythön" else sample_videos[0].title
+    session.add_all(sample_videos)
+    await session.commit()
+
+    counts = await reevaluate_filters(session, 1, [create_title_contains_filter(keyword)])
+    await session.commit()
+
+    assert counts == FilterCounts(pending_download=1, filtered=1)
+    statuses = (await session.execute(select(Video.status).order_by(Video.id))).scalars().all()
+    assert statuses == [VideoStatus.PENDING_DOWNLOAD, VideoStatus.FILTERED, VideoStatus.PENDING]
@@ -7,6 +7,7 @@ from unittest.mock import MagicMock, patch
 import pytest
 import yt_dlp
 
+from app import yt_downloader
 from app.yt_downloader import (
     MetadataError,
     MetadataErrorType,
@@ -14,6 +15,8 @@ from app.yt_downloader import (
     VideoMetadata,
     extract_info,
     get_metadata,
+    shutdown_metadata_pool,
+    start_metadata_pool,
 )
 
 
@@ -94,3 +97,34 @@ def test_extract_info_errors(error_message: str, expected_error_type: MetadataEr
         assert result.message == error_message
 
         mock_ydl_instance.extract_info.assert_called_once_with("http://example.com/video", download=False)
+
+
+@pytest.mark.asyncio
+async def test_get_metadata_uses_long_lived_pool(monkeypatch: pytest.MonkeyPatch):
+    def mock_extract_info(url: str):
+        return MetadataError(url, MetadataErrorType.VIDEO_UNAVAILABLE, "This video is unavailable")
+
+    monkeypatch.setattr("app.yt_downloader._metadata_executor", MockExecutor(mock_extract_info))
+
+    with patch("concurrent.futures.ProcessPoolExecutor") as throwaway_pool:
+        result = await get_metadata(["http://example.com/a", "http://example.com/b"])
+
+        throwaway_pool.assert_not_called()
+        assert [r.url for r in result] == ["http://example.com/a", "http://example.com/b"]
+        assert all(isinstance(r, MetadataError) for r in result)
+
+
+@pytest.mark.asyncio
+async def test_metadata_pool_lifecycle():
+    await start_metadata_pool(max_workers=1, max_tasks_per_child=1)
+    try:
+        executor = yt_downloader._metadata_executor  # pylint: disable=protected-access
+        assert executor is not None
+
+        # Starting twice keeps the existing pool.
+        await start_metadata_pool(max_workers=1)
+        assert yt_downloader._metadata_executor is executor  # pylint: disable=protected-access
+    finally:
+        await shutdown_metadata_pool()
+
+    assert yt_downloader._metadata_executor is None  # pylint: disable=protected-access
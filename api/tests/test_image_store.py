@@ -0,0 +1,70 @@
+import base64
+import hashlib
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import select
+
+from app.image_store import ImageStore, get_image_store, migrate_inline_image_batch
+from app.models.subscription import Subscription
+from app.routers import images
+from tests.factories import subscription
+
+PNG_IMAGE = b"\x89PNG\r\n\x1a\nimage"
+
+
+def test_put_is_content_addressed(tmp_path: Path):
+    store = ImageStore(tmp_path)
+
+    digest = store.put(PNG_IMAGE)
+
+    assert digest == hashlib.sha256(PNG_IMAGE).hexdigest()
+    assert store.put(PNG_IMAGE) == digest
+    assert store.path(digest).read_bytes() == PNG_IMAGE
+    assert store.path(digest).parent.parent.name == digest[:2]
+
+
+@pytest.mark.asyncio
+async def test_image_route_serves_immutable_images(tmp_path: Path):
+    store = ImageStore(tmp_path)
+    digest = store.put(PNG_IMAGE)
+    app = FastAPI()
+    app.include_router(images.router)
+    app.dependency_overrides[get_image_store] = lambda: store
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        response = await client.get(f"/images/{digest}")
+        assert response.status_code == 200
+        assert response.content == PNG_IMAGE
+        assert response.headers["Content-Type"] == "image/png"
+        assert response.headers["ETag"] == f'"{digest}"'
+        assert "immutable" in response.headers["Cache-Control"]
+
+        revalidated = await client.get(f"/images/{digest}", headers={"If-None-Match": response.headers["ETag"]})
+        assert revalidated.status_code == 304
+
+        assert (await client.get(f"/images/{digest}", params={"width": 13})).status_code == 400
+        assert (await client.get(f"/images/{'0' * 64}")).status_code == 404
+        assert (await client.get("/images/..%2Fengawa.db")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_migrate_inline_images(sessions: async_sessionmaker[AsyncSession], tmp_path: Path):
+    async with sessions() as session:
+        for i in range(3):
+            session.add(subscription(i + 1, image=base64.b64encode(PNG_IMAGE).decode() if i < 2 else None))
+        await session.commit()
+    store = ImageStore(tmp_path / "images")
+
+    assert await migrate_inline_image_batch(sessions, store, batch_size=1) == 1
+    assert await migrate_inline_image_batch(sessions, store, batch_size=5) == 1
+    assert await migrate_inline_image_batch(sessions, store, batch_size=5) == 0
+
+    async with sessions() as session:
+        rows = (await session.execute(select(Subscription.image, Subscription.image_hash))).all()
+    digest = hashlib.sha256(PNG_IMAGE).hexdigest()
+    assert rows == [(None, digest), (None, digest), (None, None)]
+    assert store.path(digest).read_bytes() == PNG_IMAGE
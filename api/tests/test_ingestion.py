@@ -0,0 +1,89 @@
+from collections.abc import AsyncGenerator
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from result import Ok, Result
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import select
+
+from app.feed_parser import FeedEntry
+from app.ingestion import ingest_videos
+from app.models.subscription import RssFeedCache, Video, VideoStatus
+from app.routers import youtube
+from app.routers.subscription import sync_feed
+from app.routers.youtube import RssFeedError
+from tests.factories import subscription, video
+
+RESOURCES = Path(__file__).parent / "resources"
+
+
+def feed_video(video_id: str) -> FeedEntry:
+    return FeedEntry(
+        title=f"Video {video_id}",
+        published=datetime(2024, 1, 1),
+        video_id=video_id,
+        link=f"https://www.youtube.com/watch?v={video_id}",
+        author="Test Author",
+        description="Test description",
+        thumbnail_url=f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg",
+    )
+
+
+@pytest_asyncio.fixture(scope="function")
+async def session(sessions: async_sessionmaker[AsyncSession]) -> AsyncGenerator[AsyncSession, None]:
+    async with sessions() as session:
+        session.add(subscription(1, plex_library_path="/some/path"))
+        await session.commit()
+        yield session
+
+
+@pytest.mark.asyncio
+async def test_ingest_videos_counts_new_and_unchanged(session: AsyncSession):
+    first = await ingest_videos(session, 1, [feed_video("a"), feed_video("b")])
+    await session.commit()
+    assert (first.new, first.unchanged) == (2, 0)
+
+    second = await ingest_videos(session, 1, [feed_video("c"), feed_video("a"), feed_video("b"), feed_video("c")])
+    await session.commit()
+    assert (second.new, second.unchanged) == (1, 3)
+
+    videos = (await session.execute(select(Video).order_by(Video.video_id))).scalars().all()
+    assert [video.video_id for video in videos] == ["a", "b", "c"]
+    assert all(video.subscription_id == 1 and video.status == VideoStatus.PENDING for video in videos)
+
+
+@pytest.mark.asyncio
+async def test_ingest_videos_counts_entries_the_parser_skipped(session: AsyncSession):
+    result = await ingest_videos(session, 1, [feed_video("a")], known=14)
+    assert (result.new, result.unchanged) == (1, 14)
+
+    nothing_new = await ingest_videos(session, 1, [], known=15)
+    assert (nothing_new.new, nothing_new.unchanged) == (0, 15)
+
+
+@pytest.mark.asyncio
+async def test_ingest_videos_empty_feed(session: AsyncSession):
+    result = await ingest_videos(session, 1, [])
+    assert (result.new, result.unchanged) == (0, 0)
+
+
+@pytest.mark.asyncio
+async def test_sync_reports_the_entries_the_parser_skipped(session: AsyncSession, monkeypatch: pytest.MonkeyPatch):
+    with open(RESOURCES / "videos.xml", encoding="utf-8") as file:
+        feed = file.read()
+
+    async def fetch_feed_if_changed(
+        cache: RssFeedCache,
+    ) -> Result[str, RssFeedError]:  # pylint: disable=unused-argument
+        return Ok(feed)
+
+    monkeypatch.setattr(youtube, "fetch_feed_if_changed", fetch_feed_if_changed)
+    # The older of the feed's two uploads is already stored
+    session.add(video("aGRCwZCA5vI", published=datetime(2024, 1, 1)))
+    await session.commit()
+
+    result = await sync_feed(1, session)
+
+    assert result == {"message": "subscription synced", "new": 1, "unchanged": 1}
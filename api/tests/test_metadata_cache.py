@@ -0,0 +1,126 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.metadata_cache import MetadataCache, youtube_video_id
+from app.yt_downloader import (
+    MetadataError,
+    MetadataErrorType,
+    MetadataResult,
+    MetadataSuccess,
+    VideoMetadata,
+    get_metadata,
+    set_metadata_cache,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = datetime(2024, 1, 1, tzinfo=utc)
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+def success(url: str) -> MetadataSuccess:
+    return MetadataSuccess(
+        url=url,
+        metadata=VideoMetadata(
+            id=youtube_video_id(url) or "",
+            title="Test Video",
+            uploader="Test Uploader",
+            upload_date=datetime(2023, 1, 1),
+            duration_in_seconds=300,
+            description="Test description",
+            thumbnail_url="http://example.com/thumbnail.jpg",
+        ),
+    )
+
+
+@pytest.mark.parametrize(
+    "url, video_id",
+    [
+        ("https://www.youtube.com/watch?v=1C7zocpEqT8", "1C7zocpEqT8"),
+        ("https://youtu.be/1C7zocpEqT8?si=abc", "1C7zocpEqT8"),
+        ("https://www.youtube.com/shorts/1C7zocpEqT8", "1C7zocpEqT8"),
+        ("http://example.com/video", None),
+    ],
+)
+def test_youtube_video_id(url: str, video_id: str | None):
+    assert youtube_video_id(url) == video_id
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_uses_requested_url(sessions: async_sessionmaker[AsyncSession]):
+    cache = MetadataCache(sessions, clock=Clock())
+    await cache.put_many([success("https://www.youtube.com/watch?v=abc")])
+
+    hits = await cache.get_many(["https://youtu.be/abc", "https://www.youtube.com/watch?v=other"])
+
+    assert list(hits) == ["https://youtu.be/abc"]
+    assert hits["https://youtu.be/abc"] == success("https://youtu.be/abc")
+
+
+@pytest.mark.asyncio
+async def test_error_ttl_depends_on_error_type(sessions: async_sessionmaker[AsyncSession]):
+    clock = Clock()
+    cache = MetadataCache(sessions, clock=clock)
+    live = "https://www.youtube.com/watch?v=live"
+    strike = "https://www.youtube.com/watch?v=strike"
+    await cache.put_many(
+        [
+            MetadataError(live, MetadataErrorType.LIVE_EVENT_NOT_STARTED, "This live event will begin"),
+            MetadataError(strike, MetadataErrorType.COPYRIGHT_STRIKE, "This video contains content from"),
+        ]
+    )
+
+    clock.now += timedelta(hours=1)
+    hits = await cache.get_many([live, strike])
+
+    assert list(hits) == [strike]
+    assert isinstance(hits[strike], MetadataError)
+    assert hits[strike].error_type == MetadataErrorType.COPYRIGHT_STRIKE
+
+
+@pytest.mark.asyncio
+async def test_database_tier_survives_eviction_and_restart(sessions: async_sessionmaker[AsyncSession]):
+    clock = Clock()
+    urls = [f"https://www.youtube.com/watch?v=video{i}" for i in range(3)]
+    await MetadataCache(sessions, max_entries=1, clock=clock).put_many([success(url) for url in urls])
+
+    restarted = MetadataCache(sessions, max_entries=1, clock=clock)
+    hits = await restarted.get_many(urls)
+
+    assert hits == {url: success(url) for url in urls}
+
+
+@pytest.mark.asyncio
+async def test_get_metadata_only_extracts_misses(
+    sessions: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+):
+    extracted: list[list[str]] = []
+
+    async def mock_extract_all(urls: list[str]) -> list[MetadataResult]:
+        extracted.append(urls)
+        return [success(url) for url in urls]
+
+    monkeypatch.setattr("app.yt_downloader._extract_all", mock_extract_all)
+    set_metadata_cache(MetadataCache(sessions, clock=Clock()))
+    try:
+        first = await get_metadata(["https://www.youtube.com/watch?v=a", "https://www.youtube.com/watch?v=b"])
+        second = await get_metadata(["https://www.youtube.com/watch?v=b", "https://www.youtube.com/watch?v=c"])
+    finally:
+        set_metadata_cache(None)
+
+    assert extracted == [
+        ["https://www.youtube.com/watch?v=a", "https://www.youtube.com/watch?v=b"],
+        ["https://www.youtube.com/watch?v=c"],
+    ]
+    assert [result.url for result in first + second] == [
+        "https://www.youtube.com/watch?v=a",
+        "https://www.youtube.com/watch?v=b",
+        "https://www.youtube.com/watch?v=b",
+        "https://www.youtube.com/watch?v=c",
+    ]
@@ -0,0 +1,204 @@
+import asyncio
+from collections.abc import AsyncGenerator
+from functools import partial
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import Connection, inspect, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlmodel import SQLModel
+
+from app.config import RETRY_MAX_ATTEMPTS
+from app.database.migrations import (
+    MIGRATIONS,
+    Backfill,
+    Migration,
+    migrate,
+    run_backfills,
+)
+from app.retry import schedule_untracked_retries_batch
+from app.search import search_videos
+
+VERSIONS = [migration.version for migration in MIGRATIONS]
+NEW_INDEXES = {
+    "ix_video_subscription_status_published",
+    "ix_video_subscription_published",
+    "ix_video_status_published",
+    "ix_filter_subscription_id",
+    "ix_retentionpolicy_subscription_id",
+    "ix_subscription_next_sync_at",
+    "ix_video_status_next_attempt_at",
+}
+
+
+@pytest_asyncio.fixture(scope="function")
+async def engine(tmp_path: Path) -> AsyncGenerator[AsyncEngine, None]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    yield engine
+    await engine.dispose()
+
+
+async def create_legacy_database(engine: AsyncEngine) -> None:
+    """The schema create_all produced before migrations, with one video in it."""
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+        for statement in (
+            "DROP TRIGGER video_fts_insert",
+            "DROP TRIGGER video_fts_delete",
+            "DROP TRIGGER video_fts_update",
+            "DROP TABLE video_fts",
+            "DROP TABLE rssfeedcache",
+            "DROP TABLE metadatacacheentry",
+            *(f"DROP INDEX {name}" for name in NEW_INDEXES),
+            "ALTER TABLE video DROP COLUMN download_progress",
+            "ALTER TABLE video DROP COLUMN file_path",
+            "ALTER TABLE subscription DROP COLUMN image_hash",
+            "ALTER TABLE subscription DROP COLUMN next_sync_at",
+            "ALTER TABLE video DROP COLUMN next_attempt_at",
+            "INSERT INTO subscription (id, title, url, description, rss_feed_url, type) "
+            "VALUES (1, 'Channel', 'http://example.com', '', 'http://example.com/rss', 'CHANNEL')",
+            "INSERT INTO video (subscription_id, status, link, author, description, title, video_id, retry_count) "
+            "VALUES (1, 'DOWNLOADED', 'https://www.youtube.com/watch?v=1', 'Author', 'Old video', 'Legacy title', '1', 0)",
+            "INSERT INTO video (subscription_id, status, link, author, description, title, video_id, retry_count) "
+            "VALUES (1, 'FAILED', 'https://www.youtube.com/watch?v=2', 'Author', 'Failed video', 'Failed', '2', 1)",
+        ):
+            await conn.execute(text(statement))
+
+
+def schema(connection: Connection) -> dict[str, set[str]]:
+    inspector = inspect(connection)
+    return {
+        table: {column["name"] for column in inspector.get_columns(table)}
+        | {str(index["name"]) for index in inspector.get_indexes(table)}
+        for table in inspector.get_table_names()
+    }
+
+
+async def versions(engine: AsyncEngine) -> list[int]:
+    async with engine.connect() as conn:
+        return list((await conn.execute(text("SELECT version FROM schema_version ORDER BY version"))).scalars())
+
+
+@pytest.mark.asyncio
+async def test_new_database_is_created_at_the_latest_version(engine: AsyncEngine) -> None:
+    assert await migrate(engine) == VERSIONS
+    assert await migrate(engine) == []
+
+    async with engine.connect() as conn:
+        tables = await conn.run_sync(schema)
+    assert {"video", "subscription", "video_fts", "rssfeedcache", "schema_version"} <= tables.keys()
+    assert NEW_INDEXES <= tables["video"] | tables["filter"] | tables["retentionpolicy"] | tables["subscription"]
+    assert await versions(engine) == VERSIONS
+
+
+@pytest.mark.asyncio
+async def test_migrations_upgrade_a_legacy_database(engine: AsyncEngine) -> None:
+    await create_legacy_database(engine)
+
+    assert await migrate(engine) == VERSIONS
+
+    async with engine.connect() as conn:
+        tables = await conn.run_sync(schema)
+    assert {"download_progress", "file_path", "next_attempt_at"} <= tables["video"]
+    assert {"image_hash", "next_sync_at"} <= tables["subscription"]
+    assert {"rssfeedcache", "metadatacacheentry"} <= tables.keys()
+    assert NEW_INDEXES <= tables["video"] | tables["filter"] | tables["retentionpolicy"] | tables["subscription"]
+    # The search index was built from the existing rows
+    async with AsyncSession(engine) as session:
+        assert [result.title for result in await search_videos(session, "legacy", 10)] == ["Legacy title"]
+    # Videos that failed before retries existed are left to a backfill, not updated under the exclusive lock
+    async with engine.connect() as conn:
+        retries = await conn.execute(text("SELECT video_id FROM video WHERE next_attempt_at IS NOT NULL"))
+        assert retries.scalars().all() == []
+
+
+@pytest.mark.asyncio
+async def test_backfill_schedules_videos_that_failed_before_retries(engine: AsyncEngine) -> None:
+    await create_legacy_database(engine)
+    async with engine.begin() as conn:
+        for video_id, retry_count in (("3", 1), ("4", RETRY_MAX_ATTEMPTS)):
+            await conn.execute(
+                text(
+                    "INSERT INTO video (subscription_id, status, link, author, description, title, video_id, "
+                    f"retry_count) VALUES (1, 'FAILED', 'https://www.youtube.com/watch?v={video_id}', 'Author', '', "
+                    f"'Failed', '{video_id}', {retry_count})"
+                )
+            )
+    await migrate(engine)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    backfill = Backfill("video retry schedule", partial(schedule_untracked_retries_batch, batch_size=1))
+    assert await run_backfills(sessions, [backfill], pause=0) == {"video retry schedule": 2}
+
+    # Retried on the first sweep, a video out of attempts stays as it is
+    async with engine.connect() as conn:
+        retries = await conn.execute(text("SELECT video_id FROM video WHERE next_attempt_at IS NOT NULL"))
+        assert sorted(retries.scalars().all()) == ["2", "3"]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_starts_apply_migrations_once(engine: AsyncEngine, tmp_path: Path) -> None:
+    await create_legacy_database(engine)
+    other = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    try:
+        results = await asyncio.gather(migrate(engine), migrate(other))
+    finally:
+        await other.dispose()
+
+    assert sorted(results) == [[], VERSIONS]
+    assert await versions(engine) == VERSIONS
+
+
+@pytest.mark.asyncio
+async def test_failing_migration_rolls_back(engine: AsyncEngine) -> None:
+    await migrate(engine)
+
+    def broken(connection: Connection) -> None:
+        connection.exec_driver_sql("CREATE TABLE half_done (id INTEGER PRIMARY KEY)")
+        raise RuntimeError("migration failed")
+
+    with pytest.raises(RuntimeError):
+        await migrate(
+            engine,
+            [
+                *MIGRATIONS,
+                Migration(VERSIONS[-1] + 1, "add table", lambda conn: None),
+                Migration(VERSIONS[-1] + 2, "broken", broken),
+            ],
+        )
+
+    async with engine.connect() as conn:
+        assert "half_done" not in await conn.run_sync(schema)
+    assert await versions(engine) == VERSIONS
+
+
+@pytest.mark.asyncio
+async def test_backfills_run_in_batches_and_survive_failures(engine: AsyncEngine) -> None:
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    remaining = [250]
+    seen: list[async_sessionmaker[AsyncSession]] = []
+
+    async def batch(session_factory: async_sessionmaker[AsyncSession], size: int) -> int:
+        seen.append(session_factory)
+        done = min(size, remaining[0])
+        remaining[0] -= done
+        return done
+
+    async def failing(session_factory: async_sessionmaker[AsyncSession]) -> int:
+        raise RuntimeError("backfill failed")
+
+    changed = await run_backfills(
+        sessions,
+        [Backfill("failing", failing), Backfill("counting", partial(batch, size=100))],
+        pause=0,
+    )
+
+    assert changed == {"failing": 0, "counting": 250}
+    # Three batches that changed rows and one that found nothing left
+    assert seen == [sessions] * 4
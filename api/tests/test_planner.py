@@ -0,0 +1,259 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from pytz import utc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import SQLModel, col, select
+
+from app.database.session import make_engine, make_session_factory
+from app.models.subscription import (
+    Filter,
+    FilterType,
+    RetentionPolicy,
+    RetentionType,
+    Video,
+    VideoStatus,
+)
+from app.planner import plan_sync
+from app.scheduler import sync_and_update_videos
+from app.yt_downloader import MetadataResult, MetadataSuccess, VideoMetadata
+from tests.factories import subscription, video
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+@pytest_asyncio.fixture(scope="function")
+async def sessions(sessions: async_sessionmaker[AsyncSession]) -> async_sessionmaker[AsyncSession]:
+    async with sessions() as session:
+        session.add(subscription(1))
+        await session.commit()
+    return sessions
+
+
+def add_videos(session: AsyncSession, statuses: list[VideoStatus], offset: int = 0) -> None:
+    """One video a day, the first is the newest."""
+    for day, status in enumerate(statuses, start=offset):
+        session.add(
+            video(
+                str(day),
+                status=status,
+                description="Episode" if day % 2 else "Trailer",
+                published=NOW - timedelta(days=day),
+            )
+        )
+
+
+def policy(retention_type: RetentionType, **values) -> RetentionPolicy:  # type: ignore
+    defaults = {"videoCount": 0, "dateBefore": date(2000, 1, 1), "timeDeltaTypeValue": timedelta(0)}
+    return RetentionPolicy(subscription_id=1, type=retention_type, **(defaults | values))
+
+
+async def statuses(session: AsyncSession) -> list[VideoStatus]:
+    result = await session.execute(select(Video.status).order_by(col(Video.published).desc()))
+    return list(result.scalars().all())
+
+
+@pytest.mark.asyncio
+async def test_new_subscription_only_fetches_what_count_keeps(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        add_videos(session, [VideoStatus.PENDING] * 15)
+        await session.commit()
+
+        plan = await plan_sync(session, 1, policy(RetentionType.COUNT, videoCount=5), [], now=NOW)
+
+        assert plan.skipped == 10
+        assert len(plan.fetch) == 5
+        assert await statuses(session) == [VideoStatus.PENDING] * 5 + [VideoStatus.RETENTION_SKIPPED] * 10
+        published = [(await session.get(Video, video_id)).published for video_id in plan.fetch]  # type: ignore
+        assert published == sorted(published, reverse=True)
+
+
+@pytest.mark.asyncio
+async def test_count_window_includes_retained_videos(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        add_videos(session, [VideoStatus.PENDING])
+        add_videos(session, [VideoStatus.DOWNLOADED, VideoStatus.PENDING_DOWNLOAD], offset=1)
+        add_videos(session, [VideoStatus.PENDING, VideoStatus.FILTERED, VideoStatus.PENDING], offset=3)
+        await session.commit()
+
+        plan = await plan_sync(session, 1, policy(RetentionType.COUNT, videoCount=4), [], now=NOW)
+
+        assert (len(plan.fetch), plan.skipped) == (2, 1)
+        assert await statuses(session) == [
+            VideoStatus.PENDING,
+            VideoStatus.DOWNLOADED,
+            VideoStatus.PENDING_DOWNLOAD,
+            VideoStatus.PENDING,
+            # Filtered videos do not take up a place
+            VideoStatus.FILTERED,
+            VideoStatus.RETENTION_SKIPPED,
+        ]
+
+
+@pytest.mark.asyncio
+async def test_feed_filters_run_before_retention(sessions: async_sessionmaker[AsyncSession]) -> None:
+    filters = [
+        Filter(subscription_id=1, filter_type=FilterType.DESCRIPTION_CONTAINS, keyword="episode"),
+        # Needs metadata, the planner leaves it for later
+        Filter(subscription_id=1, filter_type=FilterType.DURATION, comparison_operator=">", threshold_seconds=60),
+    ]
+    async with sessions() as session:
+        add_videos(session, [VideoStatus.PENDING] * 6)
+        await session.commit()
+
+        plan = await plan_sync(session, 1, policy(RetentionType.COUNT, videoCount=2), filters, now=NOW)
+
+        assert (len(plan.fetch), plan.skipped, plan.filtered) == (2, 1, 3)
+        assert await statuses(session) == [
+            VideoStatus.FILTERED,
+            VideoStatus.PENDING,
+            VideoStatus.FILTERED,
+            VideoStatus.PENDING,
+            VideoStatus.FILTERED,
+            VideoStatus.RETENTION_SKIPPED,
+        ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "retention",
+    [
+        policy(RetentionType.DELTA, timeDeltaTypeValue=timedelta(days=2, hours=1)),
+        policy(RetentionType.DATE_SINCE, dateBefore=date(2024, 5, 30)),
+    ],
+)
+async def test_time_policies_skip_old_videos(
+    sessions: async_sessionmaker[AsyncSession], retention: RetentionPolicy
+) -> None:
+    async with sessions() as session:
+        add_videos(session, [VideoStatus.PENDING] * 5)
+        await session.commit()
+
+        plan = await plan_sync(session, 1, retention, [], now=NOW)
+
+        assert plan.skipped == 2
+        assert await statuses(session) == [VideoStatus.PENDING] * 3 + [VideoStatus.RETENTION_SKIPPED] * 2
+
+
+@pytest.mark.asyncio
+async def test_skipped_videos_are_reconsidered(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        add_videos(session, [VideoStatus.PENDING] * 3)
+        await session.commit()
+        await plan_sync(session, 1, policy(RetentionType.COUNT, videoCount=1), [], now=NOW)
+        await session.commit()
+
+        plan = await plan_sync(session, 1, None, [], now=NOW)
+
+        assert (len(plan.fetch), plan.skipped) == (3, 0)
+        assert await statuses(session) == [VideoStatus.PENDING] * 3
+
+
+@pytest.mark.asyncio
+async def test_sync_fetches_metadata_for_planned_videos_only(
+    sessions: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    requested: list[str] = []
+
+    async def mock_sync_subscription(subscription_id: int):  # pylint: disable=unused-argument
+        return {"message": "subscription synced"}
+
+    async def mock_metadata(urls: list[str]) -> list[MetadataResult]:
+        requested.extend(urls)
+        return []
+
+    monkeypatch.setattr("app.scheduler.session_factory", sessions)
+    monkeypatch.setattr("app.scheduler.sync_subscription", mock_sync_subscription)
+    monkeypatch.setattr("app.scheduler.get_metadata", mock_metadata)
+
+    async with sessions() as session:
+        session.add(policy(RetentionType.COUNT, videoCount=5))
+        add_videos(session, [VideoStatus.PENDING] * 15)
+        await session.commit()
+
+    await sync_and_update_videos()
+
+    assert requested == [f"https://www.youtube.com/watch?v={day}" for day in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_syncs_do_not_hold_the_write_lock_during_metadata(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # A writer waits at most 200ms for the lock, far less than one metadata fetch takes
+    engine = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}", busy_timeout_ms=200)
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    sessions = make_session_factory(engine)
+
+    async def mock_sync_subscription(subscription_id: int):  # pylint: disable=unused-argument
+        return {"message": "subscription synced"}
+
+    async def slow_metadata(urls: list[str]) -> list[MetadataResult]:
+        await asyncio.sleep(0.5)
+        return [
+            MetadataSuccess(
+                url=url,
+                metadata=VideoMetadata(
+                    id=url,
+                    title="Title",
+                    uploader="Uploader",
+                    upload_date=NOW,
+                    duration_in_seconds=300,
+                    description="",
+                    thumbnail_url="http://example.com/thumbnail.jpg",
+                ),
+            )
+            for url in urls
+        ]
+
+    monkeypatch.setattr("app.scheduler.session_factory", sessions)
+    monkeypatch.setattr("app.scheduler.sync_subscription", mock_sync_subscription)
+    monkeypatch.setattr("app.scheduler.get_metadata", slow_metadata)
+    monkeypatch.setattr("app.scheduler.wake_download_engine", lambda: None)
+
+    async with sessions() as session:
+        for subscription_id in (1, 2):
+            session.add(subscription(subscription_id))
+            retention = policy(RetentionType.COUNT, videoCount=5)
+            retention.subscription_id = subscription_id
+            session.add(retention)
+            for day in range(8):
+                session.add(
+                    video(
+                        f"{subscription_id}-{day}",
+                        subscription_id,
+                        status=VideoStatus.PENDING,
+                        published=NOW - timedelta(days=day),
+                    )
+                )
+        await session.commit()
+
+    await sync_and_update_videos()
+
+    async with sessions() as session:
+        rows = (await session.execute(select(Video.subscription_id, Video.status))).all()
+    await engine.dispose()
+    for subscription_id in (1, 2):
+        assert sorted(status for owner, status in rows if owner == subscription_id) == sorted(
+            [VideoStatus.PENDING_DOWNLOAD] * 5 + [VideoStatus.RETENTION_SKIPPED] * 3
+        )
+
+
+@pytest.mark.asyncio
+async def test_delta_cutoff_is_taken_in_utc(sessions: async_sessionmaker[AsyncSession]) -> None:
+    # NOW on a server nine hours ahead of UTC, publish dates are stored in UTC
+    now = utc.localize(NOW).astimezone(timezone(timedelta(hours=9)))
+    async with sessions() as session:
+        for hours in (5, 11):
+            session.add(video(str(hours), status=VideoStatus.PENDING, published=NOW - timedelta(hours=hours)))
+        await session.commit()
+
+        retention = policy(RetentionType.DELTA, timeDeltaTypeValue=timedelta(hours=8))
+        plan = await plan_sync(session, 1, retention, [], now=now)
+
+        assert plan.skipped == 1
+        assert await statuses(session) == [VideoStatus.PENDING, VideoStatus.RETENTION_SKIPPED]
@@ -0,0 +1,197 @@
+from collections.abc import AsyncGenerator
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+from sqlmodel import SQLModel
+
+from app.database.session import get_session
+from app.download_engine import DownloadEngine
+from app.filters import reevaluate_filters
+from app.models.subscription import (
+    Filter,
+    FilterType,
+    RetentionPolicy,
+    RetentionType,
+    Subscription,
+    Video,
+    VideoStatus,
+)
+from app.planner import plan_sync
+from app.retention import apply_retention
+from app.retry import due_retries
+from app.routers import subscription, videos
+from app.scheduler import (
+    get_pending_videos,
+    get_subscription_for_update,
+    get_subscriptions_to_update,
+    get_videos_for_subscription,
+)
+
+SUBSCRIPTIONS = 20
+VIDEOS_PER_SUBSCRIPTION = 50
+# Read in full on purpose: subscription listings, the Plex server row, and the policies and filters of every
+# subscription for a sync or retention run that covers all of them
+SMALL_TABLES = {"subscription", "plex", "retentionpolicy", "filter"}
+
+
+def scanned_table(detail: str) -> str | None:
+    """The table a plan step reads row by row without any index, None for every other step."""
+    words = detail.split()
+    # "SCAN video USING COVERING INDEX ..." walks an index, subqueries show up as anon_1 or (subquery-1)
+    if len(words) == 2 and words[0] == "SCAN" and not words[1].startswith(("anon_", "(")):
+        return words[1]
+    return None
+
+
+@dataclass
+class Statement:
+    sql: str
+    parameters: Any
+
+
+@pytest_asyncio.fixture(scope="function")
+async def engine(tmp_path: Path) -> AsyncGenerator[AsyncEngine, None]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    statuses = list(VideoStatus)
+    async with sessions() as session:
+        for subscription_id in range(1, SUBSCRIPTIONS + 1):
+            session.add(
+                Subscription(
+                    id=subscription_id,
+                    title=f"Channel {subscription_id}",
+                    url=f"http://example.com/{subscription_id}",
+                    description="",
+                    rss_feed_url=f"http://example.com/{subscription_id}/rss",
+                )
+            )
+            session.add(
+                RetentionPolicy(
+                    subscription_id=subscription_id,
+                    type=list(RetentionType)[subscription_id % 3],
+                    videoCount=10,
+                    dateBefore=date(2024, 1, 1),
+                    timeDeltaTypeValue=timedelta(days=30),
+                )
+            )
+            session.add(Filter(subscription_id=subscription_id, filter_type=FilterType.TITLE_CONTAINS, keyword="video"))
+            for i in range(VIDEOS_PER_SUBSCRIPTION):
+                session.add(
+                    Video(
+                        subscription_id=subscription_id,
+                        status=statuses[i % len(statuses)],
+                        link=f"https://www.youtube.com/watch?v={subscription_id}-{i}",
+                        author="Author",
+                        description="Description",
+                        published=datetime(2024, 1, 1) + timedelta(days=i),
+                        title=f"Video {i}",
+                        video_id=f"{subscription_id}-{i}",
+                    )
+                )
+        await session.commit()
+    async with engine.begin() as conn:
+        # Statistics like a database that has been in use, the planner otherwise guesses
+        await conn.execute(text("ANALYZE"))
+    yield engine
+    await engine.dispose()
+
+
+async def run_queries(engine: AsyncEngine) -> list[Statement]:
+    """Run the scheduler, pipeline and router queries, returns every statement they sent to SQLite."""
+    statements: list[Statement] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):  # type: ignore
+        if not executemany and statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH")):
+            statements.append(Statement(statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with sessions() as session:
+        await get_subscriptions_to_update(session)
+        await get_pending_videos(session)
+        await get_subscription_for_update(1, session)
+        await get_videos_for_subscription(1, VideoStatus.PENDING, session)
+        await plan_sync(session, 1, (await session.get(RetentionPolicy, 1)), [])
+        await apply_retention(session, subscription_id=1)
+        await apply_retention(session)
+        await due_retries(session, datetime.now())
+        await reevaluate_filters(session, 1, [Filter(filter_type=FilterType.TITLE_CONTAINS, keyword="video")])
+        await reevaluate_filters(
+            session, 1, [Filter(filter_type=FilterType.TITLE_CONTAINS, keyword="video")], use_search_index=True
+        )
+        await session.rollback()
+
+    download_engine = DownloadEngine(sessions)
+    await download_engine._claim(1)  # pylint: disable=protected-access
+    await download_engine.recover()
+
+    app = FastAPI()
+    app.include_router(subscription.router)
+    app.include_router(videos.router)
+
+    async def override_get_session() -> AsyncGenerator[AsyncSession, None]:
+        async with sessions() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+        page = await client.get("/subscription/1/videos", params={"limit": 10})
+        await client.get("/subscription/1/videos", params={"limit": 10, "cursor": page.headers["X-Next-Cursor"]})
+        await client.get("/subscription/1/videos", params={"limit": 10, "status": VideoStatus.DOWNLOADED.value})
+        await client.get("/subscription/summary")
+        await client.get("/subscription/1")
+        await client.get("/videos/search", params={"q": "video"})
+
+    event.remove(engine.sync_engine, "before_cursor_execute", record)
+    return statements
+
+
+async def query_plan(engine: AsyncEngine, statement: Statement) -> list[str]:
+    async with engine.connect() as conn:
+        plan = await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement.sql}", statement.parameters)
+        return [row[-1] for row in plan.all()]
+
+
+@pytest.mark.asyncio
+async def test_no_query_scans_a_large_table(engine: AsyncEngine) -> None:
+    statements = await run_queries(engine)
+    assert len(statements) > 20
+
+    full_scans = []
+    for statement in statements:
+        for detail in await query_plan(engine, statement):
+            table = scanned_table(detail)
+            if table is not None and table not in SMALL_TABLES:
+                full_scans.append(f"{detail}: {statement.sql}")
+
+    assert not full_scans, "\n".join(full_scans)
+
+
+@pytest.mark.asyncio
+async def test_video_pages_are_read_in_index_order(engine: AsyncEngine) -> None:
+    statements = await run_queries(engine)
+    pages = [
+        statement
+        for statement in statements
+        if statement.sql.startswith("SELECT") and "ORDER BY video.published DESC, video.id DESC" in statement.sql
+    ]
+    assert pages
+
+    for statement in pages:
+        assert "USE TEMP B-TREE FOR ORDER BY" not in await query_plan(engine, statement), statement.sql
@@ -0,0 +1,84 @@
+import asyncio
+import concurrent.futures
+import multiprocessing
+import random
+
+import pytest
+
+from app import rate_limit
+from app.rate_limit import RateLimiter, status_from_error
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_limiter(clock: FakeClock) -> RateLimiter:
+    return RateLimiter(requests_per_second=2, burst=2, min_requests_per_second=0.5, clock=clock, rng=random.Random(0))
+
+
+def test_reserve_spaces_requests_after_burst():
+    limiter = make_limiter(FakeClock())
+
+    delays = [limiter.reserve("www.youtube.com") for _ in range(4)]
+
+    assert delays[:2] == [0.0, 0.0]
+    assert 0.5 <= delays[2] <= 0.55
+    assert 1.0 <= delays[3] <= 1.1
+    assert limiter.reserve("example.com") == 0.0
+
+
+def test_throttled_response_backs_off_and_recovers():
+    clock = FakeClock()
+    limiter = make_limiter(clock)
+
+    limiter.report("www.youtube.com", 429, retry_after=30)
+    (rate,) = limiter.rates()
+    assert rate.requests_per_second == 1.0
+    assert rate.backoff_seconds == 30
+    assert rate.throttled_responses == 1
+    assert limiter.reserve("www.youtube.com") >= 30
+
+    limiter.report("www.youtube.com", 503)
+    assert limiter.rates()[0].requests_per_second == 0.5
+
+    clock.now = 60
+    for _ in range(20):
+        limiter.report("www.youtube.com", 200)
+    (rate,) = limiter.rates()
+    assert rate.requests_per_second == 2
+    assert rate.backoff_seconds == 0
+
+
+def test_status_from_error():
+    assert status_from_error("ERROR: unable to download video data: HTTP Error 429: Too Many Requests") == 429
+    assert status_from_error("ERROR: This video is unavailable") is None
+
+
+def throttled_in_worker(host: str) -> None:
+    rate_limit.get_rate_limiter().report(host, 429)
+
+
+@pytest.mark.asyncio
+async def test_limiter_is_shared_with_worker_processes():
+    limiter = await rate_limit.start_rate_limiter()
+    try:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=2,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=rate_limit.set_rate_limiter,
+            initargs=(rate_limit.shared_rate_limiter(),),
+        ) as executor:
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(
+                *(loop.run_in_executor(executor, throttled_in_worker, "shared.example.com") for _ in range(4))
+            )
+
+        (rate,) = [rate for rate in limiter.rates() if rate.host == "shared.example.com"]
+        assert rate.throttled_responses == 4
+    finally:
+        await rate_limit.stop_rate_limiter()
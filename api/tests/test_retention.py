@@ -0,0 +1,194 @@
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import pytest
+from pytz import utc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, select
+
+from app.models.subscription import (
+    RetentionPolicy,
+    RetentionType,
+    Video,
+    VideoStatus,
+)
+from app.retention import (
+    apply_retention,
+    delete_files,
+    delete_files_in_background,
+    wait_for_file_deletions,
+)
+from app.scheduler import sync_and_update_videos
+from tests.factories import subscription, video
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+async def add_subscription(
+    session: AsyncSession,
+    subscription_id: int,
+    policy: RetentionPolicy | None,
+    directory: Path,
+    statuses: list[VideoStatus],
+) -> None:
+    session.add(subscription(subscription_id))
+    if policy is not None:
+        policy.subscription_id = subscription_id
+        session.add(policy)
+    for day, status in enumerate(statuses):
+        # The first video is the newest
+        path = directory / f"{subscription_id}-{day}.mp4"
+        path.write_bytes(b"video")
+        session.add(
+            video(
+                f"{subscription_id}-{day}",
+                subscription_id,
+                status=status,
+                published=NOW - timedelta(days=day),
+                file_path=str(path),
+            )
+        )
+
+
+def policy(retention_type: RetentionType, **values) -> RetentionPolicy:  # type: ignore
+    defaults = {"videoCount": 0, "dateBefore": date(2000, 1, 1), "timeDeltaTypeValue": timedelta(0)}
+    return RetentionPolicy(type=retention_type, **(defaults | values))
+
+
+async def statuses(sessions: async_sessionmaker[AsyncSession]) -> dict[str, VideoStatus]:
+    async with sessions() as session:
+        result = await session.execute(select(Video.video_id, Video.status).order_by(col(Video.id)))
+        return dict(result.all())  # type: ignore
+
+
+@pytest.mark.asyncio
+async def test_every_policy_type_in_one_statement(sessions: async_sessionmaker[AsyncSession], tmp_path: Path) -> None:
+    downloaded = [VideoStatus.DOWNLOADED] * 4
+    async with sessions() as session:
+        await add_subscription(session, 1, policy(RetentionType.COUNT, videoCount=2), tmp_path, downloaded)
+        await add_subscription(
+            session, 2, policy(RetentionType.DATE_SINCE, dateBefore=date(2024, 5, 30)), tmp_path, downloaded
+        )
+        await add_subscription(
+            session, 3, policy(RetentionType.DELTA, timeDeltaTypeValue=timedelta(hours=36)), tmp_path, downloaded
+        )
+        await add_subscription(session, 4, None, tmp_path, downloaded)
+        await session.commit()
+
+        result = await apply_retention(session, now=NOW)
+        await session.commit()
+
+    expired = {"1-2", "1-3", "2-3", "3-2", "3-3"}
+    assert result.deleted == len(expired)
+    assert sorted(result.files) == sorted(str(tmp_path / f"{video_id}.mp4") for video_id in expired)
+    for video_id, status in (await statuses(sessions)).items():
+        assert status == (VideoStatus.DELETED if video_id in expired else VideoStatus.DOWNLOADED), video_id
+
+
+@pytest.mark.asyncio
+async def test_count_only_ranks_downloaded_videos(sessions: async_sessionmaker[AsyncSession], tmp_path: Path) -> None:
+    async with sessions() as session:
+        await add_subscription(
+            session,
+            1,
+            policy(RetentionType.COUNT, videoCount=1),
+            tmp_path,
+            [VideoStatus.PENDING_DOWNLOAD, VideoStatus.DOWNLOADED, VideoStatus.FILTERED, VideoStatus.DOWNLOADED],
+        )
+        await add_subscription(
+            session, 2, policy(RetentionType.COUNT, videoCount=1), tmp_path, [VideoStatus.DOWNLOADED] * 2
+        )
+        await session.commit()
+
+        result = await apply_retention(session, subscription_id=1, now=NOW)
+        await session.commit()
+
+    assert result.deleted == 1
+    assert await statuses(sessions) == {
+        "1-0": VideoStatus.PENDING_DOWNLOAD,
+        "1-1": VideoStatus.DOWNLOADED,
+        "1-2": VideoStatus.FILTERED,
+        "1-3": VideoStatus.DELETED,
+        # Another subscription's videos are left alone
+        "2-0": VideoStatus.DOWNLOADED,
+        "2-1": VideoStatus.DOWNLOADED,
+    }
+
+
+@pytest.mark.asyncio
+async def test_delete_files_is_bounded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    paths = [tmp_path / f"{i}.mp4" for i in range(10)]
+    for path in paths[:8]:
+        path.write_bytes(b"video")
+
+    in_flight = peak = 0
+    original = asyncio.to_thread
+
+    async def counting_to_thread(function, *args):  # type: ignore
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            await asyncio.sleep(0)
+            return await original(function, *args)
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr("app.retention.asyncio.to_thread", counting_to_thread)
+    # Two of the files are already gone
+    assert await delete_files([str(path) for path in paths], concurrency=3) == 8
+    assert peak == 3
+    assert not any(path.exists() for path in paths)
+
+
+@pytest.mark.asyncio
+async def test_sync_applies_retention_and_deletes_files(
+    sessions: async_sessionmaker[AsyncSession], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def mock_sync_subscription(subscription_id: int):  # pylint: disable=unused-argument
+        return {"message": "subscription synced"}
+
+    async def mock_metadata(urls: list[str]):  # type: ignore
+        return []
+
+    monkeypatch.setattr("app.scheduler.session_factory", sessions)
+    monkeypatch.setattr("app.scheduler.sync_subscription", mock_sync_subscription)
+    monkeypatch.setattr("app.scheduler.get_metadata", mock_metadata)
+
+    async with sessions() as session:
+        await add_subscription(
+            session, 1, policy(RetentionType.COUNT, videoCount=2), tmp_path, [VideoStatus.DOWNLOADED] * 3
+        )
+        await session.commit()
+
+    await sync_and_update_videos()
+    await wait_for_file_deletions()
+
+    assert (await statuses(sessions))["1-2"] == VideoStatus.DELETED
+    assert sorted(path.name for path in tmp_path.glob("*.mp4")) == ["1-0.mp4", "1-1.mp4"]
+
+
+@pytest.mark.asyncio
+async def test_no_background_task_without_files() -> None:
+    assert delete_files_in_background([]) is None
+
+
+@pytest.mark.asyncio
+async def test_delta_cutoff_is_taken_in_utc(sessions: async_sessionmaker[AsyncSession]) -> None:
+    # NOW on a server nine hours ahead of UTC, publish dates are stored in UTC
+    now = utc.localize(NOW).astimezone(timezone(timedelta(hours=9)))
+    async with sessions() as session:
+        session.add(subscription(1))
+        retention = policy(RetentionType.DELTA, timeDeltaTypeValue=timedelta(hours=8))
+        retention.subscription_id = 1
+        session.add(retention)
+        for hours in (5, 11):
+            session.add(video(str(hours), status=VideoStatus.DOWNLOADED, published=NOW - timedelta(hours=hours)))
+        await session.commit()
+
+        result = await apply_retention(session, now=now)
+        await session.commit()
+
+    assert result.deleted == 1
+    assert await statuses(sessions) == {"5": VideoStatus.DOWNLOADED, "11": VideoStatus.DELETED}
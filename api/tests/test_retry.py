@@ -0,0 +1,177 @@
+from datetime import datetime, timedelta
+
+import pytest
+from pytz import utc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, select
+
+from app.config import (
+    RETRY_BASE_DELAY_SECONDS,
+    RETRY_JITTER,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_MAX_DELAY_SECONDS,
+)
+from app.models.subscription import (
+    ComparisonOperator,
+    Filter,
+    FilterType,
+    Video,
+    VideoStatus,
+)
+from app.retry import fail_videos, next_attempt_at, retry_delay
+from app.scheduler import retry_failed_videos, update_video_status
+from app.sync_schedule import as_utc
+from app.yt_downloader import (
+    MetadataError,
+    MetadataErrorType,
+    MetadataSuccess,
+    VideoMetadata,
+)
+from tests.factories import subscription, video
+
+BASE_DELAY = timedelta(seconds=RETRY_BASE_DELAY_SECONDS)
+MAX_DELAY = timedelta(seconds=RETRY_MAX_DELAY_SECONDS)
+
+
+def metadata(url: str) -> MetadataSuccess:
+    return MetadataSuccess(
+        url=url,
+        metadata=VideoMetadata(
+            id=url,
+            title="Title",
+            uploader="Uploader",
+            upload_date=datetime(2024, 1, 1),
+            duration_in_seconds=300,
+            description="",
+            thumbnail_url="http://example.com/thumbnail.jpg",
+        ),
+    )
+
+
+def test_backoff_doubles_up_to_the_maximum(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr("app.retry.RETRY_JITTER", 0)
+    assert retry_delay(1) == BASE_DELAY
+    assert retry_delay(2) == BASE_DELAY * 2
+    assert retry_delay(3) == BASE_DELAY * 4
+    assert retry_delay(100) == MAX_DELAY
+
+    now = datetime(2024, 6, 1, tzinfo=utc)
+    assert next_attempt_at(1, now) == now + BASE_DELAY
+    assert next_attempt_at(RETRY_MAX_ATTEMPTS, now) is None
+
+
+def test_backoff_is_jittered() -> None:
+    delays = {retry_delay(1) for _ in range(20)}
+    assert len(delays) > 1
+    assert all(BASE_DELAY * (1 - RETRY_JITTER) <= delay <= BASE_DELAY * (1 + RETRY_JITTER) for delay in delays)
+
+
+def test_metadata_failures_give_up_after_the_last_attempt() -> None:
+    error = MetadataError("https://www.youtube.com/watch?v=1", MetadataErrorType.UNKNOWN_ERROR, "HTTP Error 503")
+
+    retried = update_video_status(video("1", 1, status=VideoStatus.PENDING), error)
+    assert retried.status == VideoStatus.FAILED
+    assert retried.retry_count == 1
+    assert retried.next_attempt_at is not None
+
+    exhausted = update_video_status(video("2", 1, status=VideoStatus.FAILED, retry_count=RETRY_MAX_ATTEMPTS - 1), error)
+    assert exhausted.status == VideoStatus.FAILED
+    assert exhausted.retry_count == RETRY_MAX_ATTEMPTS
+    assert exhausted.next_attempt_at is None
+
+
+@pytest.mark.asyncio
+async def test_fail_videos_schedules_retries(sessions: async_sessionmaker[AsyncSession]) -> None:
+    now = datetime.now(utc)
+    async with sessions() as session:
+        session.add_all(
+            [
+                video("1", 1, status=VideoStatus.DOWNLOADING),
+                video("2", 1, status=VideoStatus.DOWNLOADING, retry_count=RETRY_MAX_ATTEMPTS - 1),
+            ]
+        )
+        await session.commit()
+        await fail_videos(session, [1, 2], now)
+        await session.commit()
+
+        rows = (await session.execute(select(Video).order_by(col(Video.id)))).scalars().all()
+        assert [(row.status, row.retry_count) for row in rows] == [
+            (VideoStatus.FAILED, 1),
+            (VideoStatus.FAILED, RETRY_MAX_ATTEMPTS),
+        ]
+        assert now < as_utc(rows[0].next_attempt_at) <= now + BASE_DELAY * (1 + RETRY_JITTER)  # type: ignore
+        assert rows[1].next_attempt_at is None
+
+
+@pytest.mark.asyncio
+async def test_sweep_retries_every_subscription_in_one_batch(
+    sessions: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    batches: list[list[str]] = []
+
+    async def mock_metadata(urls: list[str]):  # type: ignore
+        batches.append(urls)
+        return [
+            metadata(url) if "recovers" in url else MetadataError(url, MetadataErrorType.UNKNOWN_ERROR, "503")
+            for url in urls
+        ]
+
+    woken: list[bool] = []
+    monkeypatch.setattr("app.scheduler.session_factory", sessions)
+    monkeypatch.setattr("app.scheduler.get_metadata", mock_metadata)
+    monkeypatch.setattr("app.scheduler.wake_download_engine", lambda: woken.append(True))
+
+    now = datetime.now(utc)
+    due, later = now - timedelta(minutes=1), now + timedelta(hours=1)
+    async with sessions() as session:
+        session.add_all([subscription(1), subscription(2)])
+        # Subscription 2 only keeps videos up to a minute long
+        session.add(
+            Filter(
+                subscription_id=2,
+                filter_type=FilterType.DURATION,
+                comparison_operator=ComparisonOperator.GT,
+                threshold_seconds=60,
+            )
+        )
+        session.add_all(
+            [
+                video("recovers", 1, status=VideoStatus.FAILED, retry_count=1, next_attempt_at=due),
+                video("recovers-filtered", 2, status=VideoStatus.FAILED, retry_count=1, next_attempt_at=due),
+                video("fails-again", 2, status=VideoStatus.FAILED, retry_count=1, next_attempt_at=due),
+                video("download", 1, status=VideoStatus.FAILED, retry_count=1, duration=300, next_attempt_at=due),
+                video("not-due", 2, status=VideoStatus.FAILED, retry_count=1, next_attempt_at=later),
+                video("gave-up", 2, status=VideoStatus.FAILED, retry_count=RETRY_MAX_ATTEMPTS),
+            ]
+        )
+        await session.commit()
+
+    result = await retry_failed_videos()
+
+    assert sorted(batches[0]) == [
+        "https://www.youtube.com/watch?v=fails-again",
+        "https://www.youtube.com/watch?v=recovers",
+        "https://www.youtube.com/watch?v=recovers-filtered",
+    ]
+    assert len(batches) == 1
+    assert (result.downloads, result.recovered, result.failed) == (2, 2, 1)
+    assert woken
+
+    async with sessions() as session:
+        videos = {row.video_id: row for row in (await session.execute(select(Video))).scalars().all()}
+    # Recovered metadata goes through the subscription's filters like a sync
+    assert videos["recovers"].status == VideoStatus.PENDING_DOWNLOAD
+    assert videos["recovers"].next_attempt_at is None
+    assert videos["recovers-filtered"].status == VideoStatus.FILTERED
+    assert videos["download"].status == VideoStatus.PENDING_DOWNLOAD
+    assert videos["download"].next_attempt_at is None
+    assert videos["fails-again"].status == VideoStatus.FAILED
+    assert videos["fails-again"].retry_count == 2
+    assert as_utc(videos["fails-again"].next_attempt_at) > now + BASE_DELAY  # type: ignore
+    assert videos["not-due"].retry_count == 1
+    assert videos["gave-up"].status == VideoStatus.FAILED
+
+    # Nothing is due until the backoff passes
+    batches.clear()
+    assert await retry_failed_videos() == type(result)()
+    assert not batches
@@ -1,5 +1,7 @@
+import asyncio
 from collections.abc import AsyncGenerator
 from datetime import datetime, timedelta
+from pathlib import Path
 
 import pytest
 from pytz import utc
@@ -120,8 +122,11 @@ async def async_session_factory() -> AsyncGenerator[AsyncSession, None]:
     await engine.dispose()
 
 
-async def mock_get_session(session):  # type:ignore
-    yield session
+def use_database(monkeypatch: pytest.MonkeyPatch, session: AsyncSession) -> None:
+    # The scheduler's units of work and the feed sync open their own sessions on the test's in-memory database
+    sessions = async_sessionmaker(session.bind, class_=AsyncSession, expire_on_commit=False)
+    monkeypatch.setattr("app.scheduler.session_factory", sessions)
+    monkeypatch.setattr("app.routers.subscription.session_factory", sessions)
 
 
 @pytest.mark.asyncio
@@ -132,7 +137,7 @@ async def test_obtained_metadata(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         monkeypatch.setattr("app.scheduler.get_metadata", mock_success_metadata)
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type:ignore
+        use_database(monkeypatch, session)
 
         subscription = create_subscription()
 
@@ -152,13 +157,13 @@ async def test_obtained_metadata(
         await session.commit()
 
         await sync_and_update_videos()
+        session.expire_all()
 
         result = await session.execute(select(Video).where(Video.id == 1))
         updated_video = result.scalars().first()
 
         assert updated_video is not None
-        # TODO: This is being set to obtained metadata, but it should be pending download
-        assert updated_video.status == VideoStatus.OBTAINED_METADATA
+        assert updated_video.status == VideoStatus.PENDING_DOWNLOAD
         assert updated_video.duration == 300
         assert updated_video.thumbnail_url == "http://example.com/test_thumbnail.jpg"
 
@@ -171,7 +176,7 @@ async def test_live_event_not_started(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         monkeypatch.setattr("app.scheduler.get_metadata", mock_live_event_metadata)
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type:ignore
+        use_database(monkeypatch, session)
 
         subscription = create_subscription()
         video = Video(
@@ -190,6 +195,7 @@ async def test_live_event_not_started(
         await session.commit()
 
         await sync_and_update_videos()
+        session.expire_all()
 
         result = await session.execute(select(Video).where(Video.id == 1))
         updated_video = result.scalars().first()
@@ -207,7 +213,7 @@ async def test_video_unavailable(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         monkeypatch.setattr("app.scheduler.get_metadata", mock_unavailable_metadata)
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type: ignore
+        use_database(monkeypatch, session)
 
         subscription = create_subscription()
         session.add(subscription)
@@ -228,6 +234,7 @@ async def test_video_unavailable(
         await session.commit()
 
         await sync_and_update_videos()
+        session.expire_all()
 
         result = await session.execute(select(Video).where(Video.id == 1))
         updated_video = result.scalars().first()
@@ -244,7 +251,7 @@ async def test_new_subscription_is_picked_up(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         monkeypatch.setattr("app.scheduler.get_metadata", mock_success_video_data)
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type: ignore
+        use_database(monkeypatch, session)
 
         subscription = create_subscription()
         session.add(subscription)
@@ -268,7 +275,7 @@ async def test_existing_subscription_is_picked_up(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         monkeypatch.setattr("app.scheduler.get_metadata", mock_unavailable_metadata)
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type: ignore
+        use_database(monkeypatch, session)
 
         past_date: datetime = datetime.now(utc) - timedelta(minutes=SUBSCRIPTION_UPDATE_INTERVAL + 1)
 
@@ -296,7 +303,7 @@ async def test_get_subscriptions_to_update(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         monkeypatch.setattr("app.scheduler.get_metadata", mock_unavailable_metadata)
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type: ignore
+        use_database(monkeypatch, session)
         new_subscription = create_subscription(id=1, url="http://example.com/new", title="New Subscription")
 
         recent_subscription = create_subscription(id=2, url="http://example.com/recent", title="Recent Subscription")
@@ -326,7 +333,6 @@ async def test_get_pending_videos(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         monkeypatch.setattr("app.scheduler.get_metadata", mock_success_video_data)
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type: ignore
 
         subscription = create_subscription()
         session.add(subscription)
@@ -375,7 +381,12 @@ async def test_video_filters(
     async_session = await anext(async_session_factory)
     async with async_session as session:
         video_duration: int = 1800
-        monkeypatch.setattr("app.scheduler.get_session", lambda: mock_get_session(session))  # type: ignore
+
+        async def mock_metadata(urls: list[str]) -> list[MetadataResult]:
+            return await mock_success_video_data(duration=video_duration * 2)
+
+        monkeypatch.setattr("app.scheduler.get_metadata", mock_metadata)
+        use_database(monkeypatch, session)
 
         subscription = create_subscription()
         session.add(subscription)
@@ -393,28 +404,28 @@ async def test_video_filters(
         video = Video(
             subscription_id=subscription.id,
             status=VideoStatus.PENDING,
-            link="http://example.com/unavailable",
+            link="http://example.com/video",
             author="Test Author",
             description="Test description",
             published=datetime(2023, 1, 1),
             thumbnail_url="http://example.com/thumbnail.jpg",
             title="Test Video",
             video_id="test_video_id",
-            duration=video_duration,
         )
 
         session.add(video)
         await session.commit()
 
-        videos_to_update = await get_pending_videos(session)
-        assert isinstance(videos_to_update, list)
-        assert isinstance(videos_to_update[0], Video)
-        assert (
-            len(
-                videos_to_update,
-            )
-            == 1
-        )
+        await sync_and_update_videos()
+        session.expire_all()
+
+        result = await session.execute(select(Video).where(Video.id == 1))
+        updated_video = result.scalars().first()
+
+        # The duration is only known once the metadata is fetched, the filter then keeps it out of the queue
+        assert updated_video is not None
+        assert updated_video.duration == video_duration * 2
+        assert updated_video.status == VideoStatus.FILTERED
 
 
 @pytest.mark.asyncio
@@ -483,3 +494,74 @@ async def test_new_subscription_v2(
         assert subscriptions_to_be_updated[0].rss_feed_url == "http://example.com/rss"
         assert subscriptions_to_be_updated[0].description == "Test Description"
         assert subscriptions_to_be_updated[0].image == "http://example.com/image.jpg"
+
+
+@pytest.mark.asyncio
+async def test_failing_subscription_does_not_roll_back_others(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def mock_sync_subscription(subscription_id: int):  # pylint: disable=unused-argument
+        return {"message": "subscription synced"}
+
+    async def mock_metadata(urls: list[str]) -> list[MetadataResult]:
+        if "bad" in urls[0]:
+            raise RuntimeError("yt-dlp exploded")
+        return await mock_success_metadata(urls)
+
+    monkeypatch.setattr("app.scheduler.session_factory", async_session_maker)
+    monkeypatch.setattr("app.scheduler.sync_subscription", mock_sync_subscription)
+    monkeypatch.setattr("app.scheduler.get_metadata", mock_metadata)
+
+    async with async_session_maker() as session:
+        for subscription_id, name in ((1, "bad"), (2, "good")):
+            session.add(create_subscription(id=subscription_id, url=f"http://example.com/{name}"))
+            session.add(
+                Video(
+                    subscription_id=subscription_id,
+                    status=VideoStatus.PENDING,
+                    link=f"http://example.com/{name}/video",
+                    author="Test Author",
+                    description="Test description",
+                    published=datetime(2023, 1, 1),
+                    title="Test Video",
+                    video_id=f"{name}_video_id",
+                )
+            )
+        await session.commit()
+
+    await sync_and_update_videos()
+
+    async with async_session_maker() as session:
+        videos = {video.video_id: video for video in (await session.execute(select(Video))).scalars().all()}
+
+    assert videos["bad_video_id"].status == VideoStatus.PENDING
+    assert videos["good_video_id"].status == VideoStatus.PENDING_DOWNLOAD
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_sync_concurrency_is_bounded(monkeypatch: pytest.MonkeyPatch):
+    in_flight = 0
+    peak = 0
+
+    async def mock_process_subscription(subscription_id: int) -> None:  # pylint: disable=unused-argument
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+
+    async def mock_get_subscriptions_to_update(session: AsyncSession) -> list[Subscription]:  # pylint: disable=W0613
+        return [create_subscription(id=i) for i in range(1, 11)]
+
+    monkeypatch.setattr("app.scheduler.SYNC_CONCURRENCY", 3)
+    monkeypatch.setattr("app.scheduler.session_factory", async_sessionmaker())
+    monkeypatch.setattr("app.scheduler.get_subscriptions_to_update", mock_get_subscriptions_to_update)
+    monkeypatch.setattr("app.scheduler.process_subscription", mock_process_subscription)
+
+    await sync_and_update_videos()
+
+    assert peak == 3
@@ -0,0 +1,114 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, select
+
+from app.filters import reevaluate_filters
+from app.models.subscription import Filter, FilterType, Video, VideoStatus
+from app.search import ensure_search_index, search_query, search_videos
+from tests.factories import subscription, video
+
+VIDEOS = [
+    (1, "Rust for beginners", "An introduction"),
+    (1, "Cooking pasta", "Why rust belongs nowhere near a kitchen"),
+    (1, "Garden tour", "Flowers and vegetables"),
+    (2, "Rusty bikes restored", "Restoration from start to finish"),
+]
+
+
+@pytest_asyncio.fixture(scope="function")
+async def sessions(sessions: async_sessionmaker[AsyncSession]) -> async_sessionmaker[AsyncSession]:
+    async with sessions() as session:
+        session.add_all([subscription(1), subscription(2)])
+        for i, (subscription_id, title, description) in enumerate(VIDEOS):
+            session.add(
+                video(
+                    str(i),
+                    subscription_id,
+                    status=VideoStatus.PENDING_DOWNLOAD,
+                    description=description,
+                    published=None,
+                    title=title,
+                )
+            )
+        await session.commit()
+    return sessions
+
+
+def test_search_query() -> None:
+    assert search_query("rust  Pasta") == '"rust" AND "Pasta"'
+    # Quotes and operators are matched literally
+    assert search_query('"hi" NOT') == '"""hi""" AND "NOT"'
+    assert search_query("a of") is None
+
+
+@pytest.mark.asyncio
+async def test_title_matches_rank_first(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        results = await search_videos(session, "rust", 10)
+
+    assert [result.title for result in results][:2] == ["Rust for beginners", "Rusty bikes restored"]
+    assert results[-1].title == "Cooking pasta"
+    assert results[0].title_highlight == "<b>Rust</b> for beginners"
+    assert "<b>rust</b>" in (results[-1].description_snippet or "")
+
+
+@pytest.mark.asyncio
+async def test_search_within_subscription(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        results = await search_videos(session, "rust", 10, subscription_id=2)
+        short = await search_videos(session, "ru", 10)
+
+    assert [result.title for result in results] == ["Rusty bikes restored"]
+    assert short == []
+
+
+@pytest.mark.asyncio
+async def test_index_follows_updates_and_deletes(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        await session.execute(update(Video).where(col(Video.title) == "Garden tour").values(title="Rust in the garden"))
+        await session.execute(delete(Video).where(col(Video.title) == "Cooking pasta"))
+        await session.commit()
+
+        titles = {result.title for result in await search_videos(session, "rust", 10)}
+        garden = await search_videos(session, "garden", 10)
+
+    assert titles == {"Rust for beginners", "Rusty bikes restored", "Rust in the garden"}
+    assert [result.title for result in garden] == ["Rust in the garden"]
+
+
+@pytest.mark.asyncio
+async def test_ensure_search_index_rebuilds_missing_index(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        connection = await session.connection()
+        assert not await connection.run_sync(ensure_search_index)
+
+        for name in ("video_fts_insert", "video_fts_delete", "video_fts_update"):
+            await session.execute(text(f"DROP TRIGGER {name}"))
+        await session.execute(text("DROP TABLE video_fts"))
+        assert await connection.run_sync(ensure_search_index)
+        await session.commit()
+
+        results = await search_videos(session, "flowers", 10)
+
+    assert [result.title for result in results] == ["Garden tour"]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("keyword", ["rust", "RUST", "ru", "pasta"])
+async def test_reevaluate_filters_with_search_index(sessions: async_sessionmaker[AsyncSession], keyword: str) -> None:
+    filters = [
+        Filter(subscription_id=1, filter_type=FilterType.DESCRIPTION_CONTAINS, keyword=keyword),
+        Filter(subscription_id=1, filter_type=FilterType.TITLE_CONTAINS, keyword=keyword),
+    ]
+    statuses = []
+    for use_search_index in (False, True):
+        async with sessions() as session:
+            for f in filters:
+                await reevaluate_filters(session, 1, [f], use_search_index=use_search_index)
+                result = await session.execute(select(Video.title, Video.status).order_by(col(Video.id)))
+                statuses.append(result.all())
+            await session.rollback()
+
+    assert statuses[:2] == statuses[2:]
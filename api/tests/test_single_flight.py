@@ -0,0 +1,125 @@
+import asyncio
+from typing import Any
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app import scheduler
+from app.routers import subscription as subscription_router
+from app.single_flight import SingleFlight, single_flight_stats
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_one_run() -> None:
+    flight: SingleFlight[int, str] = SingleFlight("test share")
+    calls = 0
+    release = asyncio.Event()
+
+    async def work() -> str:
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "synced"
+
+    callers = [asyncio.create_task(flight.run(1, work)) for _ in range(5)]
+    await asyncio.sleep(0)
+    assert flight.in_flight(1)
+    release.set()
+
+    assert await asyncio.gather(*callers) == ["synced"] * 5
+    assert calls == 1
+    assert not flight.in_flight(1)
+    stats = flight.stats()
+    assert (stats.started, stats.coalesced, stats.failed, stats.in_flight) == (1, 4, 0, 0)
+
+
+@pytest.mark.asyncio
+async def test_keys_run_independently() -> None:
+    flight: SingleFlight[int, int] = SingleFlight("test keys")
+
+    async def work(key: int) -> int:
+        await asyncio.sleep(0)
+        return key
+
+    assert await asyncio.gather(flight.run(1, lambda: work(1)), flight.run(2, lambda: work(2))) == [1, 2]
+    assert flight.stats().started == 2
+
+
+@pytest.mark.asyncio
+async def test_failures_reach_every_caller_and_are_not_cached() -> None:
+    flight: SingleFlight[int, str] = SingleFlight("test failure")
+    attempts = 0
+
+    async def work() -> str:
+        nonlocal attempts
+        attempts += 1
+        await asyncio.sleep(0)
+        if attempts == 1:
+            raise ValueError("feed unavailable")
+        return "synced"
+
+    results = await asyncio.gather(flight.run(1, work), flight.run(1, work), return_exceptions=True)
+    assert [type(result) for result in results] == [ValueError, ValueError]
+
+    assert await flight.run(1, work) == "synced"
+    assert flight.stats().failed == 1
+    assert flight.stats().started == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_the_run() -> None:
+    flight: SingleFlight[int, str] = SingleFlight("test cancel")
+    release = asyncio.Event()
+
+    async def work() -> str:
+        await release.wait()
+        return "synced"
+
+    first = asyncio.create_task(flight.run(1, work))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(flight.run(1, work))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    release.set()
+    assert await second == "synced"
+
+
+@pytest.mark.asyncio
+async def test_route_and_scheduler_share_a_feed_sync(monkeypatch: pytest.MonkeyPatch) -> None:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    monkeypatch.setattr("app.routers.subscription.session_factory", async_sessionmaker(engine, class_=AsyncSession))
+    release = asyncio.Event()
+    sessions: list[AsyncSession] = []
+
+    async def sync_feed(subscription_id: int, session: AsyncSession) -> dict[str, Any]:
+        sessions.append(session)
+        await release.wait()
+        # Still usable after the caller that started the flight went away
+        await session.execute(text("SELECT 1"))
+        return {"message": "subscription synced", "new": 1, "unchanged": 0}
+
+    before = subscription_router.feed_syncs.stats()
+    monkeypatch.setattr(subscription_router, "sync_feed", sync_feed)
+    # The scheduler calls the route's function, a manual sync joins the one it started
+    scheduled = asyncio.create_task(scheduler.sync_subscription(7))
+    await asyncio.sleep(0)
+    manual = asyncio.create_task(subscription_router.sync_subscription(7))
+    await asyncio.sleep(0)
+
+    scheduled.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await scheduled
+    release.set()
+    assert await manual == {"message": "subscription synced", "new": 1, "unchanged": 0}
+
+    # One fetch, in a session the flight opened for itself
+    assert len(sessions) == 1
+    after = subscription_router.feed_syncs.stats()
+    assert after.started - before.started == 1
+    assert after.coalesced - before.coalesced == 1
+    assert "subscription feed sync" in {stats.name for stats in single_flight_stats()}
+    await engine.dispose()
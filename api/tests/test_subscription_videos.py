@@ -0,0 +1,158 @@
+from collections.abc import AsyncGenerator
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlmodel import SQLModel
+
+from app.database.session import get_session
+from app.models.subscription import Subscription, Video, VideoStatus
+from app.routers import images
+from app.routers.subscription import router
+
+PNG_DIGEST = "ab" * 32
+
+
+@pytest_asyncio.fixture(scope="function")
+async def client(tmp_path: Path) -> AsyncGenerator[AsyncClient, None]:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'engawa.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with sessions() as session:
+        session.add(
+            Subscription(
+                id=1,
+                title="Test",
+                url="http://example.com",
+                description="Test",
+                rss_feed_url="http://example.com/rss",
+                image_hash=PNG_DIGEST,
+            )
+        )
+        session.add(
+            Subscription(
+                id=2, title="Empty", url="http://example.org", description="", rss_feed_url="http://example.org/rss"
+            )
+        )
+        published = datetime(2024, 1, 1)
+        for i in range(5):
+            session.add(
+                Video(
+                    subscription_id=1,
+                    status=VideoStatus.DOWNLOADED if i % 2 else VideoStatus.PENDING,
+                    link=f"https://www.youtube.com/watch?v={i}",
+                    author="Test Author",
+                    description="Test description",
+                    # Two videos share a publish date and one has none, both have to page correctly
+                    published=None if i == 0 else published + timedelta(days=min(i, 3)),
+                    title=f"Video {i}",
+                    video_id=str(i),
+                )
+            )
+        await session.commit()
+
+    async def override_get_session() -> AsyncGenerator[AsyncSession, None]:
+        async with sessions() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router)
+    app.include_router(images.router)
+    app.dependency_overrides[get_session] = override_get_session
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as test_client:
+        yield test_client
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pages_through_videos_newest_first(client: AsyncClient):
+    titles: list[str] = []
+    response = await client.get("/subscription/1/videos", params={"limit": 2})
+    assert response.headers["X-Total-Count"] == "5"
+    assert response.headers["X-Total-Count-Capped"] == "false"
+
+    while True:
+        assert response.status_code == 200
+        titles += [video["title"] for video in response.json()]
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+        response = await client.get("/subscription/1/videos", params={"limit": 2, "cursor": cursor})
+
+    assert titles == ["Video 4", "Video 3", "Video 2", "Video 1", "Video 0"]
+
+
+@pytest.mark.asyncio
+async def test_pages_by_the_default_size_without_a_limit(client: AsyncClient, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr("app.routers.subscription.DEFAULT_PAGE_SIZE", 2)
+
+    first = await client.get("/subscription/1/videos")
+    assert [video["title"] for video in first.json()] == ["Video 4", "Video 3"]
+    second = await client.get("/subscription/1/videos", params={"cursor": first.headers["X-Next-Cursor"]})
+    assert [video["title"] for video in second.json()] == ["Video 2", "Video 1"]
+    assert "X-Next-Cursor" in second.headers
+
+    # No request loads more than the maximum page size
+    assert (await client.get("/subscription/1/videos", params={"limit": 1001})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_filters_by_status_and_projects_fields(client: AsyncClient):
+    response = await client.get(
+        "/subscription/1/videos", params={"status": "Downloaded", "fields": "title,status,thumbnail_url"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {"id": 4, "title": "Video 3", "status": "Downloaded", "thumbnail_url": None},
+        {"id": 2, "title": "Video 1", "status": "Downloaded", "thumbnail_url": None},
+    ]
+    assert response.headers["X-Total-Count"] == "2"
+
+
+@pytest.mark.asyncio
+async def test_rejects_unknown_fields_and_cursors(client: AsyncClient):
+    assert (await client.get("/subscription/1/videos", params={"fields": "title,secret"})).status_code == 400
+    assert (await client.get("/subscription/1/videos", params={"cursor": "not a cursor"})).status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_summary_counts_videos_without_loading_them(client: AsyncClient):
+    response = await client.get("/subscription/summary")
+
+    assert response.status_code == 200
+    assert response.json() == [
+        {
+            "id": 1,
+            "title": "Test",
+            "last_updated": None,
+            "video_counts": {"Pending": 3, "Downloaded": 2},
+            "image_url": f"/images/{PNG_DIGEST}",
+        },
+        {"id": 2, "title": "Empty", "last_updated": None, "video_counts": {}, "image_url": None},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_deleting_a_subscription_still_deletes_its_videos(client: AsyncClient):
+    assert (await client.delete("/subscription/1")).status_code == 200
+
+    response = await client.get("/subscription/1/videos")
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_replace_filters(client: AsyncClient):
+    body = [{"filter_type": "title_contains", "keyword": "video"}]
+
+    response = await client.put("/subscription/1/filters", json=body)
+
+    assert response.status_code == 200
+    assert response.json() == {"message": "filters updated", "pending_download": 0, "filtered": 0}
+    assert (await client.put("/subscription/99/filters", json=body)).status_code == 404
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from typing import Any
+
+import pytest
+from pytz import utc
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlmodel import col, select
+
+from app.config import SYNC_MAX_INTERVAL_SECONDS, SYNC_MIN_INTERVAL_SECONDS
+from app.models.subscription import Subscription, VideoStatus
+from app.scheduler import (
+    SYNC_JOB_ID,
+    get_subscriptions_to_update,
+    sync_and_update_videos,
+)
+from app.sync_schedule import as_utc, next_due_at, sync_interval, with_jitter
+from tests.factories import subscription, video
+
+NOW = datetime(2024, 6, 1, 12, 0, tzinfo=utc)
+MIN_INTERVAL = timedelta(seconds=SYNC_MIN_INTERVAL_SECONDS)
+MAX_INTERVAL = timedelta(seconds=SYNC_MAX_INTERVAL_SECONDS)
+
+
+def uploads(every: timedelta, count: int = 10, latest: datetime = NOW) -> list[datetime]:
+    return [latest - every * i for i in range(count)]
+
+
+def test_interval_follows_upload_frequency() -> None:
+    assert sync_interval([], NOW) == MAX_INTERVAL
+    assert sync_interval(uploads(timedelta(minutes=30)), NOW) == MIN_INTERVAL
+    # Ten daily uploads, the last one a day ago, polled eight times a day
+    daily = uploads(timedelta(days=1), latest=NOW - timedelta(days=1))
+    assert sync_interval(daily, NOW) == timedelta(hours=3)
+    # The same channel slows down the longer it goes without uploads
+    month = sync_interval(uploads(timedelta(days=1), latest=NOW - timedelta(days=30)), NOW)
+    assert timedelta(hours=3) < month < MAX_INTERVAL
+    assert sync_interval(uploads(timedelta(days=1), latest=NOW - timedelta(days=90)), NOW) == MAX_INTERVAL
+    # Feed dates come back from SQLite without a timezone
+    assert sync_interval([published.replace(tzinfo=None) for published in daily], NOW) == timedelta(hours=3)
+
+
+def test_jitter_spreads_intervals() -> None:
+    intervals = {with_jitter(timedelta(hours=1), 0.2) for _ in range(100)}
+    assert len(intervals) > 90
+    assert all(timedelta(minutes=48) <= interval <= timedelta(minutes=72) for interval in intervals)
+
+
+@pytest.mark.asyncio
+async def test_due_subscriptions(sessions: async_sessionmaker[AsyncSession]) -> None:
+    now = datetime.now(utc)
+    async with sessions() as session:
+        session.add_all(
+            [
+                subscription(1, next_sync_at=now - timedelta(minutes=1)),
+                # Synced long ago but scheduled for later, not due
+                subscription(2, next_sync_at=now + timedelta(hours=1), last_updated=now - timedelta(days=1)),
+                # Not scheduled yet, the old 15 minute rule applies
+                subscription(3, last_updated=now - timedelta(minutes=20)),
+                subscription(4, last_updated=now - timedelta(minutes=5)),
+                subscription(5),
+            ]
+        )
+        await session.commit()
+
+        due = await get_subscriptions_to_update(session)
+
+    # Never synced first, then the longest overdue
+    assert [s.id for s in due] == [5, 3, 1]
+
+
+@pytest.mark.asyncio
+async def test_next_due_at(sessions: async_sessionmaker[AsyncSession]) -> None:
+    async with sessions() as session:
+        assert await next_due_at(session) is None
+
+        session.add_all([subscription(1, next_sync_at=NOW + timedelta(hours=2)), subscription(2, next_sync_at=NOW)])
+        await session.commit()
+        assert await next_due_at(session) == NOW
+
+        session.add(subscription(3, last_updated=NOW - timedelta(hours=1)))
+        await session.commit()
+        assert await next_due_at(session) == NOW - timedelta(minutes=45)
+
+        session.add(subscription(4))
+        await session.commit()
+        assert await next_due_at(session) == datetime.min.replace(tzinfo=utc)
+
+
+class RecordingScheduler:
+    running = True
+
+    def __init__(self) -> None:
+        self.next_run_times: list[datetime] = []
+
+    def modify_job(self, job_id: str, next_run_time: datetime) -> None:
+        assert job_id == SYNC_JOB_ID
+        self.next_run_times.append(next_run_time)
+
+    def add_job(self, *args: Any, **kwargs: Any) -> None:
+        pass
+
+
+@pytest.mark.asyncio
+async def test_sync_schedules_each_subscription(
+    sessions: async_sessionmaker[AsyncSession], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    async def mock_sync_subscription(subscription_id: int):  # pylint: disable=unused-argument
+        if subscription_id == 2:
+            raise RuntimeError("feed unavailable")
+        return {"message": "subscription synced"}
+
+    async def mock_metadata(urls: list[str]):  # type: ignore
+        return []
+
+    recording = RecordingScheduler()
+    monkeypatch.setattr("app.scheduler.session_factory", sessions)
+    monkeypatch.setattr("app.scheduler.sync_subscription", mock_sync_subscription)
+    monkeypatch.setattr("app.scheduler.get_metadata", mock_metadata)
+    monkeypatch.setattr("app.scheduler.scheduler", recording)
+
+    now = datetime.now(utc)
+    async with sessions() as session:
+        session.add_all([subscription(1), subscription(2)])
+        for i, published in enumerate(uploads(timedelta(days=1), latest=now - timedelta(days=1))):
+            session.add(video(str(i), status=VideoStatus.DOWNLOADED, published=published))
+        await session.commit()
+
+    await sync_and_update_videos()
+
+    async with sessions() as session:
+        scheduled = dict(
+            (await session.execute(select(Subscription.id, Subscription.next_sync_at).order_by(col(Subscription.id))))
+            .tuples()
+            .all()
+        )
+    # Daily uploads are polled about every three hours
+    assert timedelta(hours=2.4) <= as_utc(scheduled[1]) - now <= timedelta(hours=3.6, seconds=5)
+    # The failing subscription is retried after the shortest interval
+    assert MIN_INTERVAL * 0.8 <= as_utc(scheduled[2]) - now <= MIN_INTERVAL * 1.2 + timedelta(seconds=5)
+    # The job sleeps until the failing subscription is due, but no longer than the fallback interval
+    assert len(recording.next_run_times) == 1
+    assert recording.next_run_times[0] <= now + timedelta(seconds=65)
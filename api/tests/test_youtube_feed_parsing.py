@@ -2,11 +2,12 @@ import json
 import os
 from datetime import datetime
 
+import httpx
 import pytest
-import requests
 from result import Err, Ok
 
-from app.models.subscription import VideoStatus
+from app import http_client
+from app.models.subscription import RssFeedCache, VideoStatus
 from app.routers import youtube
 
 
@@ -16,8 +17,9 @@ def mock_make_request(url: str, timeout: int) -> str:  # pylint: disable=W0613
         return file.read()
 
 
-def test_fetch_videos_from_rss_feed() -> None:
-    result = youtube.fetch_videos_from_rss_feed("http://test.com", request_maker=mock_make_request)
+@pytest.mark.asyncio
+async def test_fetch_videos_from_rss_feed() -> None:
+    result = await youtube.fetch_videos_from_rss_feed("http://test.com", request_maker=mock_make_request)
 
     match result:
         case Ok(videos):
@@ -39,14 +41,15 @@ def test_fetch_videos_from_rss_feed() -> None:
             pytest.fail(f"Expected Ok result, but got Err: {error}")
 
 
-def test_fetch_videos_from_empty_rss_feed() -> None:
+@pytest.mark.asyncio
+async def test_fetch_videos_from_empty_rss_feed() -> None:
     def mock_empty_feed(url: str, timeout: int) -> str:  # pylint: disable=W0613
         return """<?xml version="1.0" encoding="UTF-8"?>
         <feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">
         </feed>
         """
 
-    result = youtube.fetch_videos_from_rss_feed("http://test.com", request_maker=mock_empty_feed)
+    result = await youtube.fetch_videos_from_rss_feed("http://test.com", request_maker=mock_empty_feed)
 
     match result:
         case Ok(videos):
@@ -57,11 +60,12 @@ def test_fetch_videos_from_empty_rss_feed() -> None:
             assert error.message == "No entries found in the RSS feed"
 
 
-def test_fetch_videos_network_error() -> None:
+@pytest.mark.asyncio
+async def test_fetch_videos_network_error() -> None:
     def mock_network_error(url: str, timeout: int) -> str:
-        raise requests.RequestException("Network error occurred")
+        raise httpx.ConnectError("Network error occurred")
 
-    result = youtube.fetch_videos_from_rss_feed("http://test.com", request_maker=mock_network_error)
+    result = await youtube.fetch_videos_from_rss_feed("http://test.com", request_maker=mock_network_error)
 
     match result:
         case Ok(videos):
@@ -70,3 +74,74 @@ def test_fetch_videos_network_error() -> None:
             assert isinstance(error, youtube.RssFeedError)
             assert error.error_type == youtube.RssFeedErrorType.NETWORK_ERROR
             assert "Network error occurred" in error.message
+
+
+@pytest.mark.asyncio
+async def test_fetch_videos_with_shared_client() -> None:
+    requested_urls: list[str] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requested_urls.append(str(request.url))
+        return httpx.Response(200, content=mock_make_request(str(request.url), 5).encode("utf-8"))
+
+    await http_client.start_http_client(transport=httpx.MockTransport(handler))
+    try:
+        first = await youtube.fetch_videos_from_rss_feed("http://test.com/feed")
+        second = await youtube.fetch_videos_from_rss_feed("http://test.com/feed")
+    finally:
+        await http_client.close_http_client()
+
+    assert isinstance(first, Ok) and isinstance(second, Ok)
+    assert len(first.ok_value) == len(second.ok_value) > 0
+    assert requested_urls == ["http://test.com/feed", "http://test.com/feed"]
+
+
+@pytest.mark.asyncio
+async def test_fetch_videos_http_error_status() -> None:
+    await http_client.start_http_client(transport=httpx.MockTransport(lambda request: httpx.Response(500)))
+    try:
+        result = await youtube.fetch_videos_from_rss_feed("http://test.com/feed")
+    finally:
+        await http_client.close_http_client()
+
+    match result:
+        case Ok(videos):
+            pytest.fail(f"Expected Err result, but got Ok with {len(videos)} videos")
+        case Err(error):
+            assert error.error_type == youtube.RssFeedErrorType.NETWORK_ERROR
+
+
+@pytest.mark.asyncio
+async def test_fetch_feed_if_changed() -> None:
+    feed = mock_make_request("http://test.com", 5)
+    sent_headers: list[dict[str, str]] = []
+    responses = [
+        youtube.FeedResponse(200, feed, etag='"v1"', last_modified="Sun, 12 May 2024 21:00:01 GMT"),
+        youtube.FeedResponse(304, "", etag=None, last_modified=None),
+        youtube.FeedResponse(200, feed.replace('views="188542"', 'views="188600"'), etag=None, last_modified=None),
+        youtube.FeedResponse(
+            200, feed.replace("The Flatwoods Monster", "A New Upload"), etag='"v2"', last_modified=None
+        ),
+    ]
+
+    async def mock_conditional_request(url: str, timeout: int, headers: dict[str, str]) -> youtube.FeedResponse:
+        sent_headers.append(headers)
+        return responses.pop(0)
+
+    cache = RssFeedCache(url="http://test.com")
+
+    first = await youtube.fetch_feed_if_changed(cache, mock_conditional_request)
+    assert first == Ok(feed)
+    assert cache.etag == '"v1"' and cache.content_hash is not None
+
+    not_modified = await youtube.fetch_feed_if_changed(cache, mock_conditional_request)
+    assert isinstance(not_modified, Err) and not_modified.err_value.error_type == youtube.RssFeedErrorType.NOT_MODIFIED
+    assert sent_headers[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Sun, 12 May 2024 21:00:01 GMT"}
+
+    only_view_counts_changed = await youtube.fetch_feed_if_changed(cache, mock_conditional_request)
+    assert isinstance(only_view_counts_changed, Err)
+    assert only_view_counts_changed.err_value.error_type == youtube.RssFeedErrorType.NOT_MODIFIED
+
+    changed = await youtube.fetch_feed_if_changed(cache, mock_conditional_request)
+    assert isinstance(changed, Ok)
+    assert cache.etag == '"v2"'
@@ -19,6 +19,7 @@ import type {
   SubscriptionCreate,
   SubscriptionCreateV2,
   Video,
+  VideoStatus,
 } from '../models/index';
 import {
     HTTPValidationErrorFromJSON,
@@ -31,6 +32,8 @@ import {
     SubscriptionCreateV2ToJSON,
     VideoFromJSON,
     VideoToJSON,
+    VideoStatusFromJSON,
+    VideoStatusToJSON,
 } from '../models/index';
 
 export interface CreateSubscriptionApiSubscriptionPostRequest {
@@ -51,6 +54,10 @@ export interface GetSubscriptionApiSubscriptionSubscriptionIdGetRequest {
 
 export interface GetSubscriptionVideosApiSubscriptionSubscriptionIdVideosGetRequest {
     subscriptionId: number;
+    limit?: number | null;
+    cursor?: string | null;
+    status?: Array<VideoStatus> | null;
+    fields?: string | null;
 }
 
 export interface GetYoutubeChannelInfoApiYoutubeChannelInfoGetRequest {
@@ -285,6 +292,22 @@ export class SubscriptionApi extends runtime.BaseAPI {
 
         const queryParameters: any = {};
 
+        if (requestParameters['limit'] != null) {
+            queryParameters['limit'] = requestParameters['limit'];
+        }
+
+        if (requestParameters['cursor'] != null) {
+            queryParameters['cursor'] = requestParameters['cursor'];
+        }
+
+        if (requestParameters['status'] != null) {
+            queryParameters['status'] = requestParameters['status'];
+        }
+
+        if (requestParameters['fields'] != null) {
+            queryParameters['fields'] = requestParameters['fields'];
+        }
+
         const headerParameters: runtime.HTTPHeaders = {};
 
         const response = await this.request({
@@ -0,0 +1,45 @@
+/* eslint-disable */
+/**
+ * Engawa
+ * No description provided (generated by Openapi Generator https://github.com/openapitools/openapi-generator)
+ *
+ * The version of the OpenAPI document: 0.1.0
+ * 
+ *
+ * NOTE: This class is auto generated by OpenAPI Generator (https://openapi-generator.tech).
+ * https://openapi-generator.tech
+ * Do not edit the class manually.
+ */
+
+import { mapValues } from '../runtime';
+/**
+ * 
+ * @export
+ * @interface PlexLibraryPath
+ */
+export interface PlexLibraryPath {
+}
+
+/**
+ * Check if a given object implements the PlexLibraryPath interface.
+ */
+export function instanceOfPlexLibraryPath(value: object): value is PlexLibraryPath {
+    return true;
+}
+
+export function PlexLibraryPathFromJSON(json: any): PlexLibraryPath {
+    return PlexLibraryPathFromJSONTyped(json, false);
+}
+
+export function PlexLibraryPathFromJSONTyped(json: any, ignoreDiscriminator: boolean): PlexLibraryPath {
+    return json;
+}
+
+  export function PlexLibraryPathToJSON(json: any): PlexLibraryPath {
+      return PlexLibraryPathToJSONTyped(json, false);
+  }
+
+  export function PlexLibraryPathToJSONTyped(value?: PlexLibraryPath | null, ignoreDiscriminator: boolean = false): any {
+    return value;
+}
+
@@ -12,6 +12,13 @@
  */
 
 import { mapValues } from '../runtime';
+import type { PlexLibraryPath } from './PlexLibraryPath';
+import {
+    PlexLibraryPathFromJSON,
+    PlexLibraryPathFromJSONTyped,
+    PlexLibraryPathToJSON,
+    PlexLibraryPathToJSONTyped,
+} from './PlexLibraryPath';
 import type { SubscriptionType } from './SubscriptionType';
 import {
     SubscriptionTypeFromJSON,
@@ -44,6 +51,12 @@ export interface Subscription {
      * @memberof Subscription
      */
     image?: string | null;
+    /**
+     * 
+     * @type {string}
+     * @memberof Subscription
+     */
+    imageHash?: string | null;
     /**
      * 
      * @type {Date}
@@ -52,16 +65,22 @@ export interface Subscription {
     lastUpdated?: Date | null;
     /**
      * 
-     * @type {string}
+     * @type {Date}
      * @memberof Subscription
      */
-    rssFeedUrl?: string;
+    nextSyncAt?: Date | null;
+    /**
+     * 
+     * @type {PlexLibraryPath}
+     * @memberof Subscription
+     */
+    plexLibraryPath: PlexLibraryPath;
     /**
      * 
      * @type {string}
      * @memberof Subscription
      */
-    subscriptionError?: string | null;
+    rssFeedUrl?: string;
     /**
      * 
      * @type {string}
@@ -88,6 +107,7 @@ export interface Subscription {
  * Check if a given object implements the Subscription interface.
  */
 export function instanceOfSubscription(value: object): value is Subscription {
+    if (!('plexLibraryPath' in value) || value['plexLibraryPath'] === undefined) return false;
     return true;
 }
 
@@ -104,9 +124,11 @@ export function SubscriptionFromJSONTyped(json: any, ignoreDiscriminator: boolea
         'id': json['id'] == null ? undefined : json['id'],
         'description': json['description'] == null ? undefined : json['description'],
         'image': json['image'] == null ? undefined : json['image'],
+        'imageHash': json['image_hash'] == null ? undefined : json['image_hash'],
         'lastUpdated': json['last_updated'] == null ? undefined : (new Date(json['last_updated'])),
+        'nextSyncAt': json['next_sync_at'] == null ? undefined : (new Date(json['next_sync_at'])),
+        'plexLibraryPath': PlexLibraryPathFromJSON(json['plex_library_path']),
         'rssFeedUrl': json['rss_feed_url'] == null ? undefined : json['rss_feed_url'],
-        'subscriptionError': json['SubscriptionError'] == null ? undefined : json['SubscriptionError'],
         'title': json['title'] == null ? undefined : json['title'],
         'type': json['type'] == null ? undefined : SubscriptionTypeFromJSON(json['type']),
         'url': json['url'] == null ? undefined : json['url'],
@@ -127,9 +149,11 @@ export function SubscriptionFromJSONTyped(json: any, ignoreDiscriminator: boolea
         'id': value['id'],
         'description': value['description'],
         'image': value['image'],
+        'image_hash': value['imageHash'],
         'last_updated': value['lastUpdated'] == null ? undefined : ((value['lastUpdated'] as any).toISOString()),
+        'next_sync_at': value['nextSyncAt'] == null ? undefined : ((value['nextSyncAt'] as any).toISOString()),
+        'plex_library_path': PlexLibraryPathToJSON(value['plexLibraryPath']),
         'rss_feed_url': value['rssFeedUrl'],
-        'SubscriptionError': value['subscriptionError'],
         'title': value['title'],
         'type': SubscriptionTypeToJSON(value['type']),
         'url': value['url'],
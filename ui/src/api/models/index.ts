@@ -9,6 +9,7 @@ export * from './HTTPValidationError';
 export * from './LocationPublic';
 export * from './MetadataErrorType';
 export * from './PlexLibraryDestination';
+export * from './PlexLibraryPath';
 export * from './PlexPublicWithDirectories';
 export * from './PlexServerCreate';
 export * from './RequirementStatus';
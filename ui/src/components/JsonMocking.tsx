@@ -11,6 +11,7 @@ export const mockSubscription: Subscription = {
   description:
     'I shit where you eat.And stream (most) every Mon at 7 EST (always on time) FAQ:But THE VIDEOS, MANAre still being made. The streams do not--or rarely--eat in...',
   image: 'https://i.ytimg.com/vi/bilJ8RcS7Pc/maxresdefault.jpg',
+  plexLibraryPath: '/library',
   rssFeedUrl: 'https://www.youtube.com/feeds/videos.xml?channel_id=UCS67mNnpfnHsU3IQYNHLToA',
   type: 'Channel',
 };
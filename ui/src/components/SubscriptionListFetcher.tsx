@@ -12,8 +12,21 @@ import TableContainer from '@mui/material/TableContainer';
 import TableHead from '@mui/material/TableHead';
 import TableRow from '@mui/material/TableRow';
 import React, { useState } from 'react';
+import { Subscription } from '@/api/models/Subscription';
 import { useSubscriptions } from './SubscriptionContext';
 
+// Channel images are served from the image store by content hash, rows the startup backfill has not reached yet
+// still carry the inline base64 image
+const channelImageSrc = (subscription: Subscription): string | undefined => {
+  if (subscription.imageHash) {
+    return `/api/images/${subscription.imageHash}?width=88`;
+  }
+  if (subscription.image) {
+    return `data:image/png;base64,${subscription.image}`;
+  }
+  return undefined;
+};
+
 interface SubscriptionListProps {
   onSubscriptionSelect: (subscriptionId: number) => void;
 }
@@ -68,11 +81,13 @@ const SubscriptionList: React.FC<SubscriptionListProps> = ({ onSubscriptionSelec
               onClick={() => subscription.id !== undefined && onSubscriptionSelect(subscription.id)}
             >
               <TableCell align="right">
-                <img
-                  src={`data:image/png;base64,${subscription.image}`}
-                  style={{ width: '50px', height: 'auto' }}
-                  alt={subscription.title}
-                />
+                {channelImageSrc(subscription) && (
+                  <img
+                    src={channelImageSrc(subscription)}
+                    style={{ width: '50px', height: 'auto' }}
+                    alt={subscription.title}
+                  />
+                )}
               </TableCell>
               <TableCell align="right">{subscription.title}</TableCell>
               <TableCell align="right">
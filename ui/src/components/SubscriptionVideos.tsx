@@ -15,6 +15,25 @@ import TableRow from '@mui/material/TableRow';
 import React from 'react';
 import { TableComponents, TableVirtuoso } from 'react-virtuoso';
 
+// Videos are fetched a page at a time with only the columns the table shows
+const PAGE_SIZE = 100;
+const VIDEO_FIELDS = 'title,author,published,link,status,duration,metadata_error';
+
+const config = new Configuration({
+  basePath: 'http://localhost:3000',
+});
+const subscriptionApi = new SubscriptionApi(config);
+
+const fetchVideosPage = async (subscriptionId: number, cursor?: string) => {
+  const response = await subscriptionApi.getSubscriptionVideosApiSubscriptionSubscriptionIdVideosGetRaw({
+    subscriptionId,
+    limit: PAGE_SIZE,
+    cursor,
+    fields: VIDEO_FIELDS,
+  });
+  return { videos: await response.value(), nextCursor: response.raw.headers.get('X-Next-Cursor') };
+};
+
 interface SubscriptionVideosProps {
   subscriptionId: number;
 }
@@ -149,32 +168,28 @@ const SubscriptionVideos: React.FC<SubscriptionVideosProps> = ({ subscriptionId
   const [videos, setVideos] = React.useState<Video[]>([]);
   const [loading, setLoading] = React.useState(true);
   const [error, setError] = React.useState<string | null>(null);
+  const [nextCursor, setNextCursor] = React.useState<string | null>(null);
+  const loadingMore = React.useRef(false);
 
   const fetchSubscriptionAndVideos = React.useCallback(async () => {
-    const config = new Configuration({
-      basePath: 'http://localhost:3000',
-    });
-    const subscriptionApi = new SubscriptionApi(config);
     try {
       setLoading(true);
-      const [subscriptionResponse, videosResponse] = await Promise.all([
+      const [subscriptionResponse, videosPage] = await Promise.all([
         subscriptionApi.getSubscriptionApiSubscriptionSubscriptionIdGet({
           subscriptionId,
         }),
-        subscriptionApi.getSubscriptionVideosApiSubscriptionSubscriptionIdVideosGet({
-          subscriptionId,
-        }),
+        fetchVideosPage(subscriptionId),
       ]);
 
-      if (!subscriptionResponse || !videosResponse) {
+      if (!subscriptionResponse || !videosPage.videos) {
         throw new Error('Failed to fetch data');
       }
 
       const subscriptionData: Subscription = subscriptionResponse;
-      const videosData: Video[] = videosResponse;
 
       setSubscription(subscriptionData);
-      setVideos(videosData);
+      setVideos(videosPage.videos);
+      setNextCursor(videosPage.nextCursor);
       setError(null);
     } catch (err) {
       console.error('Error:', err);
@@ -192,6 +207,22 @@ const SubscriptionVideos: React.FC<SubscriptionVideosProps> = ({ subscriptionId
     fetchSubscriptionAndVideos();
   };
 
+  const loadMoreVideos = React.useCallback(async () => {
+    if (!nextCursor || loadingMore.current) {
+      return;
+    }
+    loadingMore.current = true;
+    try {
+      const videosPage = await fetchVideosPage(subscriptionId, nextCursor);
+      setVideos((loaded) => [...loaded, ...videosPage.videos]);
+      setNextCursor(videosPage.nextCursor);
+    } catch (err) {
+      console.error('Error:', err);
+    } finally {
+      loadingMore.current = false;
+    }
+  }, [subscriptionId, nextCursor]);
+
   if (loading) {
     return <Typography>Loading...</Typography>;
   }
@@ -217,6 +248,7 @@ const SubscriptionVideos: React.FC<SubscriptionVideosProps> = ({ subscriptionId
           components={VirtuosoTableComponents}
           fixedHeaderContent={fixedHeaderContent}
           itemContent={rowContent}
+          endReached={loadMoreVideos}
         />
       </Paper>
     </Box>